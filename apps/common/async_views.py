@@ -0,0 +1,113 @@
+from asgiref.sync import iscoroutinefunction
+from asgiref.sync import markcoroutinefunction
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.http import Http404
+from rest_framework.response import Response
+
+
+class AsyncViewSetMixin:
+    # DRF 3.14 only dispatches synchronously. Viewsets with this mixin are served as coroutines: async actions run
+    # on the event loop, sync actions and the DRF hooks that may query the database (authentication, filter
+    # backends) run in the request's sync thread.
+
+    @classmethod
+    def as_view(cls, actions=None, **initkwargs):
+        return markcoroutinefunction(super().as_view(actions, **initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+
+            if iscoroutinefunction(handler):
+                response = await handler(request, *args, **kwargs)
+            else:
+                response = await sync_to_async(handler)(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    async def afilter_queryset(self, queryset):
+        return await sync_to_async(self.filter_queryset)(queryset)
+
+    async def apaginate_queryset(self, queryset):
+        if self.paginator is None:
+            return None
+        return await self.paginator.apaginate_queryset(queryset, self.request, view=self)
+
+    async def aget_object(self):
+        queryset = await self.afilter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            instance = await queryset.aget(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        except (queryset.model.DoesNotExist, TypeError, ValueError, ValidationError):
+            raise Http404
+        self.check_object_permissions(self.request, instance)
+        return instance
+
+
+async def iterate_in_thread(iterator):
+    # Each item of a sync iterator is produced in the request's sync thread, where its database cursor lives.
+    iterator = iter(iterator)
+    done = object()
+    while (item := await sync_to_async(next)(iterator, done)) is not done:
+        yield item
+
+
+class AsyncExportMixin:
+    # Under ASGI Django reads a sync streaming_content into a list before sending it, so the export is streamed
+    # through an async iterator instead.
+    def stream_export(self, content):
+        return iterate_in_thread(super().stream_export(content))
+
+
+class AsyncListModelMixin:
+    async def list(self, request, *args, **kwargs):
+        queryset = await self.afilter_queryset(self.get_queryset())
+
+        page = await self.apaginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+
+        serializer = self.get_serializer([instance async for instance in queryset], many=True)
+        return Response(serializer.data)
+
+
+class AsyncRetrieveModelMixin:
+    async def retrieve(self, request, *args, **kwargs):
+        instance = await self.aget_object()
+        serializer = self.get_serializer(instance)
+        return Response(serializer.data)
+
+
+class AsyncConditionalGetMixin:
+    # ConditionalGetMixin for viewsets whose list and retrieve are the async mixins above.
+    async def list(self, request, *args, **kwargs):
+        queryset = await self.afilter_queryset(self.get_queryset())
+        etag, _ = await sync_to_async(self.get_validators)(queryset, settings.CONDITIONAL_GET_MAX_ROWS)
+        response = self.get_not_modified_response(request, etag, None)
+        if response is None:
+            response = await super().list(request, *args, **kwargs)
+        return self.set_validators(response, etag, None)
+
+    async def retrieve(self, request, *args, **kwargs):
+        etag, last_modified = await sync_to_async(self.get_object_validators)()
+        response = self.get_not_modified_response(request, etag, last_modified)
+        if response is None:
+            response = await super().retrieve(request, *args, **kwargs)
+        return self.set_validators(response, etag, last_modified)
@@ -0,0 +1,110 @@
+import math
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connections
+from django.test import override_settings
+from django.test.utils import setup_databases
+from django.test.utils import setup_test_environment
+from django.test.utils import teardown_databases
+from django.test.utils import teardown_test_environment
+
+
+@contextmanager
+def isolated_environment(keepdb=False):
+    # Benchmarks run against a throwaway test database and under a cache key prefix of their own, so they neither
+    # write to the live data nor bump or flush the live caches.
+    setup_test_environment()
+    old_config = setup_databases(verbosity=0, interactive=False, keepdb=keepdb)
+    caches = {
+        alias: {**config, "KEY_PREFIX": f"{config.get('KEY_PREFIX', '')}:bench"}
+        for alias, config in settings.CACHES.items()
+    }
+    try:
+        with override_settings(CACHES=caches):
+            yield
+    finally:
+        teardown_databases(old_config, verbosity=0, keepdb=keepdb)
+        teardown_test_environment()
+
+
+class Scenario:
+    # path and data may be callables taking the iteration number; setup() runs before every call and is not measured.
+    def __init__(self, name, method, path, data=None, setup=None):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.data = data
+        self.setup = setup
+
+    def call(self, client, iteration):
+        if self.setup:
+            self.setup()
+        path = self.path(iteration) if callable(self.path) else self.path
+        data = self.data(iteration) if callable(self.data) else self.data
+        request = getattr(client, self.method.lower())
+        started = time.perf_counter()
+        response = request(path, data, format="json") if self.method != "GET" else request(path, data)
+        return time.perf_counter() - started, response
+
+
+def percentile(values, percent):
+    # Nearest-rank percentile of an already sorted list.
+    return values[max(math.ceil(percent / 100 * len(values)) - 1, 0)]
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def run_scenario(client, scenario, iterations, warmup=0, memory_iterations=3):
+    # Latency and query counts come from untraced calls; memory is measured on separate calls
+    # because tracemalloc slows everything it traces.
+    iteration = 0
+    for _ in range(warmup):
+        scenario.call(client, iteration)
+        iteration += 1
+
+    latencies, queries, statuses = [], [], Counter()
+    for _ in range(iterations):
+        counter = QueryCounter()
+        with connections["default"].execute_wrapper(counter):
+            latency, response = scenario.call(client, iteration)
+        iteration += 1
+        latencies.append(latency * 1000)
+        queries.append(counter.count)
+        statuses[response.status_code] += 1
+
+    peaks = []
+    for _ in range(memory_iterations):
+        tracemalloc.start()
+        try:
+            scenario.call(client, iteration)
+            peaks.append(tracemalloc.get_traced_memory()[1])
+        finally:
+            tracemalloc.stop()
+        iteration += 1
+
+    latencies.sort()
+    return {
+        "name": scenario.name,
+        "method": scenario.method,
+        "iterations": iterations,
+        "status_codes": {str(status): count for status, count in sorted(statuses.items())},
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50), 3),
+            "p95": round(percentile(latencies, 95), 3),
+            "p99": round(percentile(latencies, 99), 3),
+            "mean": round(sum(latencies) / len(latencies), 3),
+        },
+        "queries": {"min": min(queries), "max": max(queries)},
+        "memory_peak_kib": round(max(peaks) / 1024, 1) if peaks else None,
+    }
@@ -0,0 +1,216 @@
+import copy
+import functools
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from apps.common.metrics import record_cache
+from apps.common.singleflight import distributed_lock
+from apps.common.singleflight import single_flight
+
+
+class VersionedCache:
+    # Entries are keyed by a data version; writers bump the version instead of deleting keys,
+    # so readers never see data older than the last committed write. bump() invalidates every entry,
+    # bump(scope) only the entries read with that scope (e.g. one owner's).
+    registry = {}
+
+    stale_factor = 10
+
+    def __init__(self, namespace, timeout, lock_timeout=None):
+        self.namespace = namespace
+        self.timeout = timeout
+        self.lock_timeout = lock_timeout or settings.SINGLE_FLIGHT_LOCK_TIMEOUT
+        self.registry[namespace] = self
+
+    def make_key(self, *parts):
+        return ":".join([self.namespace, *map(str, parts)])
+
+    def version_key(self, scope=None):
+        return self.make_key("version") if scope is None else self.make_key("version", scope)
+
+    def versions(self, scope=None):
+        # The global version, then the scope's, read in one round trip.
+        keys = [self.version_key()] if scope is None else [self.version_key(), self.version_key(scope)]
+        versions = cache.get_many(keys)
+        for key in keys:
+            if key not in versions:
+                # Seeded from the clock so a lost version key can never roll back to an older value.
+                cache.add(key, int(time.time() * 1000), timeout=None)
+                versions[key] = cache.get(key)
+            if pending := self.pending_bump(key):
+                pending.read = True
+        return tuple(versions[key] for key in keys)
+
+    def version(self):
+        return self.versions()[0]
+
+    def bump(self, scope=None):
+        key = self.version_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, int(time.time() * 1000), timeout=None)
+
+    def bump_on_commit(self, scope=None):
+        # Bumped now for readers inside this transaction and again once the write is visible to everyone else. A
+        # transaction that writes many rows bumps once on commit, and again now only if the version was read since.
+        key = self.version_key(scope)
+        pending = self.pending_bump(key)
+        if pending is None:
+            self.bump(scope)
+            pending = functools.partial(self.bump, scope)
+            pending.version_key = key
+            transaction.on_commit(pending)
+        elif pending.read:
+            self.bump(scope)
+        pending.read = False
+
+    @staticmethod
+    def pending_bump(key):
+        connection = transaction.get_connection()
+        if not connection.in_atomic_block:
+            return None
+        return next(
+            (func for _, func, _ in connection.run_on_commit if getattr(func, "version_key", None) == key), None
+        )
+
+    def get_or_set(self, key_parts, compute, scope=None):
+        # Returns the value and how it was served: "hit", "miss", "stale" or "coalesced".
+        key_parts = tuple(key_parts) if scope is None else (scope, *key_parts)
+        versions = self.versions(scope)
+        key = self.make_key("data", *versions, *key_parts)
+        value = cache.get(key)
+        if value is not None:
+            self.count("hit")
+            return value, "hit"
+
+        leader = []
+        value, status = single_flight(
+            key,
+            lambda: leader.append(True) or self.fill(key, key_parts, versions, compute),
+            timeout=self.lock_timeout,
+        )
+        if not leader:
+            status = "coalesced"
+        self.count(status)
+        return value, status
+
+    def fill(self, key, key_parts, versions, compute):
+        # Only one process recomputes a missing entry. The others serve the previous value when the entry merely
+        # expired; after a bump it is out of date, so they wait for the new one.
+        with distributed_lock(key, timeout=self.lock_timeout, blocking_timeout=0) as acquired:
+            if acquired:
+                return self.compute(key, key_parts, versions, compute)
+
+        latest = cache.get(self.make_key("latest", *key_parts))
+        if latest is not None and latest[0] == versions:
+            return latest[1], "stale"
+
+        with distributed_lock(key, timeout=self.lock_timeout, blocking_timeout=self.lock_timeout):
+            return self.compute(key, key_parts, versions, compute)
+
+    def compute(self, key, key_parts, versions, compute):
+        value = cache.get(key)
+        if value is not None:
+            return value, "coalesced"
+
+        value = compute()
+        cache.set(key, value, timeout=self.timeout)
+        # Kept longer than the entry itself, to be served while an expired entry is being computed again.
+        cache.set(self.make_key("latest", *key_parts), (versions, value), timeout=self.timeout * self.stale_factor)
+        return value, "miss"
+
+    def count(self, name):
+        record_cache(self.namespace, name)
+        key = self.make_key("stats", name)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, 1, timeout=None)
+
+    def stats(self):
+        keys = {status: self.make_key("stats", status) for status in ("hit", "miss", "stale", "coalesced")}
+        stats = cache.get_many(keys.values())
+        return {"version": self.version(), **{status: stats.get(key, 0) for status, key in keys.items()}}
+
+
+class TieredCache:
+    # A small in-process LRU in front of per-key versioned entries in the shared cache. Invalidating bumps the
+    # key's version, so a reader that loaded the old value before the write can only store it under the old
+    # version. This process forgets its local copy at once; other processes keep theirs for at most local_timeout
+    # seconds. clear() bumps a generation covering every key.
+
+    def __init__(self, namespace, timeout, local_timeout, local_size=1024):
+        self.namespace = namespace
+        self.timeout = timeout
+        self.local_timeout = local_timeout
+        self.local_size = local_size
+        self.local = OrderedDict()
+        self.lock = threading.Lock()
+
+    def make_key(self, *parts):
+        return ":".join([self.namespace, *map(str, parts)])
+
+    def get(self, key, compute):
+        # compute() returning None is not cached. Local hits are copies, so callers may mutate what they get.
+        local_key = str(key)
+        now = time.monotonic()
+        with self.lock:
+            entry = self.local.get(local_key)
+            if entry is not None and entry[0] > now:
+                self.local.move_to_end(local_key)
+                record_cache(self.namespace, "hit")
+                return copy.copy(entry[1])
+
+        generation_key, version_key = self.make_key("generation"), self.make_key("version", key)
+        versions = cache.get_many([generation_key, version_key])
+        for missing in {generation_key, version_key} - versions.keys():
+            # Seeded from the clock so a lost version key can never roll back to an older value.
+            cache.add(missing, int(time.time() * 1000), timeout=None)
+            versions[missing] = cache.get(missing)
+
+        data_key = self.make_key("data", versions[generation_key], key, versions[version_key])
+        value = cache.get(data_key)
+        record_cache(self.namespace, "hit" if value is not None else "miss")
+        if value is None:
+            value = compute()
+            if value is None:
+                return None
+            cache.set(data_key, value, timeout=self.timeout)
+
+        if self.local_timeout > 0:
+            with self.lock:
+                self.local[local_key] = (now + self.local_timeout, value)
+                self.local.move_to_end(local_key)
+                while len(self.local) > self.local_size:
+                    self.local.popitem(last=False)
+            return copy.copy(value)
+        return value
+
+    def invalidate(self, key):
+        with self.lock:
+            self.local.pop(str(key), None)
+        self.incr(self.make_key("version", key))
+
+    def invalidate_on_commit(self, key):
+        # Invalidated now for readers inside this transaction and again once the write is visible to everyone else.
+        self.invalidate(key)
+        transaction.on_commit(lambda: self.invalidate(key))
+
+    def clear(self):
+        with self.lock:
+            self.local.clear()
+        self.incr(self.make_key("generation"))
+
+    @staticmethod
+    def incr(key):
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Nothing cached under this key yet; the next reader seeds it from the clock.
+            pass
@@ -0,0 +1,21 @@
+from django.db import connections
+from django.db import router
+from django.db.backends.postgresql.psycopg_any import is_psycopg3
+
+
+def copy_rows(model, fields, rows, using=None):
+    # COPY ... FROM STDIN streams the rows without building an INSERT statement; on other backends
+    # (or psycopg2) the rows fall back to bulk_create. Values must be ready for the database, auto_now
+    # fields included, and no model signals are sent.
+    using = using or router.db_for_write(model)
+    connection = connections[using]
+    if connection.vendor != "postgresql" or not is_psycopg3:
+        model.objects.using(using).bulk_create([model(**dict(zip(fields, row))) for row in rows])
+        return
+
+    table = connection.ops.quote_name(model._meta.db_table)
+    columns = ", ".join(connection.ops.quote_name(model._meta.get_field(name).column) for name in fields)
+    with connection.cursor() as cursor:
+        with cursor.cursor.copy(f"COPY {table} ({columns}) FROM STDIN") as copy:
+            for row in rows:
+                copy.write_row(row)
@@ -0,0 +1,27 @@
+from rest_framework import filters
+
+from apps.common.search import full_text_search
+
+
+class FullTextSearchFilter(filters.SearchFilter):
+    # Views with full_text_search = True are searched through the search_vector column of their table and ranked;
+    # the others keep SearchFilter's ILIKE matching on search_fields.
+
+    def filter_queryset(self, request, queryset, view):
+        if not getattr(view, "full_text_search", False):
+            return super().filter_queryset(request, queryset, view)
+
+        terms = request.query_params.get(self.search_param, "").strip()
+        if not terms:
+            return queryset
+        return full_text_search(queryset, terms)
+
+
+class RankedOrderingFilter(filters.OrderingFilter):
+    # Full-text results are ordered by rank first, unless the client asked for an explicit ordering.
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if "search_rank" in queryset.query.annotations and not request.query_params.get(self.ordering_param):
+            return ["-search_rank", *(ordering or ())]
+        return ordering
@@ -0,0 +1,90 @@
+import copy
+import json
+import logging
+import os
+import queue
+import weakref
+from datetime import datetime
+from datetime import timezone
+from logging.handlers import QueueHandler
+from logging.handlers import QueueListener
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Attributes every LogRecord has; anything else on a record was passed as extra= and is written as a field.
+RECORD_ATTRIBUTES = frozenset(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+
+class JSONFormatter(logging.Formatter):
+    # One JSON object per line: time, level, logger, message, the extra= fields and the traceback, if any.
+
+    def format(self, record):
+        data = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in RECORD_ATTRIBUTES:
+                data[key] = value
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            data["exception"] = record.exc_text
+        if record.stack_info:
+            data["stack"] = record.stack_info
+        if orjson is None:
+            return json.dumps(data, default=str)
+        return orjson.dumps(data, default=str).decode()
+
+
+class QueueStreamHandler(QueueHandler):
+    # Puts records on an in-process queue and returns; a listener thread formats them and writes them to the
+    # stream, so the request thread never waits on I/O. Records are flushed by logging.shutdown at exit. A forked
+    # child has no listener thread, so it starts its own on a new queue.
+    instances = weakref.WeakSet()
+
+    def __init__(self, stream=None):
+        super().__init__(queue.SimpleQueue())
+        self.target = logging.StreamHandler(stream)
+        self.start_listener()
+        self.instances.add(self)
+
+    def start_listener(self):
+        self.queue = queue.SimpleQueue()
+        self.listener = QueueListener(self.queue, self.target)
+        self.listener.start()
+
+    @classmethod
+    def restart_listeners(cls):
+        for handler in list(cls.instances):
+            if handler.listener._thread is not None:
+                handler.start_listener()
+
+    def setFormatter(self, fmt):
+        super().setFormatter(fmt)
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record):
+        # The message arguments and the traceback may change or go away before the listener gets to them, so they
+        # are resolved here; formatting the record is left to the listener.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = (self.formatter or logging.Formatter()).formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def close(self):
+        if self.listener._thread is not None:
+            self.listener.stop()
+        self.target.close()
+        super().close()
+
+
+os.register_at_fork(after_in_child=QueueStreamHandler.restart_listeners)
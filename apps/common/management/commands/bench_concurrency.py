@@ -0,0 +1,107 @@
+import asyncio
+import json
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.common.benchmark import percentile
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    # Only as fair as the servers it is pointed at: compare production servers with the same number of processes,
+    # e.g. gunicorn and uvicorn. runserver is a development server and no baseline for WSGI.
+    help = "compare running servers (e.g. WSGI and ASGI) under many concurrent, optionally slow, client connections"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--target",
+            action="append",
+            required=True,
+            help="name=url of a running server endpoint, e.g. asgi=http://127.0.0.1:8001/tasks; may be repeated",
+        )
+        parser.add_argument("--connections", type=int, default=500, help="concurrent client connections")
+        parser.add_argument("--requests", type=int, default=2000, help="requests per target")
+        parser.add_argument(
+            "--slow-ms", type=int, default=0, help="pause clients this long halfway through the request"
+        )
+        parser.add_argument("--timeout", type=float, default=60, help="seconds before a request counts as failed")
+        parser.add_argument("--email", help="user to authenticate as, defaults to the first user")
+
+    def handle(self, *args, **kwargs):
+        user = User.objects.get(email=kwargs["email"]) if kwargs.get("email") else User.objects.order_by("id").first()
+        if user is None:
+            return self.stderr.write("No users in the database, seed it first.")
+        token = str(AccessToken.for_user(user))
+
+        report = []
+        for target in kwargs["target"]:
+            name, separator, url = target.partition("=")
+            if not separator:
+                raise CommandError(f'Expected name=url, got "{target}".')
+            report.append({"name": name, "url": url, **asyncio.run(self.run_target(url, token, kwargs))})
+        self.stdout.write(json.dumps(report, indent=2))
+
+    async def run_target(self, url, token, options):
+        semaphore = asyncio.Semaphore(options["connections"])
+
+        async def call():
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    fetch = self.fetch(url, token, options["slow_ms"] / 1000)
+                    status = await asyncio.wait_for(fetch, options["timeout"])
+                except (OSError, asyncio.TimeoutError, ValueError) as exc:
+                    return type(exc).__name__, None
+                return status, (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(call() for _ in range(options["requests"])))
+        elapsed = time.perf_counter() - started
+
+        latencies = sorted(latency for _, latency in results if latency is not None)
+        return {
+            "connections": options["connections"],
+            "requests": options["requests"],
+            "slow_ms": options["slow_ms"],
+            "seconds": round(elapsed, 3),
+            "requests_per_second": round(len(latencies) / elapsed, 1),
+            "responses": {str(status): count for status, count in Counter(status for status, _ in results).items()},
+            "latency_ms": {
+                "p50": round(percentile(latencies, 50), 2),
+                "p95": round(percentile(latencies, 95), 2),
+                "p99": round(percentile(latencies, 99), 2),
+            }
+            if latencies
+            else None,
+        }
+
+    @staticmethod
+    async def fetch(url, token, slow):
+        # One HTTP/1.1 request per connection, so every request holds a connection for its whole lifetime.
+        parts = urlsplit(url)
+        path = parts.path + (f"?{parts.query}" if parts.query else "")
+        reader, writer = await asyncio.open_connection(parts.hostname, parts.port or 80)
+        try:
+            request = (
+                f"GET {path or '/'} HTTP/1.1\r\nHost: {parts.netloc}\r\n"
+                f"Authorization: Bearer {token}\r\nConnection: close\r\n\r\n"
+            ).encode()
+            if slow:
+                middle = len(request) // 2
+                writer.write(request[:middle])
+                await writer.drain()
+                await asyncio.sleep(slow)
+                request = request[middle:]
+            writer.write(request)
+            await writer.drain()
+            response = await reader.read()
+        finally:
+            writer.close()
+        return int(response.split(b" ", 2)[1])
@@ -0,0 +1,87 @@
+import json
+import statistics
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from rest_framework.test import APIClient
+
+from apps.common.benchmark import isolated_environment
+from apps.common.cache import VersionedCache
+from apps.tasks.models import Task
+from apps.tasks.seeding import SeedPlan
+from apps.tasks.seeding import seed
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "expire the cached aggregates of a throwaway test database and measure its load under concurrent callers"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--callers", type=int, default=200, help="number of concurrent requests")
+        parser.add_argument("--path", action="append", help="endpoint to call, may be repeated")
+        parser.add_argument("--email", help="user to authenticate as, defaults to the first user")
+        parser.add_argument("--users", type=int, default=100, help="seeded users")
+        parser.add_argument("--keepdb", action="store_true", help="keep the test database and its dataset between runs")
+
+    def handle(self, *args, **kwargs):
+        callers = kwargs.get("callers")
+        paths = kwargs.get("path") or ["/tasks/top_month_duration", "/tasks/timelog/last_month_full_time"]
+        with isolated_environment(keepdb=kwargs["keepdb"]):
+            if not Task.objects.exists():
+                seed(SeedPlan(users=kwargs["users"]))
+            if kwargs.get("email"):
+                user = User.objects.get(email=kwargs["email"])
+            else:
+                user = User.objects.order_by("id").first()
+            report = [self.run_path(path, user, callers) for path in paths]
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def run_path(self, path, user, callers):
+        # Bumping every version is what an expiry looks like to the callers: nobody has a fresh entry.
+        for cache in VersionedCache.registry.values():
+            cache.bump()
+
+        barrier = threading.Barrier(callers)
+        lock = threading.Lock()
+        queries = Counter()
+
+        def count_queries(execute, sql, params, many, context):
+            with lock:
+                queries["aggregate" if "SUM(" in sql.upper() else "other"] += 1
+            return execute(sql, params, many, context)
+
+        def call(_):
+            client = APIClient()
+            client.force_authenticate(user=user)
+            try:
+                with connection.execute_wrapper(count_queries):
+                    barrier.wait()
+                    started = time.perf_counter()
+                    response = client.get(path)
+                    return time.perf_counter() - started, response.status_code, response.get("X-Cache", "")
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=callers) as executor:
+            results = list(executor.map(call, range(callers)))
+
+        latencies = sorted(latency * 1000 for latency, _, _ in results)
+        return {
+            "path": path,
+            "callers": callers,
+            "aggregate_queries": queries["aggregate"],
+            "other_queries": queries["other"],
+            "status_codes": dict(Counter(status for _, status, _ in results)),
+            "cache": dict(Counter(cache_status for _, _, cache_status in results)),
+            "latency_ms": {
+                "p50": round(statistics.median(latencies), 2),
+                "p95": round(latencies[int(len(latencies) * 0.95) - 1], 2),
+                "max": round(latencies[-1], 2),
+            },
+        }
@@ -0,0 +1,247 @@
+import copy
+import logging
+import random
+import re
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+sql_logger = logging.getLogger("apps.common.sql")
+
+# A request id sent by a proxy or a client is kept if it looks like one, otherwise a new one is made up.
+REQUEST_ID_PATTERN = re.compile(r"[\w.:-]{1,128}")
+# Any other method is counted as "other", so clients cannot add label values at will.
+HTTP_METHODS = frozenset(("GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS", "TRACE"))
+
+# The profile of the request being served; sync_to_async copies it into the threads an async request uses.
+current_profile = ContextVar("current_profile", default=None)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+REGISTRY = []
+
+
+class RequestProfile:
+    __slots__ = (
+        "request",
+        "request_id",
+        "started",
+        "queries",
+        "query_seconds",
+        "slowest_query",
+        "cache_hits",
+        "cache_misses",
+        "render_seconds",
+    )
+
+    def __init__(self, request):
+        self.request = request
+        request_id = request.headers.get("X-Request-ID", "")
+        self.request_id = request_id if REQUEST_ID_PATTERN.fullmatch(request_id) else uuid.uuid4().hex
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.slowest_query = (0.0, "")
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.render_seconds = 0.0
+
+    @property
+    def view(self):
+        match = self.request.resolver_match
+        return match.view_name if match else "unmatched"
+
+    def server_timing(self, total):
+        return ", ".join(
+            [
+                f"total;dur={total * 1000:.1f}",
+                f'db;dur={self.query_seconds * 1000:.1f};desc="{self.queries} queries"',
+                f'cache;desc="{self.cache_hits} hits / {self.cache_misses} misses"',
+                f"render;dur={self.render_seconds * 1000:.1f}",
+            ]
+        )
+
+    def summary(self, total):
+        slowest, sql = self.slowest_query
+        return (
+            f"{total * 1000:.0f} ms total, {self.queries} queries in {self.query_seconds * 1000:.0f} ms, "
+            f"cache {self.cache_hits} hits / {self.cache_misses} misses, render {self.render_seconds * 1000:.0f} ms"
+            + (f', slowest query {slowest * 1000:.0f} ms: "{sql[:200]}"' if sql else "")
+        )
+
+
+class Metric:
+    # Prometheus text exposition of one metric family, keyed by label values, updated under a lock.
+    kind = None
+
+    def __init__(self, name, documentation, labelnames):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.values = {}
+        self.lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def format_labels(self, labels, **extra):
+        pairs = [*zip(self.labelnames, labels), *extra.items()]
+        if not pairs:
+            return ""
+        escaped = (str(value).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n") for _, value in pairs)
+        return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self.lock:
+            values = [(labels, copy.copy(value)) for labels, value in self.values.items()]
+        for labels, value in sorted(values):
+            lines += self.expose_value(labels, value)
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def expose_value(self, labels, value):
+        return [f"{self.name}_total{self.format_labels(labels)} {value}"]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames, buckets):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = buckets
+
+    def observe(self, value, *labels):
+        # Per bucket counts plus the sum and the count, made cumulative on exposition.
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            counts = self.values.get(labels)
+            if counts is None:
+                counts = self.values[labels] = [0] * (len(self.buckets) + 3)
+            counts[index] += 1
+            counts[-2] += value
+            counts[-1] += 1
+
+    def expose_value(self, labels, counts):
+        lines, cumulative = [], 0
+        for bound, count in zip([*self.buckets, "+Inf"], counts):
+            cumulative += count
+            lines.append(f"{self.name}_bucket{self.format_labels(labels, le=bound)} {cumulative}")
+        lines.append(f"{self.name}_sum{self.format_labels(labels)} {counts[-2]}")
+        lines.append(f"{self.name}_count{self.format_labels(labels)} {counts[-1]}")
+        return lines
+
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Time to build the response.", ("view", "method", "status"), LATENCY_BUCKETS
+)
+REQUEST_QUERIES = Histogram("http_request_db_queries", "Database queries per request.", ("view",), QUERY_BUCKETS)
+REQUEST_QUERY_DURATION = Histogram(
+    "http_request_db_duration_seconds", "Time spent in database queries per request.", ("view",), LATENCY_BUCKETS
+)
+REQUEST_RENDER_DURATION = Histogram(
+    "http_request_render_duration_seconds", "Time spent rendering response bodies.", ("view",), LATENCY_BUCKETS
+)
+CACHE_REQUESTS = Counter("cache_requests", "Application cache lookups by result.", ("namespace", "result"))
+
+
+def expose_metrics():
+    return "\n".join(line for metric in REGISTRY for line in metric.expose()) + "\n"
+
+
+def record_query(execute, sql, params, many, context):
+    # A database execute wrapper, installed on every connection by apps.common.signals.
+    profile = current_profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        profile.queries += 1
+        profile.query_seconds += elapsed
+        if elapsed > profile.slowest_query[0]:
+            profile.slowest_query = (elapsed, sql)
+        log_query(profile, sql, elapsed)
+
+
+def log_query(profile, sql, elapsed):
+    # Statements slower than SLOW_QUERY_MS, plus SQL_LOG_SAMPLE_RATE of the others, without their parameters.
+    if settings.SLOW_QUERY_MS and elapsed * 1000 >= settings.SLOW_QUERY_MS:
+        level, sampled = logging.WARNING, False
+    elif random.random() < settings.SQL_LOG_SAMPLE_RATE:
+        level, sampled = logging.INFO, True
+    else:
+        return
+    sql_logger.log(
+        level,
+        "%s query",
+        "Sampled" if sampled else "Slow",
+        extra={
+            "request_id": profile.request_id,
+            "view": profile.view,
+            "duration_ms": round(elapsed * 1000, 3),
+            "sampled": sampled,
+            "sql": sql,
+        },
+    )
+
+
+def record_cache(namespace, result):
+    # "hit" or "miss", or how a versioned cache served a value it did not compute ("stale", "coalesced").
+    CACHE_REQUESTS.inc(namespace, result)
+    profile = current_profile.get()
+    if profile is not None:
+        if result == "miss":
+            profile.cache_misses += 1
+        else:
+            profile.cache_hits += 1
+
+
+@contextmanager
+def record_render():
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile = current_profile.get()
+        if profile is not None:
+            profile.render_seconds += time.perf_counter() - started
+
+
+def finish_profile(profile, request, response):
+    total = time.perf_counter() - profile.started
+    view = profile.view
+
+    method = request.method if request.method in HTTP_METHODS else "other"
+    REQUEST_DURATION.observe(total, view, method, str(response.status_code))
+    REQUEST_QUERIES.observe(profile.queries, view)
+    REQUEST_QUERY_DURATION.observe(profile.query_seconds, view)
+    REQUEST_RENDER_DURATION.observe(profile.render_seconds, view)
+
+    response["Server-Timing"] = profile.server_timing(total)
+    response["X-Request-ID"] = profile.request_id
+    if settings.SLOW_REQUEST_MS and total * 1000 >= settings.SLOW_REQUEST_MS:
+        logger.warning(
+            "Slow request %s %s (%s) %s: %s",
+            request.method,
+            request.path,
+            view,
+            response.status_code,
+            profile.summary(total),
+            extra={"request_id": profile.request_id, "view": view, "duration_ms": round(total * 1000, 1)},
+        )
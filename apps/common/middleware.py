@@ -0,0 +1,115 @@
+import asyncio
+
+from asgiref.sync import iscoroutinefunction
+from asgiref.sync import markcoroutinefunction
+from django.conf import settings
+
+from apps.common.metrics import RequestProfile
+from apps.common.metrics import current_profile
+from apps.common.metrics import finish_profile
+
+
+class DatabaseConcurrencyMiddleware:
+    # Under ASGI every request runs its sync code (and the async ORM) in a thread of its own, with a database
+    # connection of its own. Capping the requests in flight keeps the connection count below max_connections;
+    # the others wait on the event loop, which costs a coroutine instead of a connection. No-op under WSGI.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        self.slots = asyncio.Semaphore(settings.ASGI_DATABASE_CONCURRENCY)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        await self.slots.acquire()
+        try:
+            response = await self.get_response(request)
+        except BaseException:
+            self.slots.release()
+            raise
+
+        # Django closes the request's connection when the response is closed, in a sync thread, once it has been sent.
+        # A stream that raises or is cancelled halfway is never closed, so ending the stream releases the slot too.
+        release = self.get_release()
+        response._resource_closers.append(release)
+        if response.streaming:
+            response.streaming_content = release_after(response.streaming_content, release)
+        return response
+
+    def get_release(self):
+        loop = asyncio.get_running_loop()
+        released = False
+
+        def release():
+            nonlocal released
+            if not released:
+                released = True
+                loop.call_soon_threadsafe(self.slots.release)
+
+        return release
+
+
+def release_after(content, release):
+    if hasattr(content, "__aiter__"):
+
+        async def wrapper():
+            try:
+                async for chunk in content:
+                    yield chunk
+            finally:
+                release()
+
+    else:
+
+        def wrapper():
+            try:
+                yield from content
+            finally:
+                release()
+
+    return wrapper()
+
+
+class MetricsMiddleware:
+    # Outermost middleware: profiles every request (latency, ORM queries, application cache lookups, rendering),
+    # returns the profile in a Server-Timing header, feeds the histograms of /health/metrics and logs requests
+    # slower than SLOW_REQUEST_MS. Slow and sampled queries are logged with the view and the X-Request-ID.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+
+        profile = RequestProfile(request)
+        token = current_profile.set(profile)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_profile.reset(token)
+        finish_profile(profile, request, response)
+        return response
+
+    async def __acall__(self, request):
+        profile = RequestProfile(request)
+        token = current_profile.set(profile)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_profile.reset(token)
+        finish_profile(profile, request, response)
+        return response
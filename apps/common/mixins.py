@@ -0,0 +1,196 @@
+import hashlib
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.core.exceptions import ValidationError
+from django.db.models import Count
+from django.db.models import Max
+from django.http import StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.decorators import action
+from rest_framework.filters import OrderingFilter
+from rest_framework.relations import ManyRelatedField
+from rest_framework.serializers import BaseSerializer
+from rest_framework.serializers import ListSerializer
+
+from apps.common.renderers import CSVRenderer
+from apps.common.renderers import NDJSONRenderer
+from apps.common.serializers import DynamicFieldsMixin
+
+
+def get_serializer_relations(serializer, model=None, prefix=""):
+    # Walks the readable nested fields of a serializer and returns the paths to select_related / prefetch_related.
+    model = model or getattr(getattr(serializer, "Meta", None), "model", None)
+    select_related, prefetch_related = [], []
+    if model is None:
+        return select_related, prefetch_related
+
+    for field in serializer.fields.values():
+        if field.write_only or field.source == "*" or "." in field.source:
+            continue
+        try:
+            relation = model._meta.get_field(field.source)
+        except FieldDoesNotExist:
+            continue
+        if not relation.is_relation:
+            continue
+
+        path = f"{prefix}{field.source}"
+        if isinstance(field, ListSerializer):
+            prefetch_related.append(path)
+            nested_select, nested_prefetch = get_serializer_relations(field.child, relation.related_model)
+            prefetch_related += [f"{path}__{nested}" for nested in nested_select + nested_prefetch]
+        elif isinstance(field, BaseSerializer):
+            select_related.append(path)
+            nested_select, nested_prefetch = get_serializer_relations(field, relation.related_model, f"{path}__")
+            select_related += nested_select
+            prefetch_related += nested_prefetch
+        elif isinstance(field, ManyRelatedField):
+            prefetch_related.append(path)
+
+    return select_related, prefetch_related
+
+
+def get_serializer_columns(serializer, model=None, prefix=""):
+    # Concrete columns read by a serializer, including those of select_related nested serializers.
+    model = model or serializer.Meta.model
+    columns = []
+
+    for field in serializer.fields.values():
+        if field.write_only or field.source == "*" or "." in field.source:
+            continue
+        try:
+            model_field = model._meta.get_field(field.source)
+        except FieldDoesNotExist:
+            continue
+        if not model_field.concrete or model_field.many_to_many:
+            continue
+
+        columns.append(f"{prefix}{field.source}")
+        if isinstance(field, BaseSerializer) and not isinstance(field, ListSerializer):
+            columns += get_serializer_columns(field, model_field.related_model, f"{prefix}{field.source}__")
+
+    return columns
+
+
+class SerializerRelationsMixin:
+    def get_queryset(self):
+        return self.select_serializer_relations(super().get_queryset())
+
+    def select_serializer_relations(self, queryset):
+        serializer = self.get_serializer()
+        select_related, prefetch_related = get_serializer_relations(serializer)
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        if prefetch_related:
+            queryset = queryset.prefetch_related(*prefetch_related)
+        if self.is_sparse_request(serializer):
+            queryset = queryset.only(*get_serializer_columns(serializer), *self.get_ordering_columns(queryset))
+        return queryset
+
+    def is_sparse_request(self, serializer):
+        query_params = self.request.query_params
+        return isinstance(serializer, DynamicFieldsMixin) and (
+            serializer.fields_query_param in query_params or serializer.expand_query_param in query_params
+        )
+
+    def get_ordering_columns(self, queryset):
+        # Ordering and cursor positions read these columns, so they are never deferred.
+        ordering = OrderingFilter().get_ordering(self.request, queryset, self) or []
+        return [name.lstrip("-") for name in ordering if "__" not in name]
+
+
+class ExportMixin:
+    # GET .../export?format=csv|ndjson streams the filtered list through a server-side cursor,
+    # serializing one chunk at a time, so memory does not grow with the number of rows.
+    export_chunk_size = None
+
+    @action(methods=["GET"], detail=False, renderer_classes=[CSVRenderer, NDJSONRenderer])
+    def export(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        chunk_size = self.export_chunk_size or settings.EXPORT_CHUNK_SIZE
+        renderer = request.accepted_renderer
+
+        response = StreamingHttpResponse(
+            self.stream_export(renderer.render_chunks(self.iter_export_chunks(queryset, chunk_size))),
+            content_type=f"{renderer.media_type}; charset={renderer.charset}",
+        )
+        response["Content-Disposition"] = f'attachment; filename="{self.basename}.{renderer.format}"'
+        return response
+
+    def stream_export(self, content):
+        return content
+
+    def iter_export_chunks(self, queryset, chunk_size):
+        chunk = []
+        for instance in queryset.iterator(chunk_size=chunk_size):
+            chunk.append(instance)
+            if len(chunk) >= chunk_size:
+                yield self.get_serializer(chunk, many=True).data
+                chunk = []
+        if chunk:
+            yield self.get_serializer(chunk, many=True).data
+
+
+class ConditionalGetMixin:
+    # list and retrieve answer If-None-Match (and retrieve If-Modified-Since) with 304 before any row is loaded.
+    # The validators come from one aggregate over the filtered queryset: its row count and the newest of
+    # last_modified_fields, read over at most CONDITIONAL_GET_MAX_ROWS rows (larger lists get none). Lists only
+    # get an ETag: a deletion changes the count, but not the newest timestamp a Last-Modified would carry.
+    last_modified_fields = ("updated_at",)
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        etag, _ = self.get_validators(queryset, settings.CONDITIONAL_GET_MAX_ROWS)
+        response = self.get_not_modified_response(request, etag, None)
+        if response is None:
+            response = super().list(request, *args, **kwargs)
+        return self.set_validators(response, etag, None)
+
+    def retrieve(self, request, *args, **kwargs):
+        etag, last_modified = self.get_object_validators()
+        response = self.get_not_modified_response(request, etag, last_modified)
+        if response is None:
+            response = super().retrieve(request, *args, **kwargs)
+        return self.set_validators(response, etag, last_modified)
+
+    def get_object_validators(self):
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            queryset = queryset.filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+            return self.get_validators(queryset, 1, allow_empty=False)
+        except (TypeError, ValueError, ValidationError):
+            # Malformed lookups are left to get_object, which answers 404.
+            return None, None
+
+    def get_validators(self, queryset, limit, allow_empty=True):
+        fields = self.last_modified_fields
+        row = (
+            queryset.order_by()
+            .values(*fields)[: limit + 1]
+            .aggregate(count=Count("*"), **{f"max_{index}": Max(field) for index, field in enumerate(fields)})
+        )
+        count = row.pop("count")
+        if count > limit or not (count or allow_empty):
+            return None, None
+
+        timestamps = [value for value in row.values() if value is not None]
+        fingerprint = [self.basename, self.action, self.request.user.pk, count, *map(str, timestamps)]
+        etag = hashlib.md5(repr(fingerprint).encode(), usedforsecurity=False).hexdigest()
+        return f'W/"{etag}"', int(max(timestamps).timestamp()) if timestamps else None
+
+    @staticmethod
+    def get_not_modified_response(request, etag, last_modified):
+        if etag is None:
+            return None
+        return get_conditional_response(request, etag=etag, last_modified=last_modified)
+
+    @staticmethod
+    def set_validators(response, etag, last_modified):
+        if etag is not None and response.status_code in (200, 304):
+            response.headers.setdefault("ETag", etag)
+            if last_modified is not None:
+                response.headers.setdefault("Last-Modified", http_date(last_modified))
+        return response
@@ -0,0 +1,276 @@
+import json
+from base64 import b64decode
+from base64 import b64encode
+from binascii import Error as BinasciiError
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.core.paginator import InvalidPage
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import BooleanField
+from django.db.models import F
+from django.db.models import Func
+from django.db.models import Q
+from django.db.models import QuerySet
+from django.db.models import Value
+from django.utils.functional import cached_property
+from rest_framework import pagination
+from rest_framework.exceptions import NotFound
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import OrderingFilter
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+def estimate_count(queryset):
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql":
+        return None
+
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+class EstimatedCountPaginator(Paginator):
+    @cached_property
+    def count(self):
+        # Exact counts are cheap for small results; above the threshold the planner estimate is used.
+        if not isinstance(self.object_list, QuerySet):
+            return super().count
+        estimate = estimate_count(self.object_list)
+        if estimate is None or estimate < settings.PAGINATION_EXACT_COUNT_THRESHOLD:
+            return super().count
+        return estimate
+
+    async def acount(self):
+        if "count" not in self.__dict__:
+            estimate = await sync_to_async(estimate_count)(self.object_list)
+            if estimate is None or estimate < settings.PAGINATION_EXACT_COUNT_THRESHOLD:
+                estimate = await self.object_list.acount()
+            self.__dict__["count"] = estimate
+        return self.count
+
+
+class PageNumberPagination(pagination.PageNumberPagination):
+    django_paginator_class = EstimatedCountPaginator
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        # paginate_queryset() with the count and the page read through the async ORM.
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        paginator = self.django_paginator_class(queryset, page_size)
+        await paginator.acount()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(page_number=page_number, message=str(exc)))
+
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+
+        self.request = request
+        self.page.object_list = [row async for row in self.page.object_list]
+        return list(self.page)
+
+
+class RowComparison(Func):
+    output_field = BooleanField()
+    conditional = True
+
+    def __init__(self, fields, values, operator):
+        self.operator = operator
+        columns = [F(field.name) for field in fields]
+        values = [Value(value, output_field=field) for field, value in zip(fields, values)]
+        super().__init__(*columns, *values)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        sql_parts, params = [], []
+        for expression in self.source_expressions:
+            sql, expression_params = compiler.compile(expression)
+            sql_parts.append(sql)
+            params.extend(expression_params)
+
+        size = len(sql_parts) // 2
+        return f"({', '.join(sql_parts[:size])}) {self.operator} ({', '.join(sql_parts[size:])})", params
+
+
+class KeysetPagination(pagination.BasePagination):
+    cursor_query_param = "cursor"
+    page_size = api_settings.PAGE_SIZE
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset, values, reverse = self.get_page_queryset(queryset, request, view)
+        return self.get_page(list(queryset), values, reverse)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        queryset, values, reverse = self.get_page_queryset(queryset, request, view)
+        return self.get_page([row async for row in queryset], values, reverse)
+
+    def get_page_queryset(self, queryset, request, view):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.fields = [self.get_field(queryset.model, name) for name in self.ordering]
+
+        values, reverse = self.decode_cursor(request)
+        ordering = [self.flip(name) for name in self.ordering] if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(self.after(ordering, values))
+        return queryset[: self.page_size + 1], values, reverse
+
+    def get_page(self, results, values, reverse):
+        has_more = len(results) > self.page_size
+        results = results[: self.page_size]
+        if reverse:
+            results.reverse()
+
+        self.next_row = results[-1] if results and (has_more or reverse) else None
+        self.previous_row = results[0] if results and (has_more if reverse else values is not None) else None
+        return results
+
+    def get_ordering(self, request, queryset, view):
+        # A rank is computed per query and cannot be a cursor position, so ranked search results need page numbers
+        # or an explicit ?ordering=.
+        explicit = request.query_params.get(api_settings.ORDERING_PARAM)
+        if "search_rank" in queryset.query.annotations and not explicit:
+            raise ValidationError(
+                {"pagination": "Cursor pagination does not support search results ranked by relevance."}
+            )
+        ordering = OrderingFilter().get_ordering(request, queryset, view) or ["-id"]
+        ordering = [name.replace("pk", "id") if name.lstrip("-") == "pk" else name for name in ordering]
+        # The primary key is the tie-breaker that makes every cursor position unique.
+        if not {"id", "-id"} & set(ordering):
+            ordering.append("-id" if ordering[-1].startswith("-") else "id")
+        return ordering
+
+    @staticmethod
+    def get_field(model, name):
+        try:
+            field = model._meta.get_field(name.lstrip("-"))
+        except FieldDoesNotExist:
+            field = None
+        if field is None or not field.concrete or field.null or field.is_relation:
+            raise ValidationError({"ordering": f'Cursor pagination does not support ordering by "{name}".'})
+        return field
+
+    @staticmethod
+    def flip(name):
+        return name[1:] if name.startswith("-") else f"-{name}"
+
+    def after(self, ordering, values):
+        operators = {name.startswith("-") for name in ordering}
+        if len(operators) == 1:
+            # A single direction is a row comparison, which Postgres serves straight from a composite index.
+            return RowComparison(self.fields, values, "<" if operators.pop() else ">")
+
+        condition = Q()
+        for index, name in enumerate(ordering):
+            lookup = "lt" if name.startswith("-") else "gt"
+            equal = {field.name: value for field, value in zip(self.fields[:index], values)}
+            condition |= Q(**equal, **{f"{self.fields[index].name}__{lookup}": values[index]})
+        return condition
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+
+        try:
+            payload = json.loads(b64decode(encoded.encode("ascii")).decode("utf-8"))
+            values = [field.to_python(value) for field, value in zip(self.fields, payload["v"], strict=True)]
+            return values, bool(payload.get("r"))
+        except (BinasciiError, KeyError, TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, row, reverse):
+        payload = {"v": [field.value_to_string(row) for field in self.fields], "r": int(reverse)}
+        encoded = b64encode(json.dumps(payload).encode("utf-8")).decode("ascii")
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        return self.encode_cursor(self.next_row, reverse=False) if self.next_row else None
+
+    def get_previous_link(self):
+        return self.encode_cursor(self.previous_row, reverse=True) if self.previous_row else None
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "previous": self.get_previous_link(), "results": data})
+
+    def get_paginated_response_schema(self, schema):
+        return pagination.CursorPagination().get_paginated_response_schema(schema)
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "The pagination cursor value.",
+                "schema": {"type": "string"},
+            }
+        ]
+
+
+class KeysetOrPageNumberPagination(pagination.BasePagination):
+    # Clients opt in with ?pagination=cursor (or by following a cursor link); totals stay available otherwise.
+    mode_query_param = "pagination"
+
+    def __init__(self):
+        self.page_number = PageNumberPagination()
+        self.keyset = KeysetPagination()
+        self.paginator = self.page_number
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.select_paginator(request).paginate_queryset(queryset, request, view)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        return await self.select_paginator(request).apaginate_queryset(queryset, request, view)
+
+    def select_paginator(self, request):
+        cursor_mode = request.query_params.get(self.mode_query_param) == "cursor"
+        if cursor_mode or self.keyset.cursor_query_param in request.query_params:
+            self.paginator = self.keyset
+        else:
+            self.paginator = self.page_number
+        return self.paginator
+
+    def get_paginated_response(self, data):
+        return self.paginator.get_paginated_response(data)
+
+    def get_paginated_response_schema(self, schema):
+        return self.page_number.get_paginated_response_schema(schema)
+
+    def get_schema_fields(self, view):
+        return self.page_number.get_schema_fields(view)
+
+    def get_schema_operation_parameters(self, view):
+        return (
+            self.page_number.get_schema_operation_parameters(view)
+            + self.keyset.get_schema_operation_parameters(view)
+            + [
+                {
+                    "name": self.mode_query_param,
+                    "required": False,
+                    "in": "query",
+                    "description": 'Set to "cursor" for keyset pagination without totals.',
+                    "schema": {"type": "string", "enum": ["cursor"]},
+                }
+            ]
+        )
+
+    def to_html(self):
+        return self.paginator.to_html()
@@ -0,0 +1,64 @@
+import codecs
+import csv
+import json
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+from rest_framework.parsers import JSONParser
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def iter_lines(stream, parser_context):
+    encoding = (parser_context or {}).get("encoding", settings.DEFAULT_CHARSET)
+    return codecs.iterdecode(iter(stream.readline, b""), encoding)
+
+
+class ORJSONParser(JSONParser):
+    # JSONParser backed by orjson, falling back to the stock parser when orjson is not installed.
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get("encoding", settings.DEFAULT_CHARSET)
+        if orjson is None or codecs.lookup(encoding).name != "utf-8":
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f"JSON parse error - {exc}")
+
+
+class NDJSONParser(BaseParser):
+    # Yields one object per line while the body is read, so large uploads are never held in memory.
+    media_type = "application/x-ndjson"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        return self.iter_rows(iter_lines(stream, parser_context))
+
+    @staticmethod
+    def iter_rows(lines):
+        for number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as exc:
+                raise ParseError(f"NDJSON parse error on line {number} - {exc}")
+
+
+class CSVParser(BaseParser):
+    # Yields one dict per row keyed by the header line.
+    media_type = "text/csv"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        return self.iter_rows(iter_lines(stream, parser_context))
+
+    @staticmethod
+    def iter_rows(lines):
+        try:
+            yield from csv.DictReader(lines)
+        except csv.Error as exc:
+            raise ParseError(f"CSV parse error - {exc}")
@@ -0,0 +1,15 @@
+import hmac
+
+from django.conf import settings
+from rest_framework.permissions import BasePermission
+
+
+class HasMetricsToken(BasePermission):
+    # "Authorization: Token <METRICS_TOKEN>", the credentials a Prometheus scrape job is given. The scheme is not
+    # the JWT one, so JWT authentication leaves the header alone. An empty METRICS_TOKEN turns it off.
+
+    def has_permission(self, request, view):
+        token = settings.METRICS_TOKEN
+        if not token:
+            return False
+        return hmac.compare_digest(request.headers.get("Authorization", "").encode(), f"Token {token}".encode())
@@ -0,0 +1,113 @@
+import os
+import threading
+
+from django.db.backends.postgresql import base
+from django.db.backends.postgresql.creation import DatabaseCreation as BaseDatabaseCreation
+from django.db.backends.postgresql.psycopg_any import IsolationLevel
+from django.utils.asyncio import async_unsafe
+from psycopg_pool import ConnectionPool
+
+NO_DB_ALIAS = "__no_db__"
+
+
+class DatabaseCreation(BaseDatabaseCreation):
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # Idle pooled connections to the test database would block DROP DATABASE.
+        self.connection.close_pool()
+        return super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    # PostgreSQL backend whose connections come from a psycopg_pool.ConnectionPool shared by all threads of the
+    # process: closing a connection at the end of a request hands it back to the pool instead of disconnecting.
+    # OPTIONS["pool"] holds the ConnectionPool arguments (min_size, max_size, max_idle, timeout, ...), and
+    # CONN_HEALTH_CHECKS makes the pool check a connection before lending it. Keep CONN_MAX_AGE at 0.
+    creation_class = DatabaseCreation
+
+    _pools = {}
+    _pools_lock = threading.Lock()
+    _inherited_pools = []
+
+    @property
+    def pool_key(self):
+        return self.alias, self.settings_dict["NAME"]
+
+    @property
+    def pool(self):
+        if self.alias == NO_DB_ALIAS or self.settings_dict["NAME"] is None:
+            return None
+        pool = self._pools.get(self.pool_key)
+        if pool is None:
+            with self._pools_lock:
+                pool = self._pools.get(self.pool_key)
+                if pool is None:
+                    pool = ConnectionPool(
+                        kwargs=self.get_connection_params(),
+                        check=ConnectionPool.check_connection if self.settings_dict["CONN_HEALTH_CHECKS"] else None,
+                        name=self.alias,
+                        open=True,
+                        **self.settings_dict["OPTIONS"].get("pool", {}),
+                    )
+                    self._pools[self.pool_key] = pool
+        return pool
+
+    @classmethod
+    def forget_pools(cls):
+        # In a forked child the pools' worker threads are gone and their idle connections share sockets with the
+        # parent, so the child starts pools of its own. The inherited ones stay referenced and are never closed:
+        # closing (or collecting) them would end the parent's sessions.
+        cls._inherited_pools.extend(cls._pools.values())
+        cls._pools = {}
+        cls._pools_lock = threading.Lock()
+
+    def close_pool(self):
+        with self._pools_lock:
+            pool = self._pools.pop(self.pool_key, None)
+        if pool is not None:
+            self.close()
+            pool.close()
+
+    def pool_stats(self):
+        # Counters accumulate since the pool opened; saturation is the share of max_size currently lent out.
+        pool = self._pools.get(self.pool_key)
+        if pool is None:
+            return None
+        stats = pool.get_stats()
+        in_use = stats["pool_size"] - stats["pool_available"]
+        queued = stats.get("requests_queued", 0)
+        return {
+            **stats,
+            "in_use": in_use,
+            "saturation": round(in_use / stats["pool_max"], 3),
+            "wait_ms_avg": round(stats.get("requests_wait_ms", 0) / queued, 3) if queued else 0,
+        }
+
+    def get_connection_params(self):
+        conn_params = super().get_connection_params()
+        conn_params.pop("pool", None)
+        return conn_params
+
+    @async_unsafe
+    def get_new_connection(self, conn_params):
+        pool = self.pool
+        if pool is None:
+            return super().get_new_connection(conn_params)
+
+        isolation_level = self.settings_dict["OPTIONS"].get("isolation_level")
+        self.isolation_level = IsolationLevel(isolation_level) if isolation_level else IsolationLevel.READ_COMMITTED
+        connection = pool.getconn()
+        # Pooled connections keep the session settings of their previous borrower.
+        connection.isolation_level = self.isolation_level if isolation_level else None
+        return connection
+
+    def _close(self):
+        pool = getattr(self.connection, "_pool", None)
+        if pool is None:
+            return super()._close()
+        with self.wrap_database_errors:
+            pool.putconn(self.connection)
+        # The connection may be lent to another thread from now on, even when closed inside an atomic block.
+        self.connection = None
+
+
+os.register_at_fork(after_in_child=DatabaseWrapper.forget_pools)
@@ -0,0 +1,144 @@
+import logging
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+from django_redis import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+probe_connections = threading.local()
+
+
+def probe_connection():
+    # This thread's own wrapper for the default database, so the probe can connect with a READY_CHECK_TIMEOUT connect
+    # timeout (libpq counts whole seconds, 2 at least) without touching the settings the requests connect with.
+    connection = getattr(probe_connections, "default", None)
+    if connection is None:
+        default = connections["default"]
+        settings_dict = {**default.settings_dict, "OPTIONS": {**default.settings_dict["OPTIONS"]}}
+        connection = probe_connections.default = type(default)(settings_dict, default.alias)
+    connection.settings_dict["OPTIONS"]["connect_timeout"] = max(math.ceil(settings.READY_CHECK_TIMEOUT), 1)
+    return connection
+
+
+def check_database():
+    # One query that also reads how many client connections the server has left, cancelled by the server
+    # after READY_CHECK_TIMEOUT so a hung database does not keep the probe thread and its connection. The
+    # connection is released the way a request releases it: closed, kept (CONN_MAX_AGE) or returned to the pool.
+    connection = probe_connection()
+    try:
+        started = time.perf_counter()
+        with connection.cursor() as cursor, connection.connection.transaction():
+            cursor.execute(f"SET LOCAL statement_timeout = {max(int(settings.READY_CHECK_TIMEOUT * 1000), 1)}")
+            cursor.execute(
+                "SELECT count(*), current_setting('max_connections')::int "
+                "FROM pg_stat_activity WHERE backend_type = 'client backend'"
+            )
+            used, limit = cursor.fetchone()
+        latency = time.perf_counter() - started
+        pool = connection.pool_stats() if hasattr(connection, "pool_stats") else None
+    finally:
+        connection.close_if_unusable_or_obsolete()
+
+    return {
+        "latency_ms": round(latency * 1000, 3),
+        "budget_ms": settings.READY_DATABASE_BUDGET_MS,
+        "connections": {"used": used, "max": limit, "utilization": round(used / limit, 3)},
+        "pool": pool,
+        # Requests queueing for a pooled connection mean this worker cannot take more traffic.
+        "saturated": bool(pool and pool.get("requests_waiting", 0)),
+    }
+
+
+def check_cache():
+    client = get_redis_connection("default")
+    started = time.perf_counter()
+    client.ping()
+    latency = time.perf_counter() - started
+    clients = client.info("clients")
+
+    return {
+        "latency_ms": round(latency * 1000, 3),
+        "budget_ms": settings.READY_CACHE_BUDGET_MS,
+        "clients": {"connected": clients.get("connected_clients"), "blocked": clients.get("blocked_clients")},
+        "saturated": False,
+    }
+
+
+class ReadinessProbe:
+    # Runs every check in parallel, each bounded by READY_CHECK_TIMEOUT, and keeps the result for
+    # READY_CACHE_SECONDS. Concurrent probes wait for the running check instead of starting their own, so the
+    # dependencies see at most one check per interval and process.
+
+    def __init__(self, checks):
+        self.checks = checks
+        self.executor = ThreadPoolExecutor(max_workers=len(checks), thread_name_prefix="readiness")
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.result = None
+        self.expires_at = 0
+
+    def get(self):
+        with self.lock:
+            if self.result is None or time.monotonic() >= self.expires_at:
+                self.result = self.run()
+                self.expires_at = time.monotonic() + settings.READY_CACHE_SECONDS
+            return self.result
+
+    def reset(self):
+        with self.lock:
+            self.result = None
+
+    def run(self):
+        timeout = settings.READY_CHECK_TIMEOUT
+        deadline = time.monotonic() + timeout
+        futures = {}
+        for name, check in self.checks.items():
+            # A check still hanging from an earlier probe is waited on again rather than piled up behind.
+            future = self.pending.get(name)
+            if future is None or future.done():
+                future = self.pending[name] = self.executor.submit(check)
+            futures[name] = future
+
+        results = {}
+        for name, future in futures.items():
+            try:
+                result = future.result(timeout=max(deadline - time.monotonic(), 0))
+            except FutureTimeoutError:
+                logger.warning("Readiness check %s got no answer within %s s.", name, timeout)
+                result = {"ok": False, "error": "timeout"}
+            except Exception as exc:
+                logger.warning("Readiness check %s failed.", name, exc_info=True)
+                result = {"ok": False, "error": "unavailable", "detail": f"{type(exc).__name__}: {exc}"}
+            else:
+                result["ok"] = result["latency_ms"] <= result["budget_ms"] and not result["saturated"]
+                if not result["ok"]:
+                    logger.warning("Readiness check %s is over its budget or saturated: %s", name, result)
+            results[name] = result
+
+        return {
+            "ready": all(result["ok"] for result in results.values()),
+            "checked_at": timezone.now(),
+            "checks": results,
+        }
+
+
+def public_result(result):
+    # What anonymous callers see: no error text (hosts, users) and no connection or pool figures.
+    fields = ("ok", "error", "latency_ms", "budget_ms", "saturated")
+    return {
+        **result,
+        "checks": {
+            name: {key: value for key, value in check.items() if key in fields}
+            for name, check in result["checks"].items()
+        },
+    }
+
+
+readiness_probe = ReadinessProbe({"database": check_database, "cache": check_cache})
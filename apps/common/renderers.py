@@ -0,0 +1,123 @@
+import csv
+import datetime
+import decimal
+import json
+import uuid
+from io import StringIO
+
+from django.db.models import QuerySet
+from django.utils.encoding import force_str
+from django.utils.functional import Promise
+from rest_framework import serializers
+from rest_framework.renderers import BaseRenderer
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+from apps.common.metrics import record_render
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def flatten(row, prefix=""):
+    # Nested objects become "owner.email" style columns.
+    flat = {}
+    for name, value in row.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{name}."))
+        elif isinstance(value, list):
+            flat[f"{prefix}{name}"] = json.dumps(value, cls=JSONEncoder)
+        else:
+            flat[f"{prefix}{name}"] = value
+    return flat
+
+
+class StreamingRenderer(BaseRenderer):
+    # render_chunks() turns an iterable of row lists into an iterable of encoded chunks for StreamingHttpResponse.
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        rows = data if isinstance(data, list) else [data]
+        return b"".join(self.render_chunks([rows]))
+
+    def render_chunks(self, chunks):
+        raise NotImplementedError
+
+
+class CSVRenderer(StreamingRenderer):
+    media_type = "text/csv"
+    format = "csv"
+
+    def render_chunks(self, chunks):
+        buffer = StringIO()
+        writer = None
+        for rows in chunks:
+            for row in rows:
+                row = flatten(row)
+                if writer is None:
+                    writer = csv.DictWriter(buffer, fieldnames=list(row), extrasaction="ignore")
+                    writer.writeheader()
+                writer.writerow(row)
+            yield buffer.getvalue().encode(self.charset)
+            buffer.seek(0)
+            buffer.truncate()
+
+
+class NDJSONRenderer(StreamingRenderer):
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+
+    def render_chunks(self, chunks):
+        for rows in chunks:
+            yield "".join(json.dumps(row, cls=JSONEncoder) + "\n" for row in rows).encode(self.charset)
+
+
+# Values that did not go through a serializer are rendered the way the matching DRF field would render them.
+DATETIME_FIELD = serializers.DateTimeField()
+DATE_FIELD = serializers.DateField()
+TIME_FIELD = serializers.TimeField()
+DURATION_FIELD = serializers.DurationField()
+DECIMAL_FIELD = serializers.DecimalField(max_digits=None, decimal_places=None)
+
+
+def orjson_default(obj):
+    if isinstance(obj, datetime.datetime):
+        return DATETIME_FIELD.to_representation(obj)
+    if isinstance(obj, datetime.date):
+        return DATE_FIELD.to_representation(obj)
+    if isinstance(obj, datetime.time):
+        return TIME_FIELD.to_representation(obj)
+    if isinstance(obj, datetime.timedelta):
+        return DURATION_FIELD.to_representation(obj)
+    if isinstance(obj, decimal.Decimal):
+        return DECIMAL_FIELD.to_representation(obj)
+    if isinstance(obj, Promise):
+        return force_str(obj)
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    if isinstance(obj, QuerySet):
+        return tuple(obj)
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    if hasattr(obj, "__iter__"):
+        return tuple(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+class ORJSONRenderer(JSONRenderer):
+    # JSONRenderer backed by orjson, falling back to the stock encoder when orjson is not installed.
+    # Datetimes follow DATETIME_FORMAT and durations and decimals render as their serializer fields.
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with record_render():
+            if orjson is None:
+                return super().render(data, accepted_media_type, renderer_context)
+            if data is None:
+                return b""
+
+            option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+            if self.get_indent(accepted_media_type, renderer_context or {}):
+                option |= orjson.OPT_INDENT_2
+            return orjson.dumps(data, default=orjson_default, option=option)
@@ -0,0 +1,31 @@
+from django.contrib.postgres.search import SearchQuery
+from django.contrib.postgres.search import SearchRank
+from django.contrib.postgres.search import SearchVectorField
+from django.db.models import Expression
+
+SEARCH_CONFIG = "english"
+
+
+class SearchVectorColumn(Expression):
+    # A generated tsvector column added by a migration, so the model does not declare it. The table alias is
+    # resolved at compile time, which keeps the column valid inside relabelled subqueries.
+    output_field = SearchVectorField()
+
+    def __init__(self, column="search_vector"):
+        super().__init__()
+        self.column = column
+
+    def as_sql(self, compiler, connection):
+        alias = compiler.query.get_initial_alias()
+        return f"{compiler.quote_name_unless_alias(alias)}.{connection.ops.quote_name(self.column)}", []
+
+
+def search_query(terms):
+    return SearchQuery(terms, config=SEARCH_CONFIG, search_type="websearch")
+
+
+def full_text_search(queryset, terms):
+    # Rows whose search vector matches the terms (GIN index), annotated with their search_rank.
+    vector, query = SearchVectorColumn(), search_query(terms)
+    matches = queryset.alias(search_vector=vector).filter(search_vector=query)
+    return matches.annotate(search_rank=SearchRank(vector, query))
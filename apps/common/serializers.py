@@ -0,0 +1,44 @@
+from rest_framework import serializers
+
+
+def parse_query_list(value):
+    return {name.strip() for name in value.split(",") if name.strip()}
+
+
+class DynamicFieldsMixin:
+    # ?fields=id,duration keeps only the listed fields, ?expand=task embeds only the listed nested objects
+    # (the others are returned as primary keys). Without ?expand= every nested object is embedded.
+    fields_query_param = "fields"
+    expand_query_param = "expand"
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get("request")
+        if request is None or not self.is_root_serializer():
+            return fields
+
+        if self.fields_query_param in request.query_params:
+            requested = parse_query_list(request.query_params[self.fields_query_param])
+            fields = {name: field for name, field in fields.items() if name in requested}
+
+        if self.expand_query_param in request.query_params:
+            expand = parse_query_list(request.query_params[self.expand_query_param])
+            for name, field in fields.items():
+                if isinstance(field, serializers.BaseSerializer) and name not in expand:
+                    fields[name] = serializers.PrimaryKeyRelatedField(read_only=True, source=field.source)
+
+        return fields
+
+    def is_root_serializer(self):
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        return parent is None
+
+    def get_shape(self):
+        # The fields and embedded objects this request gets, whatever the order, spelling or junk in its query
+        # parameters: e.g. "id,owner+,title" when only owner is embedded. Suitable as part of a cache key.
+        shape = []
+        for name, field in self.fields.items():
+            shape.append(f"{name}+" if isinstance(field, serializers.BaseSerializer) else name)
+        return ",".join(sorted(shape))
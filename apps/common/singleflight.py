@@ -0,0 +1,53 @@
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+from django.core.cache import cache
+
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+
+
+def single_flight(key, compute, timeout=None):
+    # Concurrent callers in this process share the result of one compute() call.
+    with _in_flight_lock:
+        future = _in_flight.get(key)
+        leader = future is None
+        if leader:
+            future = _in_flight[key] = Future()
+
+    if not leader:
+        return future.result(timeout=timeout)
+
+    try:
+        result = compute()
+    except BaseException as exc:
+        future.set_exception(exc)
+        raise
+    else:
+        future.set_result(result)
+        return result
+    finally:
+        with _in_flight_lock:
+            _in_flight.pop(key, None)
+
+
+@contextmanager
+def distributed_lock(key, timeout, blocking_timeout=None, poll_interval=0.05):
+    # SET NX on the shared cache, so at most one process holds the lock until it is released or expires.
+    lock_key = f"lock:{key}"
+    token = uuid.uuid4().hex
+    deadline = None if blocking_timeout is None else time.monotonic() + blocking_timeout
+
+    acquired = cache.add(lock_key, token, timeout=timeout)
+    while not acquired and (deadline is None or time.monotonic() < deadline):
+        time.sleep(poll_interval)
+        acquired = cache.add(lock_key, token, timeout=timeout)
+
+    try:
+        yield acquired
+    finally:
+        if acquired and cache.get(lock_key) == token:
+            cache.delete(lock_key)
@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.db import connection
+from django.test.runner import DiscoverRunner
+from django.test.utils import CaptureQueriesContext
+from rest_framework.settings import api_settings
+
+
+class QueryBudgetMixin:
+    def count_queries(self, url, data=None):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, data=data)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def assertQueriesDoNotScale(self, url, create_rows, data=None, budget=None):
+        # Compares a one-row page with a full page; any per-row query shows up as a difference.
+        create_rows(1)
+        single_row = self.count_queries(url, data)
+        create_rows(api_settings.PAGE_SIZE)
+        full_page = self.count_queries(url, data)
+
+        self.assertEqual(
+            single_row, full_page, f"{url} ran {single_row} queries for one row and {full_page} for a full page"
+        )
+        if budget is not None:
+            self.assertLessEqual(full_page, budget, f"{url} ran {full_page} queries, the budget is {budget}")
+        return full_page
+
+
+class TestRunner(DiscoverRunner):
+    # The test run's lock waits and concurrency tests would fill its output with slow request and query logs; the
+    # tests that need them turn them back on with override_settings.
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        settings.SLOW_REQUEST_MS = settings.SLOW_QUERY_MS = settings.SQL_LOG_SAMPLE_RATE = 0
@@ -1,6 +1,53 @@
+import json
+import logging
+import multiprocessing
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from datetime import timedelta
+from datetime import timezone as dt_timezone
+from decimal import Decimal
+from io import BytesIO
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache as django_cache
+from django.core.management import call_command
+
+from django.db import OperationalError
+from django.db import connection
+from django.db import connections
+
+from django.test import SimpleTestCase
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+from apps.common.benchmark import Scenario
+from apps.common.benchmark import percentile
+from apps.common.benchmark import run_scenario
+from apps.common.cache import VersionedCache
+from apps.common.log import JSONFormatter
+from apps.common.log import QueueStreamHandler
+from apps.common.metrics import Histogram
+from apps.common.metrics import REGISTRY
+from apps.common.parsers import ORJSONParser
+from apps.common.readiness import ReadinessProbe
+from apps.common.readiness import check_database
+from apps.common.readiness import probe_connection
+from apps.common.readiness import readiness_probe
+from apps.common.postgresql_pool.base import DatabaseWrapper as PooledDatabaseWrapper
+from apps.common.renderers import ORJSONRenderer
+from apps.common.singleflight import distributed_lock
+from apps.common.singleflight import single_flight
+from apps.users.cache import user_cache
 from apps.users.models import User
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
 from rest_framework.reverse import reverse
 from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
 
 
 class TestCommon(APITestCase):
@@ -14,3 +61,498 @@ class TestCommon(APITestCase):
     def test_health_view(self):
         response = self.client.get(reverse("health_view"))
         self.assertEqual(response.status_code, 200)
+
+    def test_run_scenario(self):
+        setup_calls = []
+        scenario = Scenario("health", "GET", reverse("health_view"), setup=lambda: setup_calls.append(True))
+
+        result = run_scenario(self.client, scenario, iterations=4, warmup=1, memory_iterations=1)
+
+        self.assertEqual(len(setup_calls), 6)
+        self.assertEqual(result["status_codes"], {"200": 4})
+        self.assertEqual(set(result["latency_ms"]), {"p50", "p95", "p99", "mean"})
+        self.assertGreater(result["memory_peak_kib"], 0)
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+
+        self.assertEqual([percentile(values, p) for p in (50, 95, 99, 100)], [50, 95, 99, 100])
+        self.assertEqual(percentile([7], 99), 7)
+
+
+class SingleFlightTestCase(SimpleTestCase):
+    callers = 200
+
+    def run_concurrently(self, call):
+        barrier = threading.Barrier(self.callers)
+
+        def run(_):
+            barrier.wait()
+            return call()
+
+        with ThreadPoolExecutor(max_workers=self.callers) as executor:
+            return list(executor.map(run, range(self.callers)))
+
+    def slow_counter(self, value):
+        calls = []
+
+        def compute():
+            calls.append(True)
+            # Long enough for every caller to reach the cache first, even on one busy CPU.
+            threading.Event().wait(1)
+            return value
+
+        return compute, calls
+
+    def test_single_flight(self):
+        compute, calls = self.slow_counter(42)
+
+        results = self.run_concurrently(lambda: single_flight("answer", compute))
+
+        self.assertEqual(results, [42] * self.callers)
+        self.assertEqual(len(calls), 1)
+
+    def test_versioned_cache_recomputes_once(self):
+        cache = VersionedCache(f"test-{uuid.uuid4().hex}", timeout=60)
+        compute, calls = self.slow_counter([1, 2, 3])
+
+        results = self.run_concurrently(lambda: cache.get_or_set(("key",), compute))
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual({value == [1, 2, 3] for value, _ in results}, {True})
+        self.assertEqual(sorted({status for _, status in results}), ["coalesced", "miss"])
+
+    def test_stale_value_is_served_while_another_process_recomputes(self):
+        cache = VersionedCache(f"test-{uuid.uuid4().hex}", timeout=60, lock_timeout=5)
+        cache.get_or_set(("key",), lambda: "old")
+        # The entry expired, the data did not change.
+        key = cache.make_key("data", *cache.versions(), "key")
+        django_cache.delete(key)
+
+        with distributed_lock(key, timeout=5) as acquired:
+            self.assertTrue(acquired)
+            value, status = cache.get_or_set(("key",), lambda: "new")
+
+        self.assertEqual((value, status), ("old", "stale"))
+        self.assertEqual(cache.get_or_set(("key",), lambda: "new"), ("new", "miss"))
+
+    def test_bumped_value_is_never_served_stale(self):
+        cache = VersionedCache(f"test-{uuid.uuid4().hex}", timeout=60, lock_timeout=0.2)
+        cache.get_or_set(("key",), lambda: "old")
+        cache.bump()
+        key = cache.make_key("data", *cache.versions(), "key")
+
+        with distributed_lock(key, timeout=5) as acquired:
+            self.assertTrue(acquired)
+            value, status = cache.get_or_set(("key",), lambda: "new")
+
+        self.assertEqual((value, status), ("new", "miss"))
+
+    def test_scoped_bump(self):
+        cache = VersionedCache(f"test-{uuid.uuid4().hex}", timeout=60)
+        for scope in (1, 2):
+            cache.get_or_set(("key",), lambda: "old", scope=scope)
+
+        cache.bump(1)
+        self.assertEqual(cache.get_or_set(("key",), lambda: "new", scope=1), ("new", "miss"))
+        self.assertEqual(cache.get_or_set(("key",), lambda: "new", scope=2), ("old", "hit"))
+
+        cache.bump()
+        self.assertEqual(cache.get_or_set(("key",), lambda: "newer", scope=2), ("newer", "miss"))
+
+    def test_distributed_lock_is_exclusive(self):
+        key = uuid.uuid4().hex
+
+        with distributed_lock(key, timeout=5) as first:
+            with distributed_lock(key, timeout=5, blocking_timeout=0.1) as second:
+                self.assertEqual((first, second), (True, False))
+
+        with distributed_lock(key, timeout=5, blocking_timeout=0) as third:
+            self.assertTrue(third)
+
+
+class DatabasePoolTestCase(APITestCase):
+    def setUp(self) -> None:
+        settings_dict = {
+            **connection.settings_dict,
+            "ENGINE": "apps.common.postgresql_pool",
+            "CONN_HEALTH_CHECKS": True,
+            "OPTIONS": {"pool": {"min_size": 1, "max_size": 1, "timeout": 5}},
+        }
+        self.pooled = PooledDatabaseWrapper(settings_dict, alias="pool_test")
+        self.addCleanup(self.pooled.close_pool)
+
+    def test_closed_connections_are_reused(self):
+        with self.pooled.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        raw_connection = self.pooled.connection
+        self.assertEqual(self.pooled.pool_stats()["in_use"], 1)
+        self.assertEqual(self.pooled.pool_stats()["saturation"], 1)
+
+        self.pooled.close()
+        self.assertIsNone(self.pooled.connection)
+        self.assertEqual(self.pooled.pool_stats()["in_use"], 0)
+
+        with self.pooled.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        self.assertIs(self.pooled.connection, raw_connection)
+        self.pooled.close()
+
+    def test_forked_child_opens_its_own_pool(self):
+        with self.pooled.cursor() as cursor:
+            cursor.execute("SELECT pg_backend_pid()")
+            parent_pid = cursor.fetchone()[0]
+        self.pooled.close()
+
+        def child(conn):
+            with self.pooled.cursor() as cursor:
+                cursor.execute("SELECT pg_backend_pid()")
+                conn.send(cursor.fetchone()[0])
+            self.pooled.close_pool()
+
+        context = multiprocessing.get_context("fork")
+        receiver, sender = context.Pipe(duplex=False)
+        process = context.Process(target=child, args=(sender,))
+        process.start()
+        process.join(timeout=30)
+        self.assertEqual(process.exitcode, 0)
+        self.assertNotEqual(receiver.recv(), parent_pid)
+
+        # The parent's idle connection survived the child.
+        with self.pooled.cursor() as cursor:
+            cursor.execute("SELECT pg_backend_pid()")
+            self.assertEqual(cursor.fetchone()[0], parent_pid)
+        self.pooled.close()
+
+    def test_pool_stats_view(self):
+        self.pooled.ensure_connection()
+        self.pooled.close()
+
+        self.client.force_authenticate(user=User.objects.create(email="admin@example.com", is_staff=True))
+        with mock.patch.object(connections, "all", return_value=[connection, self.pooled]):
+            response = self.client.get(reverse("db_pool_stats_view"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("pool_test", response.data)
+        self.assertEqual(response.data["pool_test"]["pool_max"], 1)
+        self.assertEqual(response.data["pool_test"]["in_use"], 0)
+
+    def test_pool_stats_view_requires_admin(self):
+        self.client.force_authenticate(user=User.objects.create(email="user@example.com"))
+        response = self.client.get(reverse("db_pool_stats_view"))
+        self.assertEqual(response.status_code, 403)
+
+
+class ORJSONTestCase(SimpleTestCase):
+    def test_render_matches_serializer_fields(self):
+        data = {
+            "at": datetime(2023, 10, 5, 14, 30, 15, 123456, tzinfo=dt_timezone.utc),
+            "day": datetime(2023, 10, 5).date(),
+            "duration": timedelta(hours=1, minutes=30),
+            "amount": Decimal("12.50"),
+            "id": uuid.UUID(int=1),
+            1: ["text", None, True],
+        }
+
+        rendered = json.loads(ORJSONRenderer().render(data))
+
+        self.assertEqual(
+            rendered,
+            {
+                "at": "2023-10-05T14:30:15Z",
+                "day": "2023-10-05",
+                "duration": "01:30:00",
+                "amount": "12.50",
+                "id": "00000000-0000-0000-0000-000000000001",
+                "1": ["text", None, True],
+            },
+        )
+
+    def test_render_serialized_data_like_the_stock_renderer(self):
+        data = {"results": [{"id": 1, "title": "Zoë", "duration": "01:00:00"}], "next": None}
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(ORJSONRenderer().render(None), b"")
+
+    def test_parse(self):
+        self.assertEqual(ORJSONParser().parse(BytesIO('{"title": "Zoë"}'.encode())), {"title": "Zoë"})
+        with self.assertRaises(ParseError):
+            ORJSONParser().parse(BytesIO(b"{"))
+
+    def test_falls_back_without_orjson(self):
+        data = {"title": "Zoë", "count": 2}
+        with mock.patch("apps.common.renderers.orjson", None), mock.patch("apps.common.parsers.orjson", None):
+            self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+            self.assertEqual(ORJSONParser().parse(BytesIO(b'{"title": "Zo\\u00eb"}')), {"title": "Zoë"})
+
+    def test_bench_json(self):
+        output = StringIO()
+        call_command("bench_json", rows=10, iterations=2, stdout=output)
+
+        report = json.loads(output.getvalue())
+        self.assertTrue(report["identical_output"])
+        self.assertEqual(
+            [result["name"] for result in report["results"]],
+            ["serialize", "render-json", "render-orjson", "parse-json", "parse-orjson"],
+        )
+
+
+class MetricsTestCase(APITestCase):
+    fixtures = ["users"]
+
+    def setUp(self) -> None:
+        self.user = User.objects.get(email="user1@email.com")
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}")
+        user_cache.clear()
+
+    def test_server_timing(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("users-list"))
+
+        timing = dict(entry.split(";", 1) for entry in response["Server-Timing"].split(", "))
+        self.assertEqual(set(timing), {"total", "db", "cache", "render"})
+        self.assertIn(f'desc="{len(queries)} queries"', timing["db"])
+        self.assertEqual(timing["cache"], 'desc="0 hits / 1 misses"')
+
+        response = self.client.get(reverse("users-list"))
+        self.assertIn('cache;desc="1 hits / 0 misses"', response["Server-Timing"])
+
+    @override_settings(METRICS_TOKEN="scrape-secret")
+    def test_metrics_view(self):
+        self.client.get(reverse("users-list"))
+        self.client.generic("BREW", reverse("users-list"))
+        self.client.credentials()
+
+        self.assertEqual(self.client.get(reverse("metrics_view")).status_code, 401)
+        self.client.credentials(HTTP_AUTHORIZATION="Token wrong")
+        self.assertEqual(self.client.get(reverse("metrics_view")).status_code, 401)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}")
+        self.assertEqual(self.client.get(reverse("metrics_view")).status_code, 403)
+
+        self.client.credentials(HTTP_AUTHORIZATION="Token scrape-secret")
+        response = self.client.get(reverse("metrics_view"))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain; version=0.0.4"))
+        body = response.content.decode()
+        self.assertIn(
+            'http_request_duration_seconds_bucket{view="users-list",method="GET",status="200",le="+Inf"}', body
+        )
+        self.assertIn('http_request_db_queries_count{view="users-list"}', body)
+        self.assertIn('cache_requests_total{namespace="auth_user",result="miss"}', body)
+        self.assertIn('view="users-list",method="other",status="405"', body)
+        self.assertNotIn("BREW", body)
+
+    @override_settings(SLOW_REQUEST_MS=1)
+    def test_slow_requests_are_logged(self):
+        with self.assertLogs("apps.common.metrics", "WARNING") as logs:
+            self.client.get(reverse("users-list"))
+        self.assertIn("Slow request GET /users (users-list) 200:", logs.output[0])
+        self.assertIn("queries in", logs.output[0])
+
+    @override_settings(SLOW_QUERY_MS=0.001, SQL_LOG_SAMPLE_RATE=0)
+    def test_slow_queries_are_logged(self):
+        with self.assertLogs("apps.common.sql", "INFO") as logs:
+            response = self.client.get(reverse("users-list"), HTTP_X_REQUEST_ID="req-1")
+        self.assertEqual(response["X-Request-ID"], "req-1")
+        record = logs.records[0]
+        self.assertEqual(record.levelname, "WARNING")
+        self.assertEqual((record.request_id, record.view, record.sampled), ("req-1", "users-list", False))
+        self.assertIn("SELECT", record.sql)
+
+    @override_settings(SLOW_QUERY_MS=10000, SQL_LOG_SAMPLE_RATE=1)
+    def test_sampled_queries_are_logged(self):
+        with self.assertLogs("apps.common.sql", "INFO") as logs:
+            response = self.client.get(reverse("users-list"), HTTP_X_REQUEST_ID="not a valid id")
+        self.assertEqual(len(response["X-Request-ID"]), 32)
+        self.assertEqual(logs.records[0].levelname, "INFO")
+        self.assertTrue(all(record.sampled for record in logs.records))
+        self.assertEqual(logs.records[0].request_id, response["X-Request-ID"])
+
+    @override_settings(SLOW_QUERY_MS=10000, SQL_LOG_SAMPLE_RATE=0)
+    def test_fast_queries_are_not_logged(self):
+        with self.assertNoLogs("apps.common.sql", "INFO"):
+            self.client.get(reverse("users-list"))
+
+
+class LoggingTestCase(SimpleTestCase):
+    def test_json_formatter(self):
+        record = logging.makeLogRecord(
+            {"name": "test", "levelname": "WARNING", "msg": "%s query", "args": ("Slow",), "request_id": "req-1"}
+        )
+        data = json.loads(JSONFormatter().format(record))
+        self.assertEqual(data["message"], "Slow query")
+        self.assertEqual((data["level"], data["logger"], data["request_id"]), ("WARNING", "test", "req-1"))
+        self.assertNotIn("args", data)
+
+    def test_json_formatter_without_orjson(self):
+        record = logging.makeLogRecord({"msg": "at %s", "args": (datetime(2024, 1, 1),), "view": "users-list"})
+        with mock.patch("apps.common.log.orjson", None):
+            data = json.loads(JSONFormatter().format(record))
+        self.assertEqual((data["message"], data["view"]), ("at 2024-01-01 00:00:00", "users-list"))
+
+    def test_queue_stream_handler(self):
+        stream = StringIO()
+        handler = QueueStreamHandler(stream)
+        handler.setFormatter(JSONFormatter())
+        logger = logging.getLogger("apps.common.tests.queue")
+        logger.addHandler(handler)
+        try:
+            items = ["before"]
+            logger.warning("%s", items, extra={"view": "users-list"})
+            items.append("after")
+            try:
+                raise ValueError("boom")
+            except ValueError:
+                logger.exception("failed")
+        finally:
+            logger.removeHandler(handler)
+            handler.close()
+
+        first, second = (json.loads(line) for line in stream.getvalue().splitlines())
+        # The message is resolved when the record is queued, not when the listener writes it.
+        self.assertEqual((first["message"], first["view"]), ("['before']", "users-list"))
+        self.assertIn("ValueError: boom", second["exception"])
+        self.assertIsNone(handler.listener._thread)
+
+    def test_queue_stream_handler_in_forked_child(self):
+        context = multiprocessing.get_context("fork")
+        receiver, sender = context.Pipe(duplex=False)
+
+        class PipeStream:
+            def write(self, text):
+                sender.send(text)
+
+            def flush(self):
+                pass
+
+        handler = QueueStreamHandler(PipeStream())
+        logger = logging.getLogger("apps.common.tests.fork")
+        logger.addHandler(handler)
+
+        def child():
+            logger.warning("from the child")
+            handler.close()
+
+        try:
+            process = context.Process(target=child)
+            process.start()
+            process.join(timeout=30)
+        finally:
+            logger.removeHandler(handler)
+            handler.close()
+
+        self.assertEqual(process.exitcode, 0)
+        self.assertTrue(receiver.poll(5))
+        self.assertEqual(receiver.recv(), "from the child\n")
+
+
+class ReadinessTestCase(APITestCase):
+    def setUp(self) -> None:
+        readiness_probe.reset()
+
+    def test_ready(self):
+        response = self.client.get(reverse("ready_view"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Cache-Control"], "no-store")
+        data = response.json()
+        self.assertTrue(data["ready"])
+        self.assertEqual(set(data["checks"]), {"database", "cache"})
+        database = data["checks"]["database"]
+        self.assertTrue(database["ok"])
+        # Connection counts are for admins only.
+        self.assertEqual(set(database), {"ok", "latency_ms", "budget_ms", "saturated"})
+        self.assertTrue(data["checks"]["cache"]["ok"])
+
+    def test_ready_details_for_admins(self):
+        self.client.force_authenticate(user=User.objects.create(email="admin@example.com", is_staff=True))
+        response = self.client.get(reverse("ready_view"))
+        database = response.json()["checks"]["database"]
+        self.assertGreater(database["connections"]["used"], 0)
+        self.assertGreaterEqual(database["connections"]["max"], database["connections"]["used"])
+
+    @override_settings(READY_DATABASE_BUDGET_MS=0)
+    def test_over_budget(self):
+        with self.assertLogs("apps.common.readiness", "WARNING"):
+            response = self.client.get(reverse("ready_view"))
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(response.json()["checks"]["database"]["ok"])
+        self.assertTrue(response.json()["checks"]["cache"]["ok"])
+
+    def test_unreachable_dependency(self):
+        with mock.patch("apps.common.readiness.get_redis_connection", side_effect=ConnectionError("refused")):
+            with self.assertLogs("apps.common.readiness", "WARNING") as logs:
+                response = self.client.get(reverse("ready_view"))
+        self.assertEqual(response.status_code, 503)
+        # The error text may name hosts and users: it goes to the log, the caller only gets a code.
+        self.assertEqual(response.json()["checks"]["cache"], {"ok": False, "error": "unavailable"})
+        self.assertIn("refused", "\n".join(logs.output))
+
+    @override_settings(READY_CHECK_TIMEOUT=0.05)
+    def test_timeout(self):
+        release = threading.Event()
+        probe = ReadinessProbe({"slow": lambda: release.wait(5)})
+        try:
+            with self.assertLogs("apps.common.readiness", "WARNING"):
+                result = probe.run()
+            # The hanging check is not submitted a second time.
+            self.assertIs(probe.run()["checks"]["slow"]["ok"], False)
+            self.assertEqual(probe.executor._work_queue.qsize(), 0)
+        finally:
+            release.set()
+        self.assertFalse(result["ready"])
+        self.assertEqual(result["checks"]["slow"]["error"], "timeout")
+
+    @override_settings(READY_CHECK_TIMEOUT=0.05)
+    def test_hung_database_query_is_cancelled(self):
+        def hang(execute, sql, params, many, context):
+            if "pg_stat_activity" in sql:
+                sql = "SELECT 1, pg_sleep(5)"
+            return execute(sql, params, many, context)
+
+        connection = probe_connection()
+        started = time.monotonic()
+        with connection.execute_wrapper(hang), self.assertRaises(OperationalError):
+            check_database()
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertEqual(connection.settings_dict["OPTIONS"]["connect_timeout"], 1)
+        self.assertNotIn("connect_timeout", connections["default"].settings_dict["OPTIONS"])
+
+    def test_saturated_pool(self):
+        check = {"latency_ms": 1, "budget_ms": 100, "saturated": True}
+        probe = ReadinessProbe({"database": lambda: dict(check)})
+        self.assertFalse(probe.run()["ready"])
+
+    def test_result_is_cached(self):
+        calls = []
+
+        def check():
+            calls.append(1)
+            return {"latency_ms": 1, "budget_ms": 100, "saturated": False}
+
+        probe = ReadinessProbe({"database": check})
+        self.assertIs(probe.get(), probe.get())
+        self.assertEqual(len(calls), 1)
+
+        with override_settings(READY_CACHE_SECONDS=0):
+            probe.reset()
+            probe.get()
+            probe.get()
+        self.assertEqual(len(calls), 3)
+
+    def test_histogram_exposition(self):
+        histogram = Histogram("test_seconds", "Test.", ("view",), (0.1, 1))
+        REGISTRY.remove(histogram)
+        for value in (0.05, 0.1, 0.5, 3):
+            histogram.observe(value, 'a"b')
+
+        self.assertEqual(
+            histogram.expose(),
+            [
+                "# HELP test_seconds Test.",
+                "# TYPE test_seconds histogram",
+                'test_seconds_bucket{view="a\\"b",le="0.1"} 2',
+                'test_seconds_bucket{view="a\\"b",le="1"} 3',
+                'test_seconds_bucket{view="a\\"b",le="+Inf"} 4',
+                'test_seconds_sum{view="a\\"b"} 3.65',
+                'test_seconds_count{view="a\\"b"} 4',
+            ],
+        )
@@ -1,7 +1,15 @@
 from django.urls import path
 
+from apps.common.views import CacheStatsView
+from apps.common.views import DatabasePoolStatsView
 from apps.common.views import HealthView
+from apps.common.views import MetricsView
+from apps.common.views import ReadyView
 
 urlpatterns = [
     path("health", HealthView.as_view(), name="health_view"),
+    path("ready", ReadyView.as_view(), name="ready_view"),
+    path("health/cache", CacheStatsView.as_view(), name="cache_stats_view"),
+    path("health/db-pool", DatabasePoolStatsView.as_view(), name="db_pool_stats_view"),
+    path("health/metrics", MetricsView.as_view(), name="metrics_view"),
 ]
@@ -1,6 +1,17 @@
+from django.db import connections
+from django.http import HttpResponse
 from rest_framework.generics import views
 from rest_framework.permissions import AllowAny
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
+from rest_framework.status import HTTP_200_OK
+from rest_framework.status import HTTP_503_SERVICE_UNAVAILABLE
+
+from apps.common.cache import VersionedCache
+from apps.common.metrics import expose_metrics
+from apps.common.permissions import HasMetricsToken
+from apps.common.readiness import public_result
+from apps.common.readiness import readiness_probe
 
 
 class HealthView(views.APIView):
@@ -9,3 +20,45 @@ class HealthView(views.APIView):
 
     def get(self, request):
         return Response({"live": True})
+
+
+class ReadyView(views.APIView):
+    # Readiness, unlike liveness: 503 while the database or Redis is unreachable, slower than its budget or
+    # saturated, so the load balancer stops sending traffic to this worker. Admins also get the error details,
+    # connection counts and pool stats.
+    permission_classes = (AllowAny,)
+
+    def get(self, request):
+        result = readiness_probe.get()
+        status = HTTP_200_OK if result["ready"] else HTTP_503_SERVICE_UNAVAILABLE
+        if not request.user.is_staff:
+            result = public_result(result)
+        return Response(result, status=status, headers={"Cache-Control": "no-store"})
+
+
+class CacheStatsView(views.APIView):
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        return Response({namespace: cache.stats() for namespace, cache in VersionedCache.registry.items()})
+
+
+class DatabasePoolStatsView(views.APIView):
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        return Response(
+            {
+                connection.alias: connection.pool_stats()
+                for connection in connections.all()
+                if hasattr(connection, "pool_stats")
+            }
+        )
+
+
+class MetricsView(views.APIView):
+    # Prometheus text format, for the scraper (METRICS_TOKEN) or an admin; the histograms are those of this process.
+    permission_classes = (HasMetricsToken | IsAdminUser,)
+
+    def get(self, request):
+        return HttpResponse(expose_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8")
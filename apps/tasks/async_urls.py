@@ -0,0 +1,15 @@
+from rest_framework.routers import DefaultRouter
+
+from apps.tasks.async_views import AsyncTaskViewSet
+from apps.tasks.async_views import AsyncTimelogViewSet
+from apps.tasks.views import CommentViewSet
+
+router = DefaultRouter(trailing_slash=False)
+
+router.register(r"tasks/comments", CommentViewSet, basename="comments")
+
+router.register(r"tasks/timelog", AsyncTimelogViewSet, basename="timelog")
+
+router.register(r"tasks", AsyncTaskViewSet, basename="tasks")
+
+urlpatterns = router.urls
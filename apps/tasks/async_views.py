@@ -0,0 +1,40 @@
+from asgiref.sync import sync_to_async
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from apps.common.async_views import AsyncConditionalGetMixin
+from apps.common.async_views import AsyncExportMixin
+from apps.common.async_views import AsyncListModelMixin
+from apps.common.async_views import AsyncRetrieveModelMixin
+from apps.common.async_views import AsyncViewSetMixin
+from apps.tasks.views import TaskViewSet
+from apps.tasks.views import TimelogViewSet
+
+
+class AsyncTaskViewSet(
+    AsyncConditionalGetMixin,
+    AsyncExportMixin,
+    AsyncListModelMixin,
+    AsyncRetrieveModelMixin,
+    AsyncViewSetMixin,
+    TaskViewSet,
+):
+    @action(methods=["GET"], detail=False)
+    async def top_month_duration(self, request, *args, **kwargs):
+        # The versioned cache coalesces recomputation with thread locks, so it is entered from a sync thread.
+        data, status = await sync_to_async(self.get_top_month_duration)(request)
+        return Response(data, headers={"X-Cache": status.upper()})
+
+
+class AsyncTimelogViewSet(
+    AsyncConditionalGetMixin,
+    AsyncExportMixin,
+    AsyncListModelMixin,
+    AsyncRetrieveModelMixin,
+    AsyncViewSetMixin,
+    TimelogViewSet,
+):
+    @action(methods=["GET"], detail=False)
+    async def last_month_full_time(self, request, *args, **kwargs):
+        data, status = await sync_to_async(self.get_last_month_full_time)(request)
+        return Response(data, headers={"X-Cache": status.upper()})
@@ -0,0 +1,17 @@
+from django.conf import settings
+
+from apps.common.cache import VersionedCache
+
+leaderboard_cache = VersionedCache("top_month_duration", timeout=settings.LEADERBOARD_CACHE_TTL)
+
+month_total_cache = VersionedCache("last_month_full_time", timeout=settings.LEADERBOARD_CACHE_TTL)
+
+
+def invalidate_time_caches(owner_ids=None):
+    # Month totals are per owner, so only the owners whose time logs changed are invalidated; None means all.
+    leaderboard_cache.bump_on_commit()
+    if owner_ids is None:
+        month_total_cache.bump_on_commit()
+    else:
+        for owner_id in set(owner_ids):
+            month_total_cache.bump_on_commit(owner_id)
@@ -0,0 +1,149 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import connection
+from django.db.models import Count
+from django.db.models import DateTimeField
+from django.db.models import F
+from django.db.models import Max
+from django.db.models import OuterRef
+from django.db.models import QuerySet
+from django.db.models import Subquery
+from django.db.models import Sum
+from django.db.models import Value
+from django.db.models.functions import Coalesce
+from django.db.models.functions import Greatest
+from django.db.models.functions import Now
+from django.utils import timezone
+
+from apps.tasks.models import Comment
+from apps.tasks.models import Task
+from apps.tasks.models import TimeLog
+from apps.users.models import User
+
+
+def apply_counter_delta(task_id, duration=timedelta(), timelogs=0, comments=0, activity_at=None):
+    # One UPDATE, so concurrent writers never lose each other's increments. updated_at moves as well: the
+    # counters are part of the task's representation and its conditional GET validators.
+    changes = {"updated_at": Now()}
+    if duration:
+        changes["tracked_duration"] = F("tracked_duration") + duration
+    if timelogs:
+        changes["timelog_count"] = Greatest(F("timelog_count") + timelogs, Value(0))
+    if comments:
+        changes["comment_count"] = Greatest(F("comment_count") + comments, Value(0))
+    if activity_at is not None:
+        changes["last_activity_at"] = Greatest(F("last_activity_at"), Value(activity_at, output_field=DateTimeField()))
+    Task.objects.filter(pk=task_id).update(**changes)
+
+
+def add_timelogs_to_counters(entries):
+    # entries are (task_id, owner_id, started_at, duration) of time logs inserted without signals.
+    totals = defaultdict(lambda: [timedelta(), 0])
+    for task_id, _, _, duration in entries:
+        totals[task_id][0] += duration or timedelta()
+        totals[task_id][1] += 1
+
+    now = timezone.now()
+    for task_id, (duration, count) in totals.items():
+        apply_counter_delta(task_id, duration=duration, timelogs=count, activity_at=now)
+
+
+def deleted_by_cascade(origin):
+    # Time logs and comments deleted along with a task or a user need no per-row bookkeeping: their rollup buckets
+    # and their task's counters are deleted with them, or recomputed once by the user's post_delete.
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return model in (Task, User)
+
+
+def foreign_tasks(user):
+    # Ids of the other users' tasks a user logged time against or commented on.
+    timelogs = TimeLog.objects.filter(owner=user).exclude(task__owner=user).values_list("task_id", flat=True)
+    comments = Comment.objects.filter(owner=user).exclude(task__owner=user).values_list("task_id", flat=True)
+    return set(timelogs.union(comments))
+
+
+def expected_counters():
+    # The counters recomputed from the time log and comment rows, as expressions over the outer task.
+    timelogs = TimeLog.objects.filter(task=OuterRef("pk")).order_by().values("task")
+    comments = Comment.objects.filter(task=OuterRef("pk")).order_by().values("task")
+    return {
+        "tracked_duration": Coalesce(
+            Subquery(timelogs.annotate(total=Sum("duration")).values("total")), Value(timedelta())
+        ),
+        "timelog_count": Coalesce(Subquery(timelogs.annotate(count=Count("id")).values("count")), Value(0)),
+        "comment_count": Coalesce(Subquery(comments.annotate(count=Count("id")).values("count")), Value(0)),
+        "last_activity_at": Greatest(
+            Subquery(timelogs.annotate(last=Max("updated_at")).values("last")),
+            Subquery(comments.annotate(last=Max("updated_at")).values("last")),
+        ),
+    }
+
+
+def recompute_counters(tasks):
+    # Resets the counters of a few tasks from their rows. last_activity_at never moves back, deleting the newest
+    # row of a task leaves it in place.
+    expected = expected_counters()
+    expected["last_activity_at"] = Greatest(F("last_activity_at"), expected["last_activity_at"])
+    return tasks.update(**expected, updated_at=Now())
+
+
+def rebuild_counters():
+    # recompute_counters() for every task, from one grouped scan of each table.
+    with connection.cursor() as cursor:
+        cursor.execute(REBUILD_COUNTERS_SQL)
+        return cursor.rowcount
+
+
+REBUILD_COUNTERS_SQL = """
+    UPDATE tasks SET
+        tracked_duration = coalesce(timelogs.total, interval '0'),
+        timelog_count = coalesce(timelogs.entries, 0),
+        comment_count = coalesce(comments.entries, 0),
+        last_activity_at = greatest(tasks.last_activity_at, timelogs.last, comments.last),
+        updated_at = now()
+    FROM tasks AS target
+    LEFT JOIN (
+        SELECT task_id, sum(duration) AS total, count(*) AS entries, max(updated_at) AS last
+        FROM time_logs GROUP BY task_id
+    ) AS timelogs ON timelogs.task_id = target.id
+    LEFT JOIN (
+        SELECT task_id, count(*) AS entries, max(updated_at) AS last FROM comments GROUP BY task_id
+    ) AS comments ON comments.task_id = target.id
+    WHERE tasks.id = target.id
+"""
+
+
+def find_counter_drift(first_id, last_id):
+    # (task id, counter, stored, expected) for the tasks in [first_id, last_id] whose counters differ from their
+    # rows, from one grouped query per table over that id range.
+    expected = defaultdict(lambda: {"tracked_duration": timedelta(), "timelog_count": 0, "comment_count": 0})
+    activity = defaultdict(list)
+    timelogs = (
+        TimeLog.objects.filter(task__gte=first_id, task__lte=last_id)
+        .values("task_id")
+        .annotate(total=Sum("duration", default=timedelta()), count=Count("id"), last=Max("updated_at"))
+        .order_by()
+    )
+    for row in timelogs:
+        expected[row["task_id"]].update(tracked_duration=row["total"], timelog_count=row["count"])
+        activity[row["task_id"]].append(row["last"])
+    comments = (
+        Comment.objects.filter(task__gte=first_id, task__lte=last_id)
+        .values("task_id")
+        .annotate(count=Count("id"), last=Max("updated_at"))
+        .order_by()
+    )
+    for row in comments:
+        expected[row["task_id"]]["comment_count"] = row["count"]
+        activity[row["task_id"]].append(row["last"])
+
+    stored = Task.objects.filter(id__range=(first_id, last_id)).order_by("id").values("id", *Task.COUNTER_FIELDS)
+    for task in stored.iterator():
+        for name, value in expected[task["id"]].items():
+            if task[name] != value:
+                yield task["id"], name, task[name], value
+        # Only older than the newest row counts as drift: deleting that row leaves last_activity_at in place.
+        last = max(activity[task["id"]], default=None)
+        if last is not None and (task["last_activity_at"] is None or task["last_activity_at"] < last):
+            yield task["id"], "last_activity_at", task["last_activity_at"], last
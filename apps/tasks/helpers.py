@@ -1,5 +1,6 @@
 from datetime import date
 from datetime import datetime
+from datetime import timedelta
 
 from django.utils.timezone import utc
 
@@ -7,3 +8,11 @@ from django.utils.timezone import utc
 def start_month_date():
     first_date_of_month = (datetime.combine(date.today().replace(day=1), datetime.min.time())).replace(tzinfo=utc)
     return first_date_of_month
+
+
+def next_month_start(value):
+    return (value.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+
+def month_start(value):
+    return value.astimezone(utc).date().replace(day=1)
@@ -0,0 +1,70 @@
+from datetime import datetime
+from datetime import timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.timezone import utc
+from rest_framework.exceptions import ValidationError
+
+from apps.common.db import copy_rows
+from apps.tasks.cache import invalidate_time_caches
+from apps.tasks.counters import add_timelogs_to_counters
+from apps.tasks.models import Task
+from apps.tasks.models import TimeLog
+from apps.tasks.rollups import add_to_rollups
+from apps.tasks.serializers import TimelogBulkRowSerializer
+
+
+def chunked(rows, size):
+    rows = iter(rows)
+    while chunk := list(islice(rows, size)):
+        yield chunk
+
+
+@transaction.atomic
+def ingest_timelogs(owner, rows, batch_size=None):
+    # Invalid rows are reported and skipped, the valid ones are inserted chunk by chunk.
+    # A body that cannot be parsed raises and rolls back everything inserted so far.
+    batch_size = batch_size or settings.TIMELOG_BULK_BATCH_SIZE
+    row_serializer = TimelogBulkRowSerializer()
+    fields = ["created_at", "updated_at", "task", "owner", "started_at", "duration"]
+    now = timezone.now()
+    owned, checked = set(), set()
+    created, errors = 0, []
+
+    for offset, chunk in enumerate(chunked(rows, batch_size)):
+        valid = []
+        for index, row in enumerate(chunk, start=offset * batch_size):
+            try:
+                valid.append((index, row_serializer.run_validation(row)))
+            except ValidationError as exc:
+                errors.append({"row": index, "errors": exc.detail})
+
+        # Ownership is checked once per task id, not once per row.
+        unchecked = {data["task"] for _, data in valid} - checked
+        if unchecked:
+            owned.update(Task.objects.filter(owner=owner, id__in=unchecked).values_list("id", flat=True))
+            checked.update(unchecked)
+
+        entries = []
+        for index, data in valid:
+            if data["task"] not in owned:
+                message = f'Invalid pk "{data["task"]}" - object does not exist.'
+                errors.append({"row": index, "errors": {"task": [message]}})
+                continue
+            started_at = datetime.combine(data["date_field"], datetime.min.time()).replace(tzinfo=utc)
+            duration = timedelta(minutes=data["duration_minutes"])
+            entries.append((data["task"], owner.id, started_at, duration))
+
+        # COPY skips the TimeLog signals, so the rollups and task counters are updated here once per bucket / task.
+        copy_rows(TimeLog, fields, [(now, now, *entry) for entry in entries])
+        add_to_rollups(entries)
+        add_timelogs_to_counters(entries)
+        created += len(entries)
+
+    if created:
+        invalidate_time_caches([owner.id])
+    errors.sort(key=lambda error: error["row"])
+    return created, errors
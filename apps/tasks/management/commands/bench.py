@@ -0,0 +1,153 @@
+import json
+import platform
+
+import django
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.common.benchmark import Scenario
+from apps.common.benchmark import isolated_environment
+from apps.common.benchmark import run_scenario
+from apps.common.cache import VersionedCache
+from apps.tasks.cache import leaderboard_cache
+from apps.tasks.cache import month_total_cache
+from apps.tasks.models import Comment
+from apps.tasks.models import Task
+from apps.tasks.models import TimeLog
+from apps.tasks.models import Timer
+from apps.tasks.seeding import SeedPlan
+from apps.tasks.seeding import seed
+from apps.users.models import User
+
+
+class Command(BaseCommand):
+    help = "seed a throwaway test database and report latency percentiles, query counts and memory per endpoint as JSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=100, help="seeded users")
+        parser.add_argument("--tasks-per-user", type=float, default=10, help="seeded tasks per user")
+        parser.add_argument("--timelogs-per-task", type=float, default=20, help="seeded time logs per task")
+        parser.add_argument("--comments-per-task", type=float, default=3, help="seeded comments per task")
+        parser.add_argument("--seed", type=int, default=0, help="random seed of the dataset")
+        parser.add_argument("--iterations", type=int, default=50, help="measured calls per endpoint")
+        parser.add_argument("--warmup", type=int, default=5, help="unmeasured calls per endpoint")
+        parser.add_argument("--memory-iterations", type=int, default=3, help="traced calls per endpoint")
+        parser.add_argument(
+            "--only", action="append", help="run endpoints whose name starts with this, may be repeated"
+        )
+        parser.add_argument("--keepdb", action="store_true", help="keep the test database and its dataset between runs")
+        parser.add_argument("--output", help="write the report to this file instead of stdout")
+
+    def handle(self, *args, **kwargs):
+        with isolated_environment(keepdb=kwargs["keepdb"]):
+            report = self.run(kwargs)
+
+        output = json.dumps(report, indent=2)
+        if kwargs.get("output"):
+            with open(kwargs["output"], "w") as file:
+                file.write(output + "\n")
+        else:
+            self.stdout.write(output)
+
+    def run(self, options):
+        if not Task.objects.exists():
+            plan = SeedPlan(
+                users=options["users"],
+                tasks_per_user=options["tasks_per_user"],
+                timelogs_per_task=options["timelogs_per_task"],
+                comments_per_task=options["comments_per_task"],
+                seed=options["seed"],
+            )
+            seed(plan, progress=lambda table, done, total, rate: self.stderr.write(f"{table}: {done}/{total} rows"))
+
+        for cache in VersionedCache.registry.values():
+            cache.bump()
+
+        # The busiest user, so list endpoints and aggregates work on the largest share of the data.
+        user = User.objects.annotate(task_count=Count("tasks")).order_by("-task_count", "id").first()
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(user)}")
+
+        scenarios = self.get_scenarios(user)
+        if options.get("only"):
+            scenarios = [scenario for scenario in scenarios if scenario.name.startswith(tuple(options["only"]))]
+
+        return {
+            "environment": {
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "timestamp": timezone.now().isoformat(),
+            },
+            "dataset": {
+                "users": User.objects.count(),
+                "tasks": Task.objects.count(),
+                "timelogs": TimeLog.objects.count(),
+                "comments": Comment.objects.count(),
+            },
+            "results": [
+                run_scenario(
+                    client,
+                    scenario,
+                    iterations=options["iterations"],
+                    warmup=options["warmup"],
+                    memory_iterations=options["memory_iterations"],
+                )
+                for scenario in scenarios
+            ],
+        }
+
+    @staticmethod
+    def get_scenarios(user):
+        task = Task.objects.filter(owner=user).order_by("id").first()
+        comment = Comment.objects.order_by("id").first()
+        timelog = TimeLog.objects.order_by("id").first()
+        today = timezone.now().date().isoformat()
+
+        def start_timer():
+            timer, _ = Timer.objects.get_or_create(owner=user, task=task)
+            timer.start()
+
+        return [
+            Scenario("users-list", "GET", "/users"),
+            Scenario(
+                "users-register",
+                "POST",
+                "/users/register",
+                data=lambda n: {
+                    "first_name": "Bench",
+                    "last_name": "User",
+                    "email": f"bench{n}.{timezone.now().timestamp()}@example.com",
+                    "password": "password",
+                },
+            ),
+            Scenario("tasks-list", "GET", "/tasks"),
+            Scenario("tasks-list-cursor", "GET", "/tasks", data={"pagination": "cursor"}),
+            Scenario("tasks-retrieve", "GET", f"/tasks/{task.id}"),
+            Scenario("tasks-search", "GET", "/tasks/search", data={"search": task.title.split()[0]}),
+            Scenario("tasks-create", "POST", "/tasks", data={"title": "Bench task", "description": "Bench"}),
+            Scenario("tasks-start", "POST", f"/tasks/{task.id}/start"),
+            Scenario("tasks-stop", "POST", f"/tasks/{task.id}/stop", setup=start_timer),
+            Scenario("tasks-top-month-duration-cold", "GET", "/tasks/top_month_duration", setup=leaderboard_cache.bump),
+            Scenario("tasks-top-month-duration-warm", "GET", "/tasks/top_month_duration"),
+            Scenario("comments-list", "GET", "/tasks/comments"),
+            Scenario("comments-retrieve", "GET", f"/tasks/comments/{comment.id}"),
+            Scenario("comments-create", "POST", "/tasks/comments", data={"text": "Bench comment", "task": task.id}),
+            Scenario("timelog-list", "GET", "/tasks/timelog"),
+            Scenario("timelog-retrieve", "GET", f"/tasks/timelog/{timelog.id}"),
+            Scenario(
+                "timelog-create",
+                "POST",
+                "/tasks/timelog",
+                data={"task": task.id, "date_field": today, "duration_minutes": 30},
+            ),
+            Scenario(
+                "timelog-last-month-full-time-cold",
+                "GET",
+                "/tasks/timelog/last_month_full_time",
+                setup=month_total_cache.bump,
+            ),
+            Scenario("timelog-last-month-full-time-warm", "GET", "/tasks/timelog/last_month_full_time"),
+        ]
@@ -0,0 +1,110 @@
+import json
+import random
+import time
+from datetime import timedelta
+from io import BytesIO
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from apps.common.benchmark import percentile
+from apps.common.parsers import ORJSONParser
+from apps.common.renderers import ORJSONRenderer
+from apps.common.renderers import orjson
+from apps.tasks.models import Task
+from apps.tasks.models import TimeLog
+from apps.tasks.serializers import TimelogListSerializer
+from apps.users.models import User
+
+
+class Command(BaseCommand):
+    help = "compare the stock and orjson renderers and parsers on a page of time logs, without a database"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1000, help="time logs per page")
+        parser.add_argument("--iterations", type=int, default=50, help="measured calls per case")
+        parser.add_argument("--seed", type=int, default=0, help="random seed of the page")
+
+    def handle(self, *args, **kwargs):
+        rows, iterations = kwargs["rows"], kwargs["iterations"]
+        timelogs = self.build_timelogs(rows, kwargs["seed"])
+
+        serialize = lambda: TimelogListSerializer(timelogs, many=True).data  # noqa: E731
+        page = {"count": rows, "next": None, "previous": None, "results": serialize()}
+        stock_body, fast_body = JSONRenderer().render(page), ORJSONRenderer().render(page)
+
+        report = {
+            "rows": rows,
+            "orjson": orjson.__version__ if orjson else None,
+            "identical_output": json.loads(stock_body) == json.loads(fast_body),
+            "results": [
+                self.measure("serialize", serialize, iterations),
+                self.measure("render-json", lambda: JSONRenderer().render(page), iterations, len(stock_body)),
+                self.measure("render-orjson", lambda: ORJSONRenderer().render(page), iterations, len(fast_body)),
+                self.measure(
+                    "parse-json", lambda: JSONParser().parse(BytesIO(stock_body)), iterations, len(stock_body)
+                ),
+                self.measure(
+                    "parse-orjson", lambda: ORJSONParser().parse(BytesIO(stock_body)), iterations, len(stock_body)
+                ),
+            ],
+        }
+        self.stdout.write(json.dumps(report, indent=2))
+
+    @staticmethod
+    def measure(name, call, iterations, size=None):
+        call()
+        latencies = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            call()
+            latencies.append((time.perf_counter() - started) * 1000)
+        latencies.sort()
+        mean = sum(latencies) / len(latencies)
+        result = {
+            "name": name,
+            "latency_ms": {"p50": round(percentile(latencies, 50), 3), "p99": round(percentile(latencies, 99), 3)},
+            "pages_per_second": round(1000 / mean, 1),
+        }
+        if size:
+            result["bytes"] = size
+            result["mib_per_second"] = round(size / 2**20 * 1000 / mean, 1)
+        return result
+
+    @staticmethod
+    def build_timelogs(rows, seed):
+        # Unsaved instances shaped like a seeded page: a few owners and tasks, minute-resolution durations.
+        rng = random.Random(seed)
+        now = timezone.now()
+        users = [
+            User(id=n, email=f"user{n}@example.com", first_name=f"First{n}", last_name=f"Last{n}", date_joined=now)
+            for n in range(1, 21)
+        ]
+        tasks = [
+            Task(
+                id=n,
+                title=f"Task {n}",
+                description="Bench task",
+                owner=rng.choice(users),
+                created_at=now,
+                updated_at=now,
+            )
+            for n in range(1, 101)
+        ]
+        timelogs = []
+        for n in range(1, rows + 1):
+            started_at = now - timedelta(minutes=rng.randrange(60 * 24 * 90))
+            timelogs.append(
+                TimeLog(
+                    id=n,
+                    task=rng.choice(tasks),
+                    owner=rng.choice(users),
+                    started_at=started_at,
+                    duration=timedelta(minutes=rng.randrange(1, 480)),
+                    created_at=started_at,
+                    updated_at=started_at,
+                )
+            )
+        return timelogs
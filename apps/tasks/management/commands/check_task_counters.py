@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from django.db.models import Max
+from django.db.models import Min
+
+from apps.tasks.counters import find_counter_drift
+from apps.tasks.counters import recompute_counters
+from apps.tasks.models import Task
+
+
+class Command(BaseCommand):
+    help = "recompute the task counters from time logs and comments and report (or fix) any drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--fix", action="store_true", help="reset the drifted counters")
+        parser.add_argument("--batch-size", type=int, default=10000, help="task ids checked per query")
+        parser.add_argument("--show", type=int, default=20, help="drifted counters listed in the report")
+
+    def handle(self, *args, **kwargs):
+        bounds = Task.objects.aggregate(first=Min("id"), last=Max("id"))
+        if bounds["first"] is None:
+            return self.stdout.write("No tasks.")
+
+        drifted, shown = set(), 0
+        for first_id in range(bounds["first"], bounds["last"] + 1, kwargs["batch_size"]):
+            batch = set()
+            for task_id, name, stored, expected in find_counter_drift(first_id, first_id + kwargs["batch_size"] - 1):
+                batch.add(task_id)
+                if shown < kwargs["show"]:
+                    self.stdout.write(f"Task {task_id}: {name} is {stored}, expected {expected}.")
+                    shown += 1
+            if batch and kwargs["fix"]:
+                recompute_counters(Task.objects.filter(id__in=batch))
+            drifted |= batch
+
+        if not drifted:
+            return self.stdout.write(self.style.SUCCESS("Task counters are consistent."))
+        if kwargs["fix"]:
+            return self.stdout.write(self.style.SUCCESS(f"Fixed the counters of {len(drifted)} tasks."))
+        raise CommandError(f"{len(drifted)} tasks have drifted counters, rerun with --fix to reset them.")
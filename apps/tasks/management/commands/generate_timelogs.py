@@ -7,8 +7,10 @@ from django.utils.timezone import utc
 from faker import Faker
 from randomtimestamp import randomtimestamp
 
+from apps.tasks.counters import rebuild_counters
 from apps.tasks.models import Task
 from apps.tasks.models import TimeLog
+from apps.tasks.rollups import rebuild_rollups
 from apps.users.models import User
 
 fake = Faker()
@@ -61,5 +63,7 @@ class Command(BaseCommand):
             ],
             ignore_conflicts=True,
         )
+        rebuild_rollups()
+        rebuild_counters()
 
         self.stdout.write(self.style.SUCCESS(f"Successfully created {instances_number} timelogs."))
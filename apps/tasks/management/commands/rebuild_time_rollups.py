@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from apps.tasks.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "rebuild the monthly time rollup table from time logs"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="rows per insert")
+
+    def handle(self, *args, **kwargs):
+        rollups = rebuild_rollups(batch_size=kwargs.get("batch_size"))
+
+        self.stdout.write(self.style.SUCCESS(f"Successfully rebuilt {rollups} monthly rollups."))
@@ -0,0 +1,39 @@
+import time
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+
+from apps.tasks.notifications import deliver_pending
+
+
+class Command(BaseCommand):
+    help = "deliver queued email notifications from the outbox"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=settings.NOTIFICATION_BATCH_SIZE)
+        parser.add_argument("--interval", type=float, default=settings.NOTIFICATION_POLL_INTERVAL)
+        parser.add_argument("--once", action="store_true", help="drain the outbox once and exit")
+
+    def handle(self, *args, **kwargs):
+        batch_size = kwargs.get("batch_size")
+        connection = get_connection()
+        connection.open()
+
+        try:
+            while True:
+                sent, failed = deliver_pending(connection=connection, batch_size=batch_size)
+                if sent or failed:
+                    self.stdout.write(f"Delivered {sent} notifications, {failed} failed.")
+
+                if sent + failed >= batch_size:
+                    continue
+                if kwargs.get("once"):
+                    break
+                time.sleep(kwargs.get("interval"))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            connection.close()
+
+        self.stdout.write(self.style.SUCCESS("Notification worker stopped."))
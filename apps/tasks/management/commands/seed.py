@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+
+from apps.tasks.seeding import SeedPlan
+from apps.tasks.seeding import seed
+
+
+class Command(BaseCommand):
+    help = "seed users, tasks, time logs and comments for load testing, reproducibly for a given --seed"
+
+    def add_arguments(self, parser):
+        parser.add_argument("users", type=int, help="number of users")
+        parser.add_argument("--tasks-per-user", type=float, default=5, help="tasks per user")
+        parser.add_argument("--timelogs-per-task", type=float, default=20, help="time logs per task")
+        parser.add_argument("--comments-per-task", type=float, default=2, help="comments per task")
+        parser.add_argument("--seed", type=int, default=0, help="random seed")
+        parser.add_argument("--history-days", type=int, default=365, help="how far back time logs start")
+        parser.add_argument("--password", default="password", help="password of every seeded user")
+        parser.add_argument("--batch-size", type=int, default=10000, help="rows per COPY")
+        parser.add_argument("--workers", type=int, default=1, help="worker processes")
+
+    def handle(self, *args, **kwargs):
+        if kwargs["users"] <= 0:
+            return self.stderr.write('"users" must be a positive number.')
+
+        plan = SeedPlan(
+            users=kwargs["users"],
+            tasks_per_user=kwargs["tasks_per_user"],
+            timelogs_per_task=kwargs["timelogs_per_task"],
+            comments_per_task=kwargs["comments_per_task"],
+            seed=kwargs["seed"],
+            history_days=kwargs["history_days"],
+            password=kwargs["password"],
+        )
+        counts = seed(plan, batch_size=kwargs["batch_size"], workers=kwargs["workers"], progress=self.report)
+
+        summary = ", ".join(f"{rows} {table}" for table, rows in counts.items())
+        self.stdout.write(self.style.SUCCESS(f"Successfully seeded {summary}."))
+
+    def report(self, table, done, total, rate):
+        self.stdout.write(f"{table}: {done}/{total} rows, {rate:.0f} rows/s")
@@ -1,21 +1,31 @@
+from datetime import timedelta
+
+from django.db.models import Count
 from django.db.models import Manager
 from django.db.models import Sum
 from django.utils import timezone
 
+from apps.tasks.helpers import next_month_start
 from apps.tasks.helpers import start_month_date
 
 
 class LastMonthTaskManager(Manager):
     def total_duration(self):
-        queryset = self.filter(time_logs__started_at__gte=start_month_date())
+        queryset = self.filter(month_rollups__month__gte=start_month_date().date())
 
-        return queryset.annotate(total_duration=Sum("time_logs__duration")).filter(total_duration__isnull=False)
+        return queryset.annotate(total_duration=Sum("month_rollups__duration")).filter(total_duration__isnull=False)
 
 
 class TaskWithTotalTimeManager(Manager):
     def last_month(self, owner):
-        return (
-            self.filter(owner=owner, started_at__gte=start_month_date(), started_at__lte=timezone.now())
-            .select_related("task")
-            .aggregate(total=Sum("duration"))
+        # The month's rollups count every time log of the month; the ones dated after now are taken back out, from
+        # a range scan that is empty unless time was logged ahead.
+        month = start_month_date()
+        now = timezone.now()
+        logged = owner.month_rollups.filter(month=month.date()).aggregate(total=Sum("duration"), entries=Sum("entries"))
+        ahead = self.filter(owner=owner, started_at__gt=now, started_at__lt=next_month_start(month)).aggregate(
+            total=Sum("duration", default=timedelta()), entries=Count("id")
         )
+        if not logged["entries"] or logged["entries"] <= ahead["entries"]:
+            return {"total": None}
+        return {"total": logged["total"] - ahead["total"]}
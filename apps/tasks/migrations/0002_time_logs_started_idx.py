@@ -0,0 +1,17 @@
+# Generated by Django 4.2.6 on 2026-10-18 12:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='timelog',
+            index=models.Index(fields=['started_at', 'id'], name='time_logs_started_idx'),
+        ),
+    ]
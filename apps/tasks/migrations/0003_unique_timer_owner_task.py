@@ -0,0 +1,33 @@
+# Generated by Django 4.2.6 on 2026-10-18 12:11
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def remove_duplicate_timers(apps, schema_editor):
+    # Keep a running timer if there is one, otherwise the most recently updated.
+    Timer = apps.get_model("tasks", "Timer")
+    duplicates = Timer.objects.values("owner_id", "task_id").annotate(count=Count("id")).filter(count__gt=1)
+    for duplicate in duplicates.iterator():
+        timers = Timer.objects.filter(owner_id=duplicate["owner_id"], task_id=duplicate["task_id"])
+        keep = timers.order_by("-is_started", "-updated_at", "-id").values_list("id", flat=True)[0]
+        timers.exclude(id=keep).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0002_time_logs_started_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_timers, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='timer',
+            name='timer_owner_task_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='timer',
+            constraint=models.UniqueConstraint(fields=('owner', 'task'), name='unique_timer_owner_task'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.6 on 2026-10-18 14:02
+
+from django.db import migrations
+
+# The tsvectors are generated columns, so Postgres keeps them current for every write path (ORM, COPY, raw SQL)
+# and the models don't declare them; apps.common.search reads them. The configuration must match SEARCH_CONFIG.
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0003_unique_timer_owner_task'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            """
+            ALTER TABLE tasks ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+                setweight(to_tsvector('english'::regconfig, coalesce(title, '')), 'A') ||
+                setweight(to_tsvector('english'::regconfig, coalesce(description, '')), 'B')
+            ) STORED;
+            CREATE INDEX tasks_search_vector_idx ON tasks USING gin (search_vector);
+            """,
+            "ALTER TABLE tasks DROP COLUMN search_vector;",
+        ),
+        migrations.RunSQL(
+            """
+            ALTER TABLE comments ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+                to_tsvector('english'::regconfig, coalesce(text, ''))
+            ) STORED;
+            CREATE INDEX comments_search_vector_idx ON comments USING gin (search_vector);
+            """,
+            "ALTER TABLE comments DROP COLUMN search_vector;",
+        ),
+    ]
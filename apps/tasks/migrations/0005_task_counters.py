@@ -0,0 +1,53 @@
+# Generated by Django 4.2.6 on 2026-10-18 13:12
+
+import datetime
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0004_search_vectors'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='last_activity_at',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='timelog_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='tracked_duration',
+            field=models.DurationField(default=datetime.timedelta, editable=False),
+        ),
+        migrations.RunSQL(
+            """
+            UPDATE tasks SET
+                tracked_duration = coalesce(timelogs.total, interval '0'),
+                timelog_count = coalesce(timelogs.entries, 0),
+                comment_count = coalesce(comments.entries, 0),
+                last_activity_at = greatest(timelogs.last, comments.last)
+            FROM tasks AS target
+            LEFT JOIN (
+                SELECT task_id, sum(duration) AS total, count(*) AS entries, max(updated_at) AS last
+                FROM time_logs GROUP BY task_id
+            ) AS timelogs ON timelogs.task_id = target.id
+            LEFT JOIN (
+                SELECT task_id, count(*) AS entries, max(updated_at) AS last FROM comments GROUP BY task_id
+            ) AS comments ON comments.task_id = target.id
+            WHERE tasks.id = target.id;
+            """,
+            migrations.RunSQL.noop,
+        ),
+    ]
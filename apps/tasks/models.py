@@ -1,5 +1,8 @@
+from datetime import timedelta
+
 from django.utils import timezone
 from django.db import models
+from django.db import transaction
 
 from apps.tasks.managers import TaskWithTotalTimeManager
 from apps.tasks.managers import LastMonthTaskManager
@@ -16,55 +19,159 @@ class Task(BaseModel):
     description = models.CharField(max_length=255, blank=True)
     status = models.CharField(max_length=30, choices=Status.choices, default=Status.IN_PROGRESS)
     owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name="tasks")
+    # Maintained with F() updates by apps.tasks.counters as time logs and comments are written or deleted.
+    tracked_duration = models.DurationField(default=timedelta, editable=False)
+    timelog_count = models.PositiveIntegerField(default=0, editable=False)
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+    last_activity_at = models.DateTimeField(null=True, editable=False)
 
     objects = LastMonthTaskManager()
 
+    COUNTER_FIELDS = ("tracked_duration", "timelog_count", "comment_count", "last_activity_at")
+
     class Meta:
         db_table = "tasks"
+        indexes = [
+            models.Index(fields=["owner", "status"], name="tasks_owner_status_idx"),
+        ]
+
+    def save(self, *args, **kwargs):
+        # Saving a loaded task must not write back counters that changed since it was read.
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
 
 
 class Comment(BaseModel):
     text = models.TextField()
-    task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name="comments")
+    task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name="comments", db_index=False)
     owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name="comments")
 
     class Meta:
         db_table = "comments"
+        indexes = [
+            models.Index(fields=["task", "-id"], name="comments_task_id_idx"),
+        ]
 
 
 class TimeLog(BaseModel):
     started_at = models.DateTimeField(default=timezone.now)
     duration = models.DurationField(null=True)
-    task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name="time_logs")
-    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name="time_logs")
+    task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name="time_logs", db_index=False)
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name="time_logs", db_index=False)
 
     objects = TaskWithTotalTimeManager()
 
     class Meta:
         db_table = "time_logs"
+        indexes = [
+            models.Index(fields=["owner", "started_at"], name="time_logs_owner_started_idx"),
+            models.Index(fields=["task", "started_at"], name="time_logs_task_started_idx"),
+            models.Index(fields=["started_at", "id"], name="time_logs_started_idx"),
+        ]
+
+    def save(self, *args, **kwargs):
+        # Keeps the row and its MonthlyTimeRollup bucket (updated by signals) in one transaction.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+
+class MonthlyTimeRollup(models.Model):
+    task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name="month_rollups", db_index=False)
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name="month_rollups", db_index=False)
+    month = models.DateField()
+    duration = models.DurationField(default=timedelta)
+    entries = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        db_table = "time_log_rollups"
+        constraints = [
+            models.UniqueConstraint(fields=["task", "owner", "month"], name="unique_time_log_rollup"),
+        ]
+        indexes = [
+            models.Index(fields=["owner", "month"], name="time_log_rollups_owner_idx"),
+            models.Index(fields=["month"], name="time_log_rollups_month_idx"),
+        ]
 
 
 class Timer(BaseModel):
     started_at = models.DateTimeField(default=timezone.now)
     is_started = models.BooleanField(default=False)
-    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name="timers")
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name="timers", db_index=False)
     task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name="timers")
 
     class Meta:
         db_table = "timer"
+        constraints = [
+            models.UniqueConstraint(fields=["owner", "task"], name="unique_timer_owner_task"),
+        ]
+        indexes = [
+            models.Index(fields=["owner"], condition=models.Q(is_started=True), name="timer_started_idx"),
+        ]
 
     def start(self):
-        if not self.is_started:
-            self.is_started = True
-            self.started_at = timezone.now()
-            self.save(update_fields=["is_started", "started_at"])
+        if self.is_started:
+            return
 
+        # Conditional UPDATE: of two concurrent starts only one moves started_at.
+        now = timezone.now()
+        if Timer.objects.filter(pk=self.pk, is_started=False).update(is_started=True, started_at=now, updated_at=now):
+            self.is_started, self.started_at, self.updated_at = True, now, now
+        else:
+            self.refresh_from_db()
+
+    @transaction.atomic
     def stop(self):
+        # Callers hold the row lock (select_for_update), so the timer and its time log are written together.
         duration = timezone.now() - self.started_at
 
         self.is_started = False
         self.duration = duration
         self.started_at = timezone.localtime(self.started_at)
-        self.save(update_fields=["is_started", "started_at"])
+        self.save(update_fields=["is_started", "started_at", "updated_at"])
+
+        TimeLog.objects.create(
+            owner_id=self.owner_id, task_id=self.task_id, duration=duration, started_at=self.started_at
+        )
+
+
+class Notification(BaseModel):
+    class Status(models.TextChoices):
+        PENDING = "pending"
+        SENT = "sent"
+        FAILED = "failed"
+
+    class Event(models.TextChoices):
+        ASSIGNED = "assigned"
+        COMPLETED = "completed"
+        COMMENTED = "commented"
+
+    event = models.CharField(max_length=30, choices=Event.choices)
+    task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name="notifications", null=True)
+    recipient = models.EmailField()
+    subject = models.CharField(max_length=255)
+    message = models.TextField()
+    status = models.CharField(max_length=30, choices=Status.choices, default=Status.PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
 
-        TimeLog.objects.create(owner=self.owner, task=self.task, duration=duration, started_at=self.started_at)
+    class Meta:
+        db_table = "notifications"
+        indexes = [
+            models.Index(
+                fields=["next_attempt_at"],
+                condition=models.Q(status="pending"),
+                name="notifications_pending_idx",
+            ),
+            models.Index(
+                fields=["recipient"],
+                condition=models.Q(status="pending"),
+                name="notifications_recipient_idx",
+            ),
+        ]
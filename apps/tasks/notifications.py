@@ -0,0 +1,128 @@
+import logging
+from datetime import timedelta
+from itertools import groupby
+
+from django.conf import settings
+from django.core.mail import EmailMessage
+from django.core.mail import get_connection
+from django.db import transaction
+from django.db.models import F
+from django.db.models import Min
+from django.utils import timezone
+
+from apps.tasks.models import Notification
+
+logger = logging.getLogger("info")
+
+
+def enqueue_notification(event, task, subject, message, recipient_list):
+    # Rows are written in the caller's transaction, so a rolled back request never sends mail.
+    recipients = sorted(set(recipient_list))
+    if not recipients:
+        return []
+
+    # A recipient that already has a digest waiting joins it, otherwise a new digest window is opened.
+    scheduled = dict(
+        Notification.objects.filter(status=Notification.Status.PENDING, attempts=0, recipient__in=recipients)
+        .values("recipient")
+        .annotate(send_at=Min("next_attempt_at"))
+        .values_list("recipient", "send_at")
+    )
+    send_at = timezone.now() + timedelta(seconds=settings.NOTIFICATION_DIGEST_WINDOW)
+
+    return Notification.objects.bulk_create(
+        [
+            Notification(
+                event=event,
+                task=task,
+                recipient=recipient,
+                subject=subject,
+                message=message,
+                next_attempt_at=scheduled.get(recipient, send_at),
+            )
+            for recipient in recipients
+        ]
+    )
+
+
+def retry_delay(attempts):
+    return timedelta(seconds=settings.NOTIFICATION_RETRY_BACKOFF * 2 ** (attempts - 1))
+
+
+def build_digest(notifications):
+    # Identical events (e.g. the same completion queued twice) are collapsed.
+    events = list(dict.fromkeys((notification.subject, notification.message) for notification in notifications))
+    if len(events) == 1:
+        return events[0]
+
+    subject = f"You have {len(events)} new task updates"
+    message = "\n\n".join(f"{subject}\n{message}" for subject, message in events)
+    return subject, message
+
+
+def claim_pending(batch_size):
+    # The rows are locked only while they are leased: their attempt is counted and next_attempt_at moves past the
+    # claim timeout, so other workers skip them while this one sends. Rows whose result is never recorded (a
+    # crashed worker) become due again when the lease runs out.
+    now = timezone.now()
+    with transaction.atomic():
+        notifications = list(
+            Notification.objects.select_for_update(skip_locked=True)
+            .filter(status=Notification.Status.PENDING, next_attempt_at__lte=now)
+            .order_by("next_attempt_at", "id")[:batch_size]
+        )
+        Notification.objects.filter(id__in=[notification.id for notification in notifications]).update(
+            attempts=F("attempts") + 1,
+            next_attempt_at=now + timedelta(seconds=settings.NOTIFICATION_CLAIM_TIMEOUT),
+            updated_at=now,
+        )
+    return notifications
+
+
+def deliver_pending(connection=None, batch_size=None):
+    # Mail goes out after the claim has committed, and each digest's result is saved as soon as it is known, so no
+    # lock is held over SMTP and a failure halfway through does not send the delivered digests again.
+    batch_size = batch_size or settings.NOTIFICATION_BATCH_SIZE
+    connection = connection or get_connection()
+    sent = failed = 0
+
+    notifications = sorted(
+        claim_pending(batch_size), key=lambda notification: (notification.recipient, notification.id)
+    )
+    for recipient, digest in groupby(notifications, key=lambda notification: notification.recipient):
+        digest = list(digest)
+        subject, message = build_digest(digest)
+        attempts = max(notification.attempts for notification in digest) + 1
+        email = EmailMessage(
+            subject=subject,
+            body=message,
+            from_email=settings.EMAIL_HOST_USER,
+            to=[recipient],
+            connection=connection,
+        )
+        try:
+            connection.open()
+            email.send()
+        except Exception as exc:
+            logger.warning("Notification digest for %s delivery failed: %s", recipient, exc)
+            connection.close()
+            failed += len(digest)
+            changes = {"attempts": attempts, "last_error": str(exc)}
+            if attempts >= settings.NOTIFICATION_MAX_ATTEMPTS:
+                changes["status"] = Notification.Status.FAILED
+            else:
+                changes["next_attempt_at"] = timezone.now() + retry_delay(attempts)
+        else:
+            sent += len(digest)
+            changes = {
+                "attempts": attempts,
+                "last_error": "",
+                "status": Notification.Status.SENT,
+                "sent_at": timezone.now(),
+            }
+
+        Notification.objects.filter(id__in=[notification.id for notification in digest]).update(
+            updated_at=timezone.now(), **changes
+        )
+
+    return sent, failed
@@ -0,0 +1,87 @@
+from datetime import datetime
+from datetime import time
+from datetime import timedelta
+
+from django.db.models import Count
+from django.db.models import DateField
+from django.db.models import Sum
+from django.db.models.functions import Trunc
+
+BUCKETS = ("day", "week", "month")
+
+# group_by -> (grouped column, label column)
+GROUPS = {
+    "owner": ("owner", "owner__email"),
+    "task": ("task", "task__title"),
+    "status": ("task__status", "task__status"),
+}
+
+
+def bucket_start(value, bucket):
+    # Same boundaries as Postgres date_trunc: weeks start on Monday.
+    match bucket:
+        case "day":
+            return value
+        case "week":
+            return value - timedelta(days=value.weekday())
+        case "month":
+            return value.replace(day=1)
+
+
+def next_bucket(value, bucket):
+    match bucket:
+        case "day":
+            return value + timedelta(days=1)
+        case "week":
+            return value + timedelta(days=7)
+        case "month":
+            return (value.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def iter_buckets(start, end, bucket):
+    value = bucket_start(start, bucket)
+    while value <= end:
+        yield value
+        value = next_bucket(value, bucket)
+
+
+def time_report(timelogs, start, end, bucket, group_by, tzinfo):
+    # Logged time between the start and end dates (inclusive, in tzinfo) summed per group and bucket by a single
+    # date_trunc / GROUP BY query. Every series has a point for each bucket of the range, empty ones included.
+    group_column, label_column = GROUPS[group_by]
+    rows = (
+        timelogs.filter(
+            started_at__gte=datetime.combine(start, time.min, tzinfo=tzinfo),
+            started_at__lt=datetime.combine(end + timedelta(days=1), time.min, tzinfo=tzinfo),
+        )
+        .annotate(bucket=Trunc("started_at", bucket, output_field=DateField(), tzinfo=tzinfo))
+        .order_by()
+        .values(group_column, label_column, "bucket")
+        .annotate(duration=Sum("duration"), entries=Count("id"))
+    )
+
+    buckets = list(iter_buckets(start, end, bucket))
+    series = {}
+    for row in rows:
+        key = row[group_column]
+        if key not in series:
+            series[key] = {
+                "key": key,
+                "label": row[label_column],
+                "total_seconds": 0,
+                "entries": 0,
+                "points": {value: {"bucket": value, "seconds": 0, "entries": 0} for value in buckets},
+            }
+        seconds = row["duration"].total_seconds() if row["duration"] else 0
+        point = series[key]["points"][row["bucket"]]
+        point["seconds"] += seconds
+        point["entries"] += row["entries"]
+        series[key]["total_seconds"] += seconds
+        series[key]["entries"] += row["entries"]
+
+    for item in series.values():
+        item["points"] = list(item["points"].values())
+    return {
+        "buckets": buckets,
+        "series": sorted(series.values(), key=lambda item: (-item["total_seconds"], str(item["key"]))),
+    }
@@ -0,0 +1,75 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import IntegrityError
+from django.db import transaction
+from django.db.models import Count
+from django.db.models import DateField
+from django.db.models import F
+from django.db.models import Sum
+from django.db.models.functions import TruncMonth
+from django.utils.timezone import utc
+
+from apps.tasks.cache import invalidate_time_caches
+from apps.tasks.helpers import month_start
+from apps.tasks.models import MonthlyTimeRollup
+from apps.tasks.models import TimeLog
+
+
+def apply_rollup_delta(task_id, owner_id, month, duration, entries):
+    bucket = {"task_id": task_id, "owner_id": owner_id, "month": month}
+    rollups = MonthlyTimeRollup.objects.filter(**bucket)
+
+    updated = rollups.update(duration=F("duration") + duration, entries=F("entries") + entries)
+    if entries < 0:
+        rollups.filter(entries__lte=0).delete()
+    elif not updated:
+        try:
+            with transaction.atomic():
+                MonthlyTimeRollup.objects.create(duration=duration, entries=entries, **bucket)
+        except IntegrityError:
+            # Another transaction created the bucket first.
+            rollups.update(duration=F("duration") + duration, entries=F("entries") + entries)
+
+
+def add_to_rollups(entries):
+    # entries are (task_id, owner_id, started_at, duration) of time logs inserted without signals.
+    buckets = defaultdict(lambda: [timedelta(), 0])
+    for task_id, owner_id, started_at, duration in entries:
+        bucket = buckets[(task_id, owner_id, month_start(started_at))]
+        bucket[0] += duration or timedelta()
+        bucket[1] += 1
+
+    for (task_id, owner_id, month), (duration, entries) in buckets.items():
+        apply_rollup_delta(task_id, owner_id, month, duration=duration, entries=entries)
+
+
+def rebuild_rollups(batch_size=1000):
+    buckets = (
+        TimeLog.objects.annotate(month=TruncMonth("started_at", output_field=DateField(), tzinfo=utc))
+        .values("task_id", "owner_id", "month")
+        .annotate(total=Sum("duration", default=timedelta()), count=Count("id"))
+        .order_by()
+    )
+
+    with transaction.atomic():
+        MonthlyTimeRollup.objects.all().delete()
+
+        batch = []
+        for bucket in buckets.iterator(chunk_size=batch_size):
+            batch.append(
+                MonthlyTimeRollup(
+                    task_id=bucket["task_id"],
+                    owner_id=bucket["owner_id"],
+                    month=bucket["month"],
+                    duration=bucket["total"],
+                    entries=bucket["count"],
+                )
+            )
+            if len(batch) >= batch_size:
+                MonthlyTimeRollup.objects.bulk_create(batch)
+                batch = []
+        MonthlyTimeRollup.objects.bulk_create(batch)
+        invalidate_time_caches()
+
+    return MonthlyTimeRollup.objects.count()
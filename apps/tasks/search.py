@@ -0,0 +1,95 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import F
+from django.db.models import Max
+from django.db.models import Window
+from django.db.models.functions import RowNumber
+
+from apps.common.search import full_text_search
+from apps.tasks.models import Comment
+
+
+class RankedTasks:
+    # (task id, rank) of the tasks matching the terms themselves or through one of their comments, best first, read
+    # a page at a time. A task ranks as its best match. Each page is ranked and merged in one query, where each lookup
+    # keeps only its offset + page size best ranked tasks (ties broken by id), which is all the merge can reach.
+    # Results stop at SEARCH_CANDIDATE_LIMIT, so the count never scans past it either.
+
+    def __init__(self, tasks, comments, limit):
+        self.tasks = tasks
+        self.comments = comments
+        self.limit = limit
+
+    def count(self):
+        ids = self.tasks.order_by().values_list("id").union(self.comments.order_by().values_list("task_id"))
+        return ids[: self.limit].count()
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice) or index.step:
+            raise TypeError("RankedTasks only supports slicing.")
+        start, stop = index.start or 0, min(self.limit if index.stop is None else index.stop, self.limit)
+        if stop <= start:
+            return []
+
+        tasks = self.tasks.order_by("-search_rank", "-id").values_list("id", "search_rank")[:stop]
+        comments = (
+            self.comments.values("task_id")
+            .annotate(best_rank=Max("search_rank"))
+            .order_by("-best_rank", "-task_id")
+            .values_list("task_id", "best_rank")[:stop]
+        )
+        tasks_sql, tasks_params = tasks.query.sql_with_params()
+        comments_sql, comments_params = comments.query.sql_with_params()
+        with connections[self.tasks.db].cursor() as cursor:
+            cursor.execute(
+                f"SELECT task_id, MAX(rank) AS rank FROM (({tasks_sql}) UNION ALL ({comments_sql})) "
+                "AS matches (task_id, rank) GROUP BY task_id ORDER BY rank DESC, task_id DESC LIMIT %s OFFSET %s",
+                (*tasks_params, *comments_params, stop - start, start),
+            )
+            return cursor.fetchall()
+
+
+def search_tasks(tasks, terms):
+    # The RankedTasks of the tasks matching the terms, restricted to the given tasks.
+    comments = Comment.objects.all()
+    if tasks.query.has_filters():
+        comments = comments.filter(task__in=tasks.values("id"))
+    return RankedTasks(
+        full_text_search(tasks, terms), full_text_search(comments, terms), settings.SEARCH_CANDIDATE_LIMIT
+    )
+
+
+def load_ranked_tasks(tasks, ranked):
+    # The tasks of a page of search_tasks() results, in rank order, with search_rank set.
+    instances = tasks.in_bulk([task_id for task_id, _ in ranked])
+    page = []
+    for task_id, rank in ranked:
+        if task_id in instances:
+            instances[task_id].search_rank = rank
+            page.append(instances[task_id])
+    return page
+
+
+def attach_matching_comments(tasks, terms, per_task=None):
+    # Sets task.matching_comments to the best ranked comments of each task matching the terms, in one query.
+    per_task = per_task or settings.SEARCH_COMMENTS_PER_TASK
+    comments = (
+        full_text_search(Comment.objects.filter(task__in=[task.id for task in tasks]), terms)
+        .annotate(
+            position=Window(RowNumber(), partition_by=F("task_id"), order_by=[F("search_rank").desc(), F("id").desc()])
+        )
+        .filter(position__lte=per_task)
+        .order_by("task_id", "position")
+    )
+
+    by_task = defaultdict(list)
+    for comment in comments:
+        by_task[comment.task_id].append(comment)
+    for task in tasks:
+        task.matching_comments = by_task[task.id]
+    return tasks
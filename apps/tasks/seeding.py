@@ -0,0 +1,200 @@
+import math
+import multiprocessing
+import random
+import time
+from datetime import timedelta
+from functools import lru_cache
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import connection
+from django.db import connections
+from django.db.models import Max
+from django.utils import timezone
+from faker import Faker
+
+from apps.common.db import copy_rows
+from apps.tasks.counters import rebuild_counters
+from apps.tasks.models import Comment
+from apps.tasks.models import Task
+from apps.tasks.models import TimeLog
+from apps.tasks.rollups import rebuild_rollups
+from apps.users.models import User
+
+SEED_MODELS = {"users": User, "tasks": Task, "timelogs": TimeLog, "comments": Comment}
+
+SEED_FIELDS = {
+    "users": [
+        "id",
+        "email",
+        "password",
+        "first_name",
+        "last_name",
+        "is_superuser",
+        "is_staff",
+        "is_active",
+        "date_joined",
+        "updated_at",
+    ],
+    "tasks": [
+        "id",
+        "created_at",
+        "updated_at",
+        "title",
+        "description",
+        "status",
+        "owner",
+        "tracked_duration",
+        "timelog_count",
+        "comment_count",
+    ],
+    "timelogs": ["id", "created_at", "updated_at", "task", "owner", "started_at", "duration"],
+    "comments": ["id", "created_at", "updated_at", "text", "task", "owner"],
+}
+
+
+class SeedPlan:
+    # Row counts follow from the number of users and three independent ratios. Every row is derived from
+    # (seed, table, chunk start), so the same plan and batch size produce the same data with any number of workers.
+    skew = 2.5
+
+    def __init__(
+        self,
+        users,
+        tasks_per_user=5,
+        timelogs_per_task=20,
+        comments_per_task=2,
+        seed=0,
+        history_days=365,
+        until=None,
+        password="password",
+    ):
+        self.seed = seed
+        self.history_days = history_days
+        self.until = until or timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        self.password = make_password(password, salt=f"seed{seed}")
+        self.counts = {
+            "users": users,
+            "tasks": round(users * tasks_per_user),
+            "timelogs": round(users * tasks_per_user * timelogs_per_task),
+            "comments": round(users * tasks_per_user * comments_per_task),
+        }
+        self.first_ids = {}
+
+    def reserve_ids(self):
+        # Rows are copied with explicit ids after the current maximum, sequences are reset once seeding is done.
+        for table, model in SEED_MODELS.items():
+            self.first_ids[table] = (model.objects.aggregate(last=Max("id"))["last"] or 0) + 1
+
+    def skewed(self, rng, count):
+        # A few users own most tasks and a few tasks collect most time logs and comments.
+        return min(int(count * rng.random() ** self.skew), count - 1)
+
+    def task_owner(self, index):
+        return self.first_ids["users"] + self.skewed(random.Random(f"{self.seed}:owner:{index}"), self.counts["users"])
+
+    def started_at(self, rng):
+        # Recent days are busier than old ones, weekends are mostly empty and work happens around midday.
+        days_ago = min(int(rng.expovariate(1 / 45)), self.history_days - 1)
+        day = self.until - timedelta(days=days_ago + 1)
+        if day.weekday() >= 5 and rng.random() < 0.8:
+            day -= timedelta(days=day.weekday() - 4)
+        hour = min(max(rng.gauss(13, 2.5), 7), 20)
+        return day + timedelta(hours=hour)
+
+    @staticmethod
+    def duration(rng):
+        # Log-normal: mostly short entries around 40 minutes, with a long tail of multi-hour sessions.
+        return timedelta(minutes=min(max(round(rng.lognormvariate(math.log(40), 0.9)), 1), 12 * 60))
+
+
+@lru_cache
+def text_pools(seed):
+    fake = Faker()
+    fake.seed_instance(seed)
+    return {
+        "first_names": [fake.first_name() for _ in range(500)],
+        "last_names": [fake.last_name() for _ in range(500)],
+        "titles": [fake.sentence(nb_words=4)[:255] for _ in range(1000)],
+        "texts": [fake.text(max_nb_chars=200) for _ in range(1000)],
+    }
+
+
+def iter_rows(plan, table, start, stop):
+    rng = random.Random(f"{plan.seed}:{table}:{start}")
+    pools = text_pools(plan.seed)
+    first_id = plan.first_ids[table]
+    users, tasks = plan.counts["users"], plan.counts["tasks"]
+    now = timezone.now()
+
+    for index in range(start, stop):
+        if table == "users":
+            yield (
+                first_id + index,
+                f"seed{plan.seed}.user{first_id + index}@example.com",
+                plan.password,
+                rng.choice(pools["first_names"]),
+                rng.choice(pools["last_names"]),
+                False,
+                False,
+                True,
+                now,
+                now,
+            )
+        elif table == "tasks":
+            status = Task.Status.COMPLETED if rng.random() < 0.6 else Task.Status.IN_PROGRESS
+            title, description = rng.choice(pools["titles"]), rng.choice(pools["texts"])
+            yield first_id + index, now, now, title, description, status, plan.task_owner(index), timedelta(), 0, 0
+        else:
+            task = plan.skewed(rng, tasks)
+            owner = plan.task_owner(task) if rng.random() < 0.9 else plan.first_ids["users"] + rng.randrange(users)
+            task_id = plan.first_ids["tasks"] + task
+            if table == "timelogs":
+                yield first_id + index, now, now, task_id, owner, plan.started_at(rng), plan.duration(rng)
+            else:
+                yield first_id + index, now, now, rng.choice(pools["texts"]), task_id, owner
+
+
+def seed_chunk(plan, table, start, stop):
+    copy_rows(SEED_MODELS[table], SEED_FIELDS[table], iter_rows(plan, table, start, stop))
+    return stop - start
+
+
+def _seed_chunk(args):
+    return seed_chunk(*args)
+
+
+def reset_sequences():
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), SEED_MODELS.values()):
+            cursor.execute(sql)
+
+
+def seed(plan, batch_size=10000, workers=1, progress=None):
+    # Tables are filled in dependency order, each one in chunks of batch_size rows that are
+    # copied in their own transaction, optionally by a pool of worker processes.
+    plan.reserve_ids()
+    pool = None
+    if workers > 1:
+        # Forked workers must not share the parent's database connection.
+        connections.close_all()
+        pool = multiprocessing.get_context("fork").Pool(workers)
+
+    try:
+        for table, total in plan.counts.items():
+            chunks = [(plan, table, start, min(start + batch_size, total)) for start in range(0, total, batch_size)]
+            results = pool.imap_unordered(_seed_chunk, chunks) if pool else map(_seed_chunk, chunks)
+            started, done = time.monotonic(), 0
+            for rows in results:
+                done += rows
+                if progress:
+                    progress(table, done, total, done / max(time.monotonic() - started, 1e-9))
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+
+    reset_sequences()
+    rebuild_rollups()
+    rebuild_counters()
+    return plan.counts
@@ -1,17 +1,28 @@
 from datetime import datetime
 from datetime import timedelta
+from itertools import islice
+from zoneinfo import ZoneInfo
+from zoneinfo import ZoneInfoNotFoundError
 
 from django.conf import settings
-from django.core.mail import send_mail
+from django.db import transaction
+from django.utils import timezone
 from django.utils.timezone import utc
 
 from rest_framework import serializers
 
+from apps.common.serializers import DynamicFieldsMixin
+from apps.users.models import User
 from apps.users.serializers import UserSerializer
 from apps.tasks.models import Task
 from apps.tasks.models import Comment
+from apps.tasks.models import Notification
 from apps.tasks.models import TimeLog
 from apps.tasks.models import Timer
+from apps.tasks.notifications import enqueue_notification
+from apps.tasks.reports import BUCKETS
+from apps.tasks.reports import GROUPS
+from apps.tasks.reports import iter_buckets
 
 
 class TaskSerializer(serializers.ModelSerializer):
@@ -20,34 +31,36 @@ class TaskSerializer(serializers.ModelSerializer):
         fields = "__all__"
         extra_kwargs = {"owner": {"required": False}}
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         old_status = instance.status
-        old_owner = instance.owner
+        old_owner_id = instance.owner_id
         instance = super().update(instance, validated_data)
         new_status = instance.status
-        new_owner = instance.owner
+        new_owner_id = instance.owner_id
 
         if new_status == Task.Status.COMPLETED and old_status != Task.Status.COMPLETED:
-            for comment in instance.comments.all():
-                send_mail(
-                    subject="Your task, that was commented is completed!",
-                    message=f"You have just executed a task!\n The completed task is {instance.title}.",
-                    from_email=settings.EMAIL_HOST_USER,
-                    recipient_list=[comment.owner.email],
-                )
-
-        if old_owner != new_owner:
-            send_mail(
+            enqueue_notification(
+                event=Notification.Event.COMPLETED,
+                task=instance,
+                subject="Your task, that was commented is completed!",
+                message=f"You have just executed a task!\n The completed task is {instance.title}.",
+                recipient_list=User.objects.filter(comments__task=instance).values_list("email", flat=True).distinct(),
+            )
+
+        if old_owner_id != new_owner_id:
+            enqueue_notification(
+                event=Notification.Event.ASSIGNED,
+                task=instance,
                 subject="You have been assigned to a new task!",
                 message=f'You have been assigned to a new task!\n The new task is "{instance.title}".',
-                from_email=settings.EMAIL_HOST_USER,
                 recipient_list=[instance.owner.email],
             )
 
         return instance
 
 
-class TaskListSerializer(serializers.ModelSerializer):
+class TaskListSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     total_duration = serializers.DurationField(read_only=True)
     owner = UserSerializer()
 
@@ -63,21 +76,22 @@ class CommentSerializer(serializers.ModelSerializer):
         fields = "__all__"
         extra_kwargs = {"owner": {"read_only": True}}
 
+    @transaction.atomic
     def create(self, validated_data):
         validated_data["owner"] = self.context["request"].user
         instance = super().create(validated_data)
-        send_mail(
+        enqueue_notification(
+            event=Notification.Event.COMMENTED,
+            task=validated_data.get("task"),
             subject="Your task got a new comment!",
-            message=f"The task \"{validated_data.get('task').title}\""
-            f" got a new comment :\n {self.data.get('text')}",
-            from_email=settings.EMAIL_HOST_USER,
+            message=f"The task \"{validated_data.get('task').title}\" got a new comment :\n {instance.text}",
             recipient_list=[validated_data.get("task").owner.email],
         )
 
         return instance
 
 
-class CommentListSerializer(serializers.ModelSerializer):
+class CommentListSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     owner = UserSerializer()
     task = TaskSerializer()
 
@@ -86,6 +100,19 @@ class CommentListSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
+class CommentSearchSerializer(serializers.ModelSerializer):
+    rank = serializers.FloatField(source="search_rank", read_only=True)
+
+    class Meta:
+        model = Comment
+        fields = "__all__"
+
+
+class TaskSearchSerializer(TaskListSerializer):
+    rank = serializers.FloatField(source="search_rank", read_only=True)
+    comments = CommentSearchSerializer(source="matching_comments", many=True, read_only=True)
+
+
 class TimelogSerializer(serializers.ModelSerializer):
     class Meta:
         model = TimeLog
@@ -121,7 +148,15 @@ class TimelogCreateSerializer(serializers.ModelSerializer):
         return timelog
 
 
-class TimelogListSerializer(serializers.ModelSerializer):
+class TimelogBulkRowSerializer(serializers.Serializer):
+    # Same input as TimelogCreateSerializer; task ownership is checked per chunk by ingest_timelogs. Durations are
+    # capped at a year so a huge value is reported as that row's error instead of overflowing timedelta.
+    task = serializers.IntegerField()
+    date_field = serializers.DateField()
+    duration_minutes = serializers.IntegerField(min_value=0, max_value=366 * 24 * 60)
+
+
+class TimelogListSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     owner = UserSerializer()
     task = TaskSerializer()
 
@@ -130,6 +165,53 @@ class TimelogListSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
+class TimelogReportQuerySerializer(serializers.Serializer):
+    start = serializers.DateField()
+    end = serializers.DateField()
+    bucket = serializers.ChoiceField(choices=BUCKETS, default="day")
+    group_by = serializers.ChoiceField(choices=list(GROUPS), default="task")
+    tz = serializers.CharField(required=False)
+
+    def validate_tz(self, value):
+        try:
+            return ZoneInfo(value)
+        except (ZoneInfoNotFoundError, ValueError):
+            raise serializers.ValidationError(f'Unknown time zone "{value}".')
+
+    def validate(self, attrs):
+        attrs.setdefault("tz", timezone.get_current_timezone())
+        if attrs["end"] < attrs["start"]:
+            raise serializers.ValidationError({"end": "Must not be before start."})
+        limit = settings.TIME_REPORT_MAX_BUCKETS
+        if len(list(islice(iter_buckets(attrs["start"], attrs["end"], attrs["bucket"]), limit + 1))) > limit:
+            raise serializers.ValidationError({"bucket": f"The range spans more than {limit} buckets."})
+        return attrs
+
+
+class TimelogReportPointSerializer(serializers.Serializer):
+    bucket = serializers.DateField()
+    seconds = serializers.FloatField()
+    entries = serializers.IntegerField()
+
+
+class TimelogReportSeriesSerializer(serializers.Serializer):
+    key = serializers.JSONField()
+    label = serializers.CharField(allow_null=True)
+    total_seconds = serializers.FloatField()
+    entries = serializers.IntegerField()
+    points = TimelogReportPointSerializer(many=True)
+
+
+class TimelogReportSerializer(serializers.Serializer):
+    start = serializers.DateField()
+    end = serializers.DateField()
+    bucket = serializers.CharField()
+    group_by = serializers.CharField()
+    time_zone = serializers.CharField()
+    buckets = serializers.ListField(child=serializers.DateField())
+    series = TimelogReportSeriesSerializer(many=True)
+
+
 class TimelogByMonthSerializer(serializers.ModelSerializer):
     total = serializers.DurationField(allow_null=True)
 
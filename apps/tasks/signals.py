@@ -0,0 +1,125 @@
+from datetime import timedelta
+
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_save
+from django.db.models.signals import pre_delete
+from django.db.models.signals import pre_save
+from django.dispatch import receiver
+
+from apps.tasks.cache import invalidate_time_caches
+from apps.tasks.cache import leaderboard_cache
+from apps.tasks.helpers import month_start
+from apps.tasks.counters import apply_counter_delta
+from apps.tasks.counters import deleted_by_cascade
+from apps.tasks.counters import foreign_tasks
+from apps.tasks.counters import recompute_counters
+from apps.tasks.models import Comment
+from apps.tasks.models import Task
+from apps.tasks.models import TimeLog
+from apps.tasks.rollups import apply_rollup_delta
+from apps.users.models import User
+
+
+def rollup_bucket(task_id, owner_id, started_at, duration):
+    return (task_id, owner_id, month_start(started_at)), duration or timedelta()
+
+
+@receiver(pre_save, sender=TimeLog)
+def remember_timelog_bucket(sender, instance, **kwargs):
+    instance._previous_bucket = None
+    if not instance._state.adding:
+        previous = TimeLog.objects.filter(pk=instance.pk).values("task_id", "owner_id", "started_at", "duration")
+        if previous:
+            instance._previous_bucket = rollup_bucket(**previous[0])
+
+
+@receiver(post_save, sender=TimeLog)
+def update_timelog_rollup(sender, instance, **kwargs):
+    bucket, duration = rollup_bucket(instance.task_id, instance.owner_id, instance.started_at, instance.duration)
+    previous = getattr(instance, "_previous_bucket", None)
+
+    if previous and previous[0] == bucket:
+        apply_rollup_delta(*bucket, duration=duration - previous[1], entries=0)
+    else:
+        if previous:
+            apply_rollup_delta(*previous[0], duration=-previous[1], entries=-1)
+        apply_rollup_delta(*bucket, duration=duration, entries=1)
+    invalidate_time_caches([instance.owner_id, previous[0][1]] if previous else [instance.owner_id])
+
+
+@receiver(post_delete, sender=TimeLog)
+def remove_timelog_rollup(sender, instance, origin=None, **kwargs):
+    if deleted_by_cascade(origin):
+        return
+    bucket, duration = rollup_bucket(instance.task_id, instance.owner_id, instance.started_at, instance.duration)
+    apply_rollup_delta(*bucket, duration=-duration, entries=-1)
+    invalidate_time_caches([instance.owner_id])
+
+
+@receiver(post_save, sender=TimeLog)
+def update_timelog_task_counters(sender, instance, **kwargs):
+    duration = instance.duration or timedelta()
+    previous = getattr(instance, "_previous_bucket", None)
+
+    if previous and previous[0][0] == instance.task_id:
+        apply_counter_delta(instance.task_id, duration=duration - previous[1], activity_at=instance.updated_at)
+    else:
+        if previous:
+            apply_counter_delta(previous[0][0], duration=-previous[1], timelogs=-1)
+        apply_counter_delta(instance.task_id, duration=duration, timelogs=1, activity_at=instance.updated_at)
+
+
+@receiver(post_delete, sender=TimeLog)
+def remove_timelog_task_counters(sender, instance, origin=None, **kwargs):
+    if not deleted_by_cascade(origin):
+        apply_counter_delta(instance.task_id, duration=-(instance.duration or timedelta()), timelogs=-1)
+
+
+@receiver(pre_save, sender=Comment)
+def remember_comment_task(sender, instance, **kwargs):
+    instance._previous_task_id = None
+    if not instance._state.adding:
+        instance._previous_task_id = Comment.objects.filter(pk=instance.pk).values_list("task_id", flat=True).first()
+
+
+@receiver(post_save, sender=Comment)
+def update_comment_task_counters(sender, instance, **kwargs):
+    previous = getattr(instance, "_previous_task_id", None)
+
+    if previous == instance.task_id:
+        apply_counter_delta(instance.task_id, activity_at=instance.updated_at)
+    else:
+        if previous:
+            apply_counter_delta(previous, comments=-1)
+        apply_counter_delta(instance.task_id, comments=1, activity_at=instance.updated_at)
+
+
+@receiver(post_delete, sender=Comment)
+def remove_comment_task_counters(sender, instance, origin=None, **kwargs):
+    if not deleted_by_cascade(origin):
+        apply_counter_delta(instance.task_id, comments=-1)
+
+
+@receiver(post_save, sender=Task)
+def invalidate_task_leaderboard(sender, instance, **kwargs):
+    leaderboard_cache.bump_on_commit()
+
+
+@receiver(post_delete, sender=Task)
+def invalidate_deleted_task_caches(sender, instance, **kwargs):
+    # Its time logs went with it, without running their own receivers.
+    invalidate_time_caches()
+
+
+@receiver(pre_delete, sender=User)
+def remember_foreign_tasks(sender, instance, **kwargs):
+    instance._foreign_task_ids = foreign_tasks(instance)
+
+
+@receiver(post_delete, sender=User)
+def update_foreign_tasks(sender, instance, **kwargs):
+    # The user's time logs and comments on other users' tasks are gone: those tasks' counters are recomputed in one
+    # UPDATE instead of one per deleted row.
+    if instance._foreign_task_ids:
+        recompute_counters(Task.objects.filter(id__in=instance._foreign_task_ids))
+    invalidate_time_caches()
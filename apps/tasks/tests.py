@@ -1,25 +1,69 @@
+import asyncio
+import csv
+import json
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from datetime import timedelta
+from io import StringIO
 from unittest import mock
 
+from asgiref.sync import async_to_sync
+from asgiref.sync import iscoroutinefunction
 from django.conf import settings
 from django.core import mail
+from django.core.handlers.asgi import ASGIHandler
 from django.core.mail import send_mail
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.signals import request_finished
+from django.core.signals import request_started
+from django.db import close_old_connections
+from django.db import connection
+from django.db.models import QuerySet
+from django.test import AsyncClient
+from django.test import TransactionTestCase
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
 from django.urls import reverse
 from django.utils import timezone
+from django.utils.http import http_date
+from django.utils.timezone import utc
 from faker import Faker
 from rest_framework.status import HTTP_200_OK
 from rest_framework.status import HTTP_201_CREATED
 from rest_framework.status import HTTP_204_NO_CONTENT
+from rest_framework.test import APIClient
 from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
 from rest_framework_simplejwt.tokens import RefreshToken
 
+from apps.common.mixins import ExportMixin
+from apps.common.testing import QueryBudgetMixin
+from apps.tasks.cache import leaderboard_cache
+from apps.tasks.cache import month_total_cache
+from apps.tasks.counters import find_counter_drift
 from apps.tasks.factories import CommentFactory
 from apps.tasks.factories import TaskFactory
 from apps.tasks.factories import TimeLogFactory
 from apps.tasks.factories import TimerFactory
+from apps.tasks.helpers import next_month_start
 from apps.tasks.helpers import start_month_date
+from apps.tasks.models import Comment
+from apps.tasks.models import MonthlyTimeRollup
+from apps.tasks.models import Notification
 from apps.tasks.models import Task
+from apps.tasks.models import TimeLog
+from apps.tasks.models import Timer
+from apps.tasks.notifications import deliver_pending
+from apps.tasks.notifications import enqueue_notification
+from apps.tasks.seeding import SeedPlan
+from apps.tasks.search import search_tasks
+from apps.tasks.seeding import seed
 from apps.users.factories import UserFactory
+from apps.users.models import User
 
 fake = Faker()
 
@@ -53,9 +97,7 @@ class TaskTestCase(APITestCase):
         response = self.client.get(reverse("tasks-list"), data={"status": "completed"})
         self.assertEqual(response.status_code, HTTP_200_OK)
 
-    @mock.patch("apps.tasks.serializers.send_mail")
-    def test_assign_task(self, mock_send_email):
-        mock_send_email.return_value = None
+    def test_assign_task(self):
         other_owner = UserFactory.create()
         data = {"owner": other_owner.pk}
 
@@ -65,10 +107,10 @@ class TaskTestCase(APITestCase):
         self.assertNotEqual(self.task.owner, other_owner)
         self.task.refresh_from_db()
         self.assertEqual(Task.objects.get(id=self.task.id).owner, other_owner)
+        self.assertTrue(Notification.objects.filter(recipient=other_owner.email).exists())
+        self.assertEqual(len(mail.outbox), 0)
 
-    @mock.patch("apps.tasks.serializers.send_mail")
-    def test_complete_task(self, mock_send_email):
-        mock_send_email.return_value = None
+    def test_complete_task(self):
         CommentFactory.create(task=self.task, owner=self.user)
         self.task.status = Task.Status.IN_PROGRESS
         self.task.save()
@@ -78,6 +120,7 @@ class TaskTestCase(APITestCase):
         )
         self.assertEqual(response.status_code, HTTP_200_OK)
         self.assertEqual(Task.objects.get(id=self.task.id).status, Task.Status.COMPLETED)
+        self.assertTrue(Notification.objects.filter(recipient=self.user.email).exists())
 
     def test_remove_task(self):
         response = self.client.delete(reverse("tasks-detail", kwargs={"pk": self.task.id}))
@@ -130,12 +173,11 @@ class CommentTestCase(APITestCase):
         self.task = TaskFactory.create(owner=self.user)
         self.comment = CommentFactory.create(task=self.task, owner=self.user)
 
-    @mock.patch("apps.tasks.serializers.send_mail")
-    def test_create_comment(self, mock_send_email):
-        mock_send_email.return_value = None
+    def test_create_comment(self):
         data = {"task": self.task.id, "text": fake.text()}
         response = self.client.post(reverse("comments-list"), data)
         self.assertEqual(response.status_code, HTTP_201_CREATED)
+        self.assertEqual(Notification.objects.filter(recipient=self.user.email).count(), 1)
 
     def test_list_comments(self):
         comment = CommentFactory.create(task_id=self.task.id, owner=self.user)
@@ -154,6 +196,104 @@ class CommentTestCase(APITestCase):
         self.assertEqual(response.status_code, HTTP_200_OK)
 
 
+class SearchTestCase(APITestCase):
+    def setUp(self) -> None:
+        self.user = UserFactory.create()
+        self.client.force_authenticate(user=self.user)
+
+        self.title_match = TaskFactory.create(title="Migrating the databases", description="Weekly chores")
+        self.description_match = TaskFactory.create(title="Weekly chores", description="Database migration plan")
+        self.comment_match = TaskFactory.create(title="Release", description="Ship it")
+        self.comments = [
+            CommentFactory.create(task=self.comment_match, text=f"Blocked by the database migration {n}")
+            for n in range(4)
+        ]
+        self.other = TaskFactory.create(title="Unrelated", description="Nothing to see")
+        CommentFactory.create(task=self.other, text="Coffee machine is broken")
+
+    def test_task_list_search_is_ranked_full_text(self):
+        response = self.client.get(reverse("tasks-list"), data={"search": "database migrations"})
+
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        self.assertEqual(
+            [task["id"] for task in response.data["results"]], [self.title_match.id, self.description_match.id]
+        )
+
+    def test_explicit_ordering_overrides_rank(self):
+        response = self.client.get(reverse("tasks-list"), data={"search": "database migrations", "ordering": "-id"})
+
+        self.assertEqual(
+            [task["id"] for task in response.data["results"]], [self.description_match.id, self.title_match.id]
+        )
+
+    def test_cursor_pagination_needs_an_explicit_ordering(self):
+        data = {"search": "database migrations", "pagination": "cursor"}
+        response = self.client.get(reverse("tasks-list"), data=data)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("pagination", response.data)
+
+        response = self.client.get(reverse("tasks-list"), data={**data, "ordering": "-id"})
+        self.assertEqual(
+            [task["id"] for task in response.data["results"]], [self.description_match.id, self.title_match.id]
+        )
+
+    @override_settings(SEARCH_CANDIDATE_LIMIT=1)
+    def test_candidates_are_the_best_ranked(self):
+        TaskFactory.create(title="Zebra", description="Notes")
+        best = TaskFactory.create(title="Zebra zebra", description="Zebra crossing for zebras")
+
+        response = self.client.get(reverse("tasks-search"), data={"search": "zebra"})
+        self.assertEqual([task["id"] for task in response.data["results"]], [best.id])
+
+    def test_search_pages_rank_only_the_matches_they_reach(self):
+        titled = TaskFactory.create_batch(10, title="Zebra", description="Notes")
+        commented = TaskFactory.create_batch(5, title="Notes", description="Notes")
+        for task in commented:
+            CommentFactory.create_batch(3, task=task, text="Zebra crossing for zebras")
+
+        first = self.client.get(reverse("tasks-search"), data={"search": "zebra"})
+        second = self.client.get(reverse("tasks-search"), data={"search": "zebra", "page": 2})
+
+        self.assertEqual(first.data["count"], 15)
+        results = first.data["results"] + second.data["results"]
+        self.assertEqual([task["id"] for task in results], [task.id for task in titled[::-1] + commented[::-1]])
+
+        with CaptureQueriesContext(connection) as context:
+            search_tasks(Task.objects.all(), "zebra")[0:12]
+        self.assertEqual(context.captured_queries[0]["sql"].count("LIMIT 12"), 3)
+
+    def test_comment_list_search_is_full_text(self):
+        response = self.client.get(reverse("comments-list"), data={"search": "migrated"})
+
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        self.assertEqual({comment["id"] for comment in response.data["results"]}, {c.id for c in self.comments})
+
+    @override_settings(SEARCH_COMMENTS_PER_TASK=2)
+    def test_search_tasks_and_comments(self):
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse("tasks-search"), data={"search": "database migration"})
+
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        results = {task["id"]: task for task in response.data["results"]}
+        self.assertEqual(set(results), {self.title_match.id, self.description_match.id, self.comment_match.id})
+        self.assertEqual(results[self.title_match.id]["comments"], [])
+        self.assertEqual(len(results[self.comment_match.id]["comments"]), 2)
+        self.assertEqual(results[self.comment_match.id]["comments"][0]["task"], self.comment_match.id)
+        ranks = [task["rank"] for task in response.data["results"]]
+        self.assertEqual(ranks, sorted(ranks, reverse=True))
+        self.assertTrue(all(rank > 0 for rank in ranks))
+
+    def test_search_tasks_filters(self):
+        response = self.client.get(
+            reverse("tasks-search"), data={"search": "database", "owner": self.comment_match.owner_id}
+        )
+        self.assertEqual([task["id"] for task in response.data["results"]], [self.comment_match.id])
+
+    def test_search_tasks_requires_terms(self):
+        response = self.client.get(reverse("tasks-search"))
+        self.assertEqual(response.status_code, 400)
+
+
 class TimerTestCase(APITestCase):
     def setUp(self) -> None:
         self.user = UserFactory.create(password=fake.password)
@@ -185,6 +325,25 @@ class TimerTestCase(APITestCase):
         self.assertEqual(response.status_code, 400)
         self.assertEqual(response.data, {"detail": f"Task id:{self.timer.id} has no ongoing timer."})
 
+    def test_start_timer_twice_keeps_started_at(self):
+        self.client.post(reverse("tasks-start", kwargs={"pk": self.task.id}))
+        started_at = Timer.objects.get(pk=self.timer.pk).started_at
+
+        response = self.client.post(reverse("tasks-start", kwargs={"pk": self.task.id}))
+
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        self.assertEqual(Timer.objects.get(pk=self.timer.pk).started_at, started_at)
+
+    def test_stop_timer_twice_creates_one_timelog(self):
+        self.client.post(reverse("tasks-start", kwargs={"pk": self.task.id}))
+
+        first = self.client.post(reverse("tasks-stop", kwargs={"pk": self.task.id}))
+        second = self.client.post(reverse("tasks-stop", kwargs={"pk": self.task.id}))
+
+        self.assertEqual(first.status_code, HTTP_200_OK)
+        self.assertEqual(second.status_code, 400)
+        self.assertEqual(TimeLog.objects.filter(task=self.task, owner=self.user).count(), 1)
+
     def test_create_timelog(self):
         data = {
             "date_field": fake.date(),
@@ -220,3 +379,1247 @@ class TimerTestCase(APITestCase):
     def test_remove_timelog(self):
         response = self.client.delete(reverse("timelog-detail", kwargs={"pk": self.timelog.id}))
         self.assertEqual(response.status_code, HTTP_204_NO_CONTENT)
+
+
+class TimerConcurrencyTestCase(TransactionTestCase):
+    calls = 300
+    workers = 16
+
+    def setUp(self) -> None:
+        self.user = UserFactory.create(password=fake.password)
+        self.task = TaskFactory.create(owner=self.user)
+
+    def call(self, action):
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        try:
+            return action, client.post(reverse(f"tasks-{action}", kwargs={"pk": self.task.id})).status_code
+        finally:
+            connection.close()
+
+    def test_parallel_start_and_stop(self):
+        actions = ["start", "start", "stop"] * (self.calls // 3)
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            results = list(executor.map(self.call, actions))
+
+        self.assertTrue(all(code in (200, 400, 404) for _, code in results))
+        stops = sum(1 for action, code in results if action == "stop" and code == HTTP_200_OK)
+        self.assertGreater(stops, 0)
+        self.assertEqual(Timer.objects.filter(owner=self.user, task=self.task).count(), 1)
+        self.assertEqual(TimeLog.objects.filter(owner=self.user, task=self.task).count(), stops)
+        self.assertEqual(MonthlyTimeRollup.objects.filter(task=self.task).get().entries, stops)
+
+
+@override_settings(NOTIFICATION_DIGEST_WINDOW=0)
+class NotificationWorkerTestCase(APITestCase):
+    def setUp(self) -> None:
+        self.recipients = [fake.email() for _ in range(3)]
+        enqueue_notification(
+            event=Notification.Event.ASSIGNED,
+            task=None,
+            subject="Test subject",
+            message="Test message",
+            recipient_list=self.recipients,
+        )
+
+    def test_deliver_pending(self):
+        sent, failed = deliver_pending()
+
+        self.assertEqual((sent, failed), (3, 0))
+        self.assertEqual(sorted(email.to[0] for email in mail.outbox), sorted(self.recipients))
+        self.assertFalse(Notification.objects.exclude(status=Notification.Status.SENT).exists())
+
+    def test_deliver_pending_batch_size(self):
+        deliver_pending(batch_size=2)
+
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(Notification.objects.filter(status=Notification.Status.PENDING).count(), 1)
+
+    @mock.patch("django.core.mail.backends.locmem.EmailBackend.send_messages")
+    def test_deliver_pending_retry(self, mock_send_messages):
+        mock_send_messages.side_effect = ConnectionError("SMTP is down")
+
+        sent, failed = deliver_pending()
+
+        self.assertEqual((sent, failed), (0, 3))
+        for notification in Notification.objects.all():
+            self.assertEqual(notification.status, Notification.Status.PENDING)
+            self.assertEqual(notification.attempts, 1)
+            self.assertGreater(notification.next_attempt_at, timezone.now())
+
+        self.assertEqual(deliver_pending(), (0, 0))
+
+    @mock.patch("django.core.mail.backends.locmem.EmailBackend.send_messages")
+    def test_deliver_pending_gives_up(self, mock_send_messages):
+        mock_send_messages.side_effect = ConnectionError("SMTP is down")
+        Notification.objects.update(attempts=settings.NOTIFICATION_MAX_ATTEMPTS - 1)
+
+        deliver_pending()
+
+        self.assertEqual(Notification.objects.filter(status=Notification.Status.FAILED).count(), 3)
+
+    def test_deliver_pending_records_each_digest(self):
+        delivered = []
+
+        def send_messages(messages):
+            if delivered:
+                raise KeyboardInterrupt
+            delivered.extend(messages)
+            return len(messages)
+
+        with mock.patch("django.core.mail.backends.locmem.EmailBackend.send_messages", side_effect=send_messages):
+            with self.assertRaises(KeyboardInterrupt):
+                deliver_pending()
+
+        # The delivered digest stays sent, the others keep their lease and are not due again yet.
+        self.assertEqual(Notification.objects.get(status=Notification.Status.SENT).recipient, delivered[0].to[0])
+        for notification in Notification.objects.filter(status=Notification.Status.PENDING):
+            self.assertEqual(notification.attempts, 1)
+            self.assertGreater(notification.next_attempt_at, timezone.now() + timedelta(seconds=60))
+        self.assertEqual(deliver_pending(), (0, 0))
+
+        # A new event for a leased recipient opens a digest of its own.
+        recipient = Notification.objects.filter(status=Notification.Status.PENDING).first().recipient
+        enqueue_notification(Notification.Event.COMMENTED, None, "subject", "message", [recipient])
+        self.assertLessEqual(Notification.objects.latest("id").next_attempt_at, timezone.now())
+        self.assertEqual(deliver_pending(), (1, 0))
+
+        Notification.objects.filter(status=Notification.Status.PENDING).update(next_attempt_at=timezone.now())
+        self.assertEqual(deliver_pending(), (2, 0))
+
+    def test_run_notification_worker(self):
+        call_command("run_notification_worker", "--once", stdout=StringIO())
+
+        self.assertEqual(len(mail.outbox), 3)
+
+
+class NotificationDigestTestCase(APITestCase):
+    def setUp(self) -> None:
+        self.user = UserFactory.create()
+        self.client.force_authenticate(user=self.user)
+        self.task = TaskFactory.create(owner=self.user, status=Task.Status.IN_PROGRESS)
+
+    def test_complete_task_coalesces_recipients(self):
+        commenter = UserFactory.create()
+        CommentFactory.create_batch(10, task=self.task, owner=commenter)
+        CommentFactory.create_batch(2, task=self.task, owner=self.user)
+
+        with self.assertNumQueries(7):
+            response = self.client.patch(
+                reverse("tasks-detail", kwargs={"pk": self.task.pk}), data={"status": Task.Status.COMPLETED}
+            )
+
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        self.assertEqual(
+            sorted(Notification.objects.values_list("recipient", flat=True)), sorted([commenter.email, self.user.email])
+        )
+
+    def test_events_are_delivered_as_one_digest(self):
+        commenter = UserFactory.create()
+        CommentFactory.create(task=self.task, owner=commenter)
+        self.client.post(reverse("comments-list"), {"task": self.task.id, "text": "first"})
+        self.client.post(reverse("comments-list"), {"task": self.task.id, "text": "second"})
+        self.client.patch(reverse("tasks-detail", kwargs={"pk": self.task.pk}), data={"status": Task.Status.COMPLETED})
+
+        self.assertEqual(deliver_pending(), (0, 0))
+
+        Notification.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(deliver_pending(), (4, 0))
+
+        self.assertEqual(len(mail.outbox), 2)
+        digest = next(email for email in mail.outbox if email.to == [self.user.email])
+        self.assertEqual(digest.subject, "You have 3 new task updates")
+        self.assertIn("first", digest.body)
+        self.assertIn("second", digest.body)
+        self.assertIn(self.task.title, digest.body)
+
+    def test_pending_digest_keeps_its_window(self):
+        enqueue_notification(Notification.Event.ASSIGNED, self.task, "subject", "first", [self.user.email])
+        first = Notification.objects.get()
+        enqueue_notification(Notification.Event.COMMENTED, self.task, "subject", "second", [self.user.email])
+
+        self.assertEqual(set(Notification.objects.values_list("next_attempt_at", flat=True)), {first.next_attempt_at})
+
+
+class MonthlyTimeRollupTestCase(APITestCase):
+    def setUp(self) -> None:
+        self.user = UserFactory.create()
+        self.client.force_authenticate(user=self.user)
+        self.task = TaskFactory.create(owner=self.user)
+        self.month = start_month_date().date()
+
+    def get_rollup(self, **kwargs):
+        return MonthlyTimeRollup.objects.get(task=self.task, owner=self.user, **kwargs)
+
+    def test_create_timelog_updates_rollup(self):
+        TimeLogFactory.create(task=self.task, owner=self.user, duration=timedelta(minutes=30))
+        data = {"date_field": timezone.now().date(), "duration_minutes": 15, "task": self.task.id}
+        self.client.post(reverse("timelog-list"), data)
+
+        rollup = self.get_rollup(month=self.month)
+        self.assertEqual(rollup.duration, timedelta(minutes=45))
+        self.assertEqual(rollup.entries, 2)
+
+    def test_stop_timer_updates_rollup(self):
+        TimerFactory.create(task=self.task, owner=self.user, is_started=True)
+
+        self.client.post(reverse("tasks-stop", kwargs={"pk": self.task.id}))
+
+        self.assertEqual(self.get_rollup(month=self.month).entries, 1)
+
+    def test_update_timelog_moves_rollup(self):
+        timelog = TimeLogFactory.create(task=self.task, owner=self.user, duration=timedelta(minutes=30))
+        timelog.duration = timedelta(minutes=50)
+        timelog.save()
+        self.assertEqual(self.get_rollup(month=self.month).duration, timedelta(minutes=50))
+
+        timelog.started_at = timezone.now() - timedelta(days=62)
+        timelog.save()
+
+        self.assertFalse(MonthlyTimeRollup.objects.filter(month=self.month).exists())
+        self.assertEqual(self.get_rollup(month=timelog.started_at.date().replace(day=1)).entries, 1)
+
+    def test_delete_timelog_removes_rollup(self):
+        timelog = TimeLogFactory.create(task=self.task, owner=self.user)
+        TimeLogFactory.create(task=self.task, owner=self.user, duration=timedelta(minutes=10))
+
+        self.client.delete(reverse("timelog-detail", kwargs={"pk": timelog.id}))
+
+        rollup = self.get_rollup(month=self.month)
+        self.assertEqual((rollup.duration, rollup.entries), (timedelta(minutes=10), 1))
+
+    def test_rebuild_time_rollups(self):
+        TimeLogFactory.create_batch(3, task=self.task, owner=self.user, duration=timedelta(minutes=10))
+        TimeLogFactory.create(task=self.task, owner=self.user, started_at=timezone.now() - timedelta(days=62))
+        MonthlyTimeRollup.objects.update(duration=timedelta(), entries=100)
+
+        call_command("rebuild_time_rollups", stdout=StringIO())
+
+        rollup = self.get_rollup(month=self.month)
+        self.assertEqual((rollup.duration, rollup.entries), (timedelta(minutes=30), 3))
+        self.assertEqual(MonthlyTimeRollup.objects.count(), 2)
+
+    def test_full_time_by_month_reads_rollup(self):
+        TimeLogFactory.create_batch(2, task=self.task, owner=self.user, duration=timedelta(minutes=20))
+        TimeLogFactory.create(task=self.task, owner=self.user, started_at=timezone.now() - timedelta(days=62))
+
+        response = self.client.get(reverse("timelog-last-month-full-time"))
+
+        self.assertEqual(response.data, {"total": "00:40:00"})
+
+    def test_full_time_by_month_skips_time_logged_ahead(self):
+        now = timezone.now()
+        later_this_month = now + (next_month_start(start_month_date()) - now) / 2
+        TimeLogFactory.create(task=self.task, owner=self.user, duration=timedelta(minutes=20))
+        TimeLogFactory.create(task=self.task, owner=self.user, started_at=later_this_month, duration=timedelta(hours=2))
+
+        response = self.client.get(reverse("timelog-last-month-full-time"))
+
+        self.assertEqual(response.data, {"total": "00:20:00"})
+
+
+class TimelogBulkTestCase(APITestCase):
+    def setUp(self) -> None:
+        self.user = UserFactory.create()
+        self.client.force_authenticate(user=self.user)
+        self.task = TaskFactory.create(owner=self.user)
+        self.foreign_task = TaskFactory.create()
+        self.today = timezone.now().date()
+
+    def row(self, **kwargs):
+        return {"task": self.task.id, "date_field": self.today.isoformat(), "duration_minutes": 10, **kwargs}
+
+    def post(self, data, content_type="application/json"):
+        return self.client.generic("POST", reverse("timelog-bulk"), data, content_type=content_type)
+
+    def test_bulk_json_reports_invalid_rows(self):
+        rows = [self.row(), self.row(task=self.foreign_task.id), self.row(duration_minutes="x"), self.row()]
+
+        response = self.post(json.dumps(rows))
+
+        self.assertEqual(response.status_code, HTTP_201_CREATED)
+        self.assertEqual(response.data["created"], 2)
+        self.assertEqual([error["row"] for error in response.data["errors"]], [1, 2])
+        self.assertIn("task", response.data["errors"][0]["errors"])
+        self.assertEqual(TimeLog.objects.filter(task=self.task).count(), 2)
+        self.assertFalse(TimeLog.objects.filter(task=self.foreign_task).exists())
+
+    def test_bulk_reports_overflowing_duration(self):
+        rows = [self.row(), self.row(duration_minutes=2 * 10**12), self.row()]
+
+        response = self.post(json.dumps(rows))
+
+        self.assertEqual(response.status_code, HTTP_201_CREATED)
+        self.assertEqual(response.data["created"], 2)
+        self.assertEqual([error["row"] for error in response.data["errors"]], [1])
+        self.assertIn("duration_minutes", response.data["errors"][0]["errors"])
+
+    def test_bulk_ndjson(self):
+        body = "\n".join(json.dumps(self.row()) for _ in range(5))
+
+        response = self.post(body, content_type="application/x-ndjson")
+
+        self.assertEqual(response.status_code, HTTP_201_CREATED)
+        self.assertEqual(response.data, {"created": 5, "errors": []})
+
+    def test_bulk_ndjson_parse_error_rolls_back(self):
+        body = json.dumps(self.row()) + "\n{not json\n"
+
+        response = self.post(body, content_type="application/x-ndjson")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(TimeLog.objects.exists())
+
+    def test_bulk_csv(self):
+        body = f"task,date_field,duration_minutes\n{self.task.id},{self.today},15\n{self.task.id},{self.today},30\n"
+
+        response = self.post(body, content_type="text/csv")
+
+        self.assertEqual(response.status_code, HTTP_201_CREATED)
+        self.assertEqual(response.data["created"], 2)
+
+    def test_bulk_all_rows_invalid(self):
+        response = self.post(json.dumps([self.row(task=self.foreign_task.id)]))
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["created"], 0)
+
+    def test_bulk_rejects_object(self):
+        response = self.post(json.dumps(self.row()))
+
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(TIMELOG_BULK_BATCH_SIZE=10)
+    def test_bulk_updates_rollups(self):
+        other_task = TaskFactory.create(owner=self.user)
+        rows = [self.row() for _ in range(25)] + [self.row(task=other_task.id, duration_minutes=5)]
+
+        self.post(json.dumps(rows))
+
+        rollups = dict(MonthlyTimeRollup.objects.values_list("task_id", "duration"))
+        self.assertEqual(rollups, {self.task.id: timedelta(minutes=250), other_task.id: timedelta(minutes=5)})
+        self.assertEqual(MonthlyTimeRollup.objects.get(task=self.task).entries, 25)
+
+    def test_bulk_queries_do_not_scale(self):
+        def count_queries(size):
+            with CaptureQueriesContext(connection) as queries:
+                self.post(json.dumps([self.row() for _ in range(size)]))
+            return len(queries)
+
+        count_queries(1)  # creates the rollup row
+        self.assertEqual(count_queries(5), count_queries(500))
+
+
+class ExportTestCase(APITestCase):
+    def setUp(self) -> None:
+        self.user = UserFactory.create()
+        self.client.force_authenticate(user=self.user)
+        self.task = TaskFactory.create(owner=self.user)
+        TimeLogFactory.create_batch(5, task=self.task, owner=self.user)
+        TimeLogFactory.create_batch(3)
+
+    def export(self, url, data=None):
+        response = self.client.get(url, data)
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        return b"".join(response.streaming_content).decode()
+
+    def test_export_timelogs_csv(self):
+        content = self.export(reverse("timelog-export"), {"format": "csv", "task": self.task.id})
+
+        rows = list(csv.DictReader(StringIO(content)))
+        self.assertEqual(len(rows), 5)
+        self.assertEqual({row["task.id"] for row in rows}, {str(self.task.id)})
+        self.assertIn("owner.email", rows[0])
+
+    def test_export_timelogs_ndjson(self):
+        content = self.export(reverse("timelog-export"), {"format": "ndjson", "fields": "id,duration"})
+
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(len(rows), TimeLog.objects.count())
+        self.assertEqual(set(rows[0]), {"id", "duration"})
+
+    def test_export_tasks_honours_filters(self):
+        content = self.export(reverse("tasks-export"), {"format": "ndjson", "owner": self.user.id})
+
+        self.assertEqual([json.loads(line)["id"] for line in content.splitlines()], [self.task.id])
+
+    def test_export_sets_attachment(self):
+        response = self.client.get(reverse("timelog-export"), {"format": "csv"})
+
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        self.assertEqual(response["Content-Disposition"], 'attachment; filename="timelog.csv"')
+
+    @override_settings(EXPORT_CHUNK_SIZE=2)
+    def test_export_in_chunks(self):
+        with mock.patch.object(QuerySet, "iterator", autospec=True, side_effect=QuerySet.iterator) as iterator:
+            content = self.export(reverse("timelog-export"), {"format": "ndjson"})
+
+        self.assertEqual(len(content.splitlines()), TimeLog.objects.count())
+        self.assertEqual(iterator.call_args.kwargs, {"chunk_size": 2})
+
+
+class SeedTestCase(TransactionTestCase):
+    # Worker processes commit on their own connections, which a test transaction would not roll back.
+
+    def make_plan(self, **kwargs):
+        until = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        return SeedPlan(users=10, tasks_per_user=2, timelogs_per_task=5, comments_per_task=1.5, until=until, **kwargs)
+
+    def snapshot(self):
+        timelogs = TimeLog.objects.order_by("id").values_list("started_at", "duration")
+        titles = Task.objects.order_by("id").values_list("title", flat=True)
+        return list(timelogs), list(titles)
+
+    def test_seed_counts(self):
+        counts = seed(self.make_plan(), batch_size=7)
+
+        self.assertEqual(counts, {"users": 10, "tasks": 20, "timelogs": 100, "comments": 30})
+        self.assertEqual(TimeLog.objects.count(), 100)
+        self.assertEqual(Comment.objects.count(), 30)
+        self.assertEqual(sum(MonthlyTimeRollup.objects.values_list("entries", flat=True)), 100)
+        # Sequences continue after the copied ids.
+        last_id = Task.objects.order_by("-id").values_list("id", flat=True)[0]
+        self.assertGreater(TaskFactory.create().id, last_id)
+
+    def test_seed_is_deterministic(self):
+        seed(self.make_plan(seed=3), batch_size=7)
+        first = self.snapshot()
+        TimeLog.objects.all().delete()
+        Task.objects.all().delete()
+
+        seed(self.make_plan(seed=3), batch_size=7)
+
+        self.assertEqual(self.snapshot(), first)
+
+    def test_seed_with_workers(self):
+        seed(self.make_plan(seed=3), batch_size=7)
+        first = self.snapshot()
+        TimeLog.objects.all().delete()
+        Task.objects.all().delete()
+
+        counts = seed(self.make_plan(seed=3), batch_size=7, workers=2)
+
+        self.assertEqual(counts, {"users": 10, "tasks": 20, "timelogs": 100, "comments": 30})
+        # The forked workers produce the same rows as a single process.
+        self.assertEqual(self.snapshot(), first)
+        self.assertEqual(sum(MonthlyTimeRollup.objects.values_list("entries", flat=True)), 100)
+
+    def test_seed_command(self):
+        out = StringIO()
+        call_command("seed", 2, "--timelogs-per-task", 3, stdout=out)
+
+        self.assertIn("timelogs: 30/30 rows", out.getvalue())
+        self.assertEqual(TimeLog.objects.count(), 30)
+
+
+class BenchCommandTestCase(APITestCase):
+    # The command normally creates its own test database; here it runs in the one the test runner set up.
+    @mock.patch.multiple(
+        "apps.common.benchmark",
+        setup_test_environment=mock.DEFAULT,
+        teardown_test_environment=mock.DEFAULT,
+        setup_databases=mock.DEFAULT,
+        teardown_databases=mock.DEFAULT,
+    )
+    def test_bench_smoke(self, **mocks):
+        version = leaderboard_cache.version()
+        out = StringIO()
+        call_command(
+            "bench",
+            "--users=2",
+            "--tasks-per-user=1",
+            "--timelogs-per-task=1",
+            "--comments-per-task=1",
+            "--iterations=2",
+            "--warmup=0",
+            "--memory-iterations=1",
+            "--only=users-list",
+            stdout=out,
+            stderr=StringIO(),
+        )
+
+        report = json.loads(out.getvalue())
+        self.assertEqual(report["dataset"], {"users": 2, "tasks": 2, "timelogs": 2, "comments": 2})
+        [result] = report["results"]
+        self.assertEqual(result["name"], "users-list")
+        self.assertEqual(result["iterations"], 2)
+        self.assertEqual(result["status_codes"], {"200": 2})
+        # The benchmark bumped its own cache versions, not the live ones.
+        self.assertEqual(leaderboard_cache.version(), version)
+
+
+@override_settings(ROOT_URLCONF="config.urls_async")
+class AsyncReadTestCase(APITestCase):
+    def setUp(self) -> None:
+        self.user = UserFactory.create()
+        self.task = TaskFactory.create(owner=self.user)
+        TimeLogFactory.create_batch(3, task=self.task, owner=self.user, started_at=timezone.now())
+        self.async_client = AsyncClient()
+        self.headers = {"Authorization": f"Bearer {AccessToken.for_user(self.user)}"}
+        self.client.force_authenticate(user=self.user)
+
+    def assertSameAsSync(self, name, kwargs=None, data=None):
+        with self.settings(ROOT_URLCONF="config.urls"):
+            expected = self.client.get(reverse(name, kwargs=kwargs), data)
+        response = async_to_sync(self.async_client.get)(reverse(name, kwargs=kwargs), data, headers=self.headers)
+
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(response.json(), expected.json())
+        return response
+
+    def test_views_are_async(self):
+        for name in ("tasks-list", "timelog-list"):
+            self.assertTrue(iscoroutinefunction(resolve(reverse(name)).func))
+
+    def test_task_list(self):
+        TaskFactory.create_batch(15, owner=self.user)
+        self.assertSameAsSync("tasks-list", data={"page": 2})
+        self.assertSameAsSync("tasks-list", data={"owner": self.user.id, "pagination": "cursor"})
+
+    def test_task_retrieve(self):
+        self.assertSameAsSync("tasks-detail", kwargs={"pk": self.task.id})
+        self.assertSameAsSync("tasks-detail", kwargs={"pk": 0})
+
+    def test_timelog_list(self):
+        self.assertSameAsSync("timelog-list", data={"fields": "id,duration", "task": self.task.id})
+
+    def test_cached_aggregates(self):
+        leaderboard_cache.bump()
+        self.assertSameAsSync("tasks-top-month-duration")
+        self.assertSameAsSync("timelog-last-month-full-time")
+
+    @override_settings(ASGI_DATABASE_CONCURRENCY=2)
+    def test_concurrency_slots_are_released(self):
+        client = AsyncClient()
+
+        async def run():
+            requests = [client.get(reverse("tasks-list"), headers=self.headers) for _ in range(6)]
+            return await asyncio.wait_for(asyncio.gather(*requests), timeout=30)
+
+        self.assertEqual([response.status_code for response in async_to_sync(run)()], [200] * 6)
+
+    @override_settings(ASGI_DATABASE_CONCURRENCY=1)
+    def test_failed_stream_releases_its_slot(self):
+        # The test client always closes the response, so this goes through the ASGI handler a server would use.
+        handler = ASGIHandler()
+        for signal in (request_started, request_finished):
+            signal.disconnect(close_old_connections)
+            self.addCleanup(signal.connect, close_old_connections)
+
+        async def call(path, query_string=b""):
+            scope = {
+                "type": "http",
+                "method": "GET",
+                "path": path,
+                "query_string": query_string,
+                "headers": [(b"host", b"testserver"), (b"authorization", self.headers["Authorization"].encode())],
+            }
+            messages = []
+
+            async def receive():
+                return {"type": "http.request", "body": b"", "more_body": False}
+
+            async def send(message):
+                messages.append(message)
+
+            await handler(scope, receive, send)
+            return messages
+
+        def broken_chunks(view, queryset, chunk_size):
+            yield [{"id": 1}]
+            raise RuntimeError("export failed")
+
+        async def run():
+            with mock.patch.object(ExportMixin, "iter_export_chunks", broken_chunks):
+                with self.assertRaisesMessage(RuntimeError, "export failed"):
+                    await call(reverse("timelog-export"), b"format=ndjson")
+            # With the slot of the failed export leaked, this one would wait forever.
+            return await asyncio.wait_for(call(reverse("tasks-list")), timeout=10)
+
+        messages = async_to_sync(run)()
+        self.assertEqual(messages[0]["status"], 200)
+
+    @override_settings(EXPORT_CHUNK_SIZE=2)
+    def test_export_streams_asynchronously(self):
+        async def export():
+            response = await self.async_client.get(
+                reverse("timelog-export"), {"format": "ndjson"}, headers=self.headers
+            )
+            return response, [chunk async for chunk in response]
+
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            response, chunks = async_to_sync(export)()
+
+        self.assertEqual([str(w.message) for w in caught if "StreamingHttpResponse" in str(w.message)], [])
+        self.assertTrue(response.is_async)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson; charset=utf-8")
+        rows = [json.loads(line) for line in b"".join(chunks).decode().splitlines()]
+        self.assertEqual(len(rows), 3)
+        self.assertGreater(len(chunks), 1)
+
+    def test_requires_authentication(self):
+        response = async_to_sync(AsyncClient().get)(reverse("tasks-list"))
+
+        self.assertEqual(response.status_code, 401)
+
+    def test_sync_actions_still_work(self):
+        response = async_to_sync(self.async_client.post)(
+            reverse("tasks-list"), {"title": "Async"}, content_type="application/json", headers=self.headers
+        )
+
+        self.assertEqual(response.status_code, HTTP_201_CREATED)
+        self.assertTrue(Task.objects.filter(title="Async", owner=self.user).exists())
+
+
+class QueryPlanTestCase(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserFactory.create()
+        users = UserFactory.create_batch(5)
+        tasks = [TaskFactory.create(owner=owner) for owner in users for _ in range(10)]
+        for task in tasks:
+            CommentFactory.create_batch(3, task=task, owner=cls.user)
+            TimeLogFactory.create_batch(3, task=task, owner=cls.user)
+        cls.task = tasks[0]
+        TimerFactory.create(task=cls.task, owner=cls.user, is_started=True)
+
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def setUp(self) -> None:
+        self.client.force_authenticate(user=self.user)
+
+    def assertIndexScans(self, sql_statements):
+        with connection.cursor() as cursor:
+            # Tables are tiny here, so make the planner prove an index can serve each query.
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            for sql, params in sql_statements:
+                if not sql.startswith(("SELECT", "UPDATE", "DELETE")):
+                    continue
+                if sql.endswith(f"LIMIT {settings.CONDITIONAL_GET_MAX_ROWS + 1}) subquery"):
+                    # Conditional GET validators read a bounded number of rows in any order.
+                    continue
+                cursor.execute(f"EXPLAIN {sql}", params)
+                plan = "\n".join(row[0] for row in cursor.fetchall())
+                self.assertNotIn("Seq Scan", plan, msg=f"{sql}\n{plan}")
+
+    def assertRequestUsesIndexes(self, method, url, data=None):
+        with CaptureQueriesContext(connection) as context:
+            response = getattr(self.client, method)(url, data=data)
+
+        self.assertLess(response.status_code, 400)
+        self.assertIndexScans([(query["sql"], None) for query in context.captured_queries])
+
+    def test_task_queries(self):
+        self.assertRequestUsesIndexes("get", reverse("tasks-list"))
+        self.assertRequestUsesIndexes(
+            "get", reverse("tasks-list"), {"owner": self.task.owner_id, "status": Task.Status.COMPLETED}
+        )
+        self.assertRequestUsesIndexes("get", reverse("tasks-detail", kwargs={"pk": self.task.id}))
+
+    def test_top_month_duration_queries(self):
+        queryset = Task.objects.total_duration().select_related("owner").order_by("-total_duration")[:20]
+
+        self.assertIndexScans([queryset.query.sql_with_params()])
+
+    def test_timer_queries(self):
+        self.assertRequestUsesIndexes("post", reverse("tasks-stop", kwargs={"pk": self.task.id}))
+        self.assertRequestUsesIndexes("post", reverse("tasks-start", kwargs={"pk": self.task.id}))
+
+    def test_comment_queries(self):
+        self.assertRequestUsesIndexes("get", reverse("comments-list"), {"task": self.task.id})
+
+    def test_timelog_queries(self):
+        self.assertRequestUsesIndexes("get", reverse("timelog-list"))
+        self.assertRequestUsesIndexes("get", reverse("timelog-list"), {"task": self.task.id})
+        self.assertRequestUsesIndexes("get", reverse("timelog-last-month-full-time"))
+
+        first_page = self.client.get(reverse("timelog-list"), {"pagination": "cursor", "ordering": "-started_at"})
+        self.assertRequestUsesIndexes("get", first_page.data["next"])
+
+    def test_user_queries(self):
+        self.assertRequestUsesIndexes("get", reverse("users-list"))
+
+    def test_notification_queries(self):
+        queryset = Notification.objects.filter(
+            status=Notification.Status.PENDING, next_attempt_at__lte=timezone.now()
+        ).order_by("next_attempt_at", "id")[:100]
+
+        self.assertIndexScans([queryset.query.sql_with_params()])
+
+
+class KeysetPaginationTestCase(APITestCase):
+    def setUp(self) -> None:
+        self.user = UserFactory.create()
+        self.client.force_authenticate(user=self.user)
+        self.task = TaskFactory.create(owner=self.user)
+        started_at = timezone.now() - timedelta(days=3)
+        # Shared started_at values make the id tie-breaker matter.
+        self.timelogs = [
+            TimeLogFactory.create(task=self.task, owner=self.user, started_at=started_at - timedelta(hours=index % 4))
+            for index in range(30)
+        ]
+        TimeLogFactory.create_batch(5)
+
+    def walk(self, url, data):
+        ids, pages = [], 0
+        response = self.client.get(url, data=data)
+        while True:
+            self.assertEqual(response.status_code, HTTP_200_OK)
+            self.assertNotIn("count", response.data)
+            ids.extend(row["id"] for row in response.data["results"])
+            pages += 1
+            if not response.data["next"]:
+                return ids, pages
+            response = self.client.get(response.data["next"])
+
+    def test_timelogs_by_started_at(self):
+        ids, pages = self.walk(
+            reverse("timelog-list"), {"pagination": "cursor", "task": self.task.id, "ordering": "-started_at"}
+        )
+
+        expected = sorted(self.timelogs, key=lambda timelog: (timelog.started_at, timelog.id), reverse=True)
+        self.assertEqual(ids, [timelog.id for timelog in expected])
+        self.assertEqual(pages, 3)
+
+    def test_tasks_by_id(self):
+        TaskFactory.create_batch(15, owner=self.user)
+
+        ids, _ = self.walk(reverse("tasks-list"), {"pagination": "cursor", "owner": self.user.id})
+
+        self.assertEqual(ids, list(Task.objects.filter(owner=self.user).order_by("-id").values_list("id", flat=True)))
+
+    def test_mixed_direction_ordering(self):
+        ids, _ = self.walk(reverse("timelog-list"), {"pagination": "cursor", "ordering": "started_at,-id"})
+
+        self.assertEqual(ids, list(TimeLog.objects.order_by("started_at", "-id").values_list("id", flat=True)))
+
+    def test_previous_link(self):
+        first = self.client.get(reverse("comments-list"), {"pagination": "cursor"})
+        CommentFactory.create_batch(20, task=self.task, owner=self.user)
+        first = self.client.get(reverse("comments-list"), {"pagination": "cursor"})
+        second = self.client.get(first.data["next"])
+
+        previous = self.client.get(second.data["previous"])
+
+        self.assertEqual(previous.data["results"], first.data["results"])
+        self.assertIsNone(previous.data["previous"])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse("timelog-list"), {"cursor": "not-a-cursor"})
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_nullable_ordering_is_rejected(self):
+        response = self.client.get(reverse("timelog-list"), {"pagination": "cursor", "ordering": "duration"})
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_page_number_mode_keeps_count(self):
+        response = self.client.get(reverse("timelog-list"))
+
+        self.assertEqual(response.data["count"], 35)
+
+    @override_settings(PAGINATION_EXACT_COUNT_THRESHOLD=0)
+    def test_page_number_mode_estimates_count(self):
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE time_logs")
+
+        response = self.client.get(reverse("timelog-list"))
+
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        self.assertGreater(response.data["count"], 0)
+
+
+class ListQueryBudgetTestCase(QueryBudgetMixin, APITestCase):
+    def setUp(self) -> None:
+        self.user = UserFactory.create()
+        self.client.force_authenticate(user=self.user)
+        self.task = TaskFactory.create(owner=self.user)
+
+    # Budgets include the conditional GET validators query.
+    def test_task_list(self):
+        self.assertQueriesDoNotScale(reverse("tasks-list"), lambda size: TaskFactory.create_batch(size), budget=4)
+
+    def test_comment_list(self):
+        self.assertQueriesDoNotScale(
+            reverse("comments-list"), lambda size: CommentFactory.create_batch(size, task=self.task), budget=4
+        )
+
+    def test_timelog_list(self):
+        self.assertQueriesDoNotScale(reverse("timelog-list"), lambda size: TimeLogFactory.create_batch(size), budget=4)
+
+    def test_timelog_list_by_cursor(self):
+        self.assertQueriesDoNotScale(
+            reverse("timelog-list"),
+            lambda size: TimeLogFactory.create_batch(size),
+            data={"pagination": "cursor"},
+            budget=2,
+        )
+
+    def test_user_list(self):
+        self.assertQueriesDoNotScale(reverse("users-list"), lambda size: UserFactory.create_batch(size), budget=3)
+
+
+class SparseFieldsTestCase(APITestCase):
+    def setUp(self) -> None:
+        self.user = UserFactory.create()
+        self.client.force_authenticate(user=self.user)
+        self.task = TaskFactory.create(owner=self.user)
+        self.timelog = TimeLogFactory.create(task=self.task, owner=self.user)
+
+    def get_with_queries(self, url, data):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, data=data)
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        return response, context.captured_queries[-1]["sql"]
+
+    def test_fields(self):
+        response, sql = self.get_with_queries(reverse("timelog-list"), {"fields": "id,duration"})
+
+        self.assertEqual(set(response.data["results"][0]), {"id", "duration"})
+        self.assertNotIn("JOIN", sql)
+        self.assertNotIn('"time_logs"."started_at"', sql)
+
+    def test_expand_none(self):
+        response, sql = self.get_with_queries(reverse("timelog-list"), {"expand": ""})
+
+        row = response.data["results"][0]
+        self.assertEqual((row["task"], row["owner"]), (self.task.id, self.user.id))
+        self.assertNotIn("JOIN", sql)
+
+    def test_expand_one_relation(self):
+        response, sql = self.get_with_queries(reverse("timelog-list"), {"fields": "id,task,owner", "expand": "task"})
+
+        row = response.data["results"][0]
+        self.assertEqual(row["task"]["title"], self.task.title)
+        self.assertEqual(row["owner"], self.user.id)
+        self.assertIn('JOIN "tasks"', sql)
+        self.assertNotIn('JOIN "users"', sql)
+
+    def test_default_embeds_relations(self):
+        CommentFactory.create(task=self.task, owner=self.user)
+
+        response = self.client.get(reverse("comments-list"))
+
+        self.assertEqual(response.data["results"][0]["owner"]["email"], self.user.email)
+
+    def test_task_list_fields(self):
+        response, sql = self.get_with_queries(reverse("tasks-list"), {"fields": "id,title,owner", "expand": "owner"})
+
+        self.assertEqual(response.data["results"][0]["owner"]["email"], self.user.email)
+        self.assertNotIn('"tasks"."description"', sql)
+
+    def test_cursor_with_fields(self):
+        TimeLogFactory.create_batch(15, task=self.task, owner=self.user)
+        data = {"fields": "duration", "pagination": "cursor", "ordering": "-started_at"}
+        first_page = self.client.get(reverse("timelog-list"), data)
+
+        with self.assertNumQueries(2):
+            second_page = self.client.get(first_page.data["next"])
+
+        self.assertEqual(len(first_page.data["results"]) + len(second_page.data["results"]), 16)
+
+
+class LeaderboardCacheTestCase(APITestCase):
+    def setUp(self) -> None:
+        self.user = UserFactory.create()
+        self.client.force_authenticate(user=self.user)
+        self.task = TaskFactory.create(owner=self.user)
+        leaderboard_cache.bump()
+
+    def test_repeated_request_is_served_from_cache(self):
+        TimeLogFactory.create(task=self.task, owner=self.user)
+        self.assertEqual(self.client.get(reverse("tasks-top-month-duration"))["X-Cache"], "MISS")
+
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("tasks-top-month-duration"))
+
+        self.assertEqual(response["X-Cache"], "HIT")
+        self.assertEqual(response.data[0]["id"], self.task.id)
+
+    def test_timelog_write_invalidates_cache(self):
+        timelog = TimeLogFactory.create(task=self.task, owner=self.user, duration=timedelta(minutes=5))
+        self.client.get(reverse("tasks-top-month-duration"))
+        other_task = TaskFactory.create()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            TimeLogFactory.create(task=other_task, owner=self.user, duration=timedelta(minutes=50))
+        response = self.client.get(reverse("tasks-top-month-duration"))
+
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual([row["id"] for row in response.data], [other_task.id, self.task.id])
+
+        self.client.delete(reverse("timelog-detail", kwargs={"pk": timelog.id}))
+        response = self.client.get(reverse("tasks-top-month-duration"))
+        self.assertEqual([row["id"] for row in response.data], [other_task.id])
+
+    def test_query_params_are_part_of_the_key(self):
+        TimeLogFactory.create(task=self.task, owner=self.user)
+        self.client.get(reverse("tasks-top-month-duration"))
+
+        response = self.client.get(reverse("tasks-top-month-duration"), {"fields": "id"})
+
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.data, [{"id": self.task.id}])
+
+    def test_month_total_is_invalidated_per_owner(self):
+        other = UserFactory.create()
+        url = reverse("timelog-last-month-full-time")
+        self.client.get(url)
+        self.client.force_authenticate(user=other)
+        self.client.get(url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            TimeLogFactory.create(task=self.task, owner=self.user)
+
+        self.assertEqual(self.client.get(url)["X-Cache"], "HIT")
+        self.client.force_authenticate(user=self.user)
+        self.assertEqual(self.client.get(url)["X-Cache"], "MISS")
+
+    def test_bump_on_commit_once_per_transaction(self):
+        scope = UserFactory.create().id
+        version = month_total_cache.versions(scope)[1]
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            for _ in range(3):
+                month_total_cache.bump_on_commit(scope)
+            self.assertEqual(month_total_cache.versions(scope)[1], version + 1)
+            # Read since the last bump: a reader in this transaction must see the next write.
+            month_total_cache.bump_on_commit(scope)
+            self.assertEqual(month_total_cache.versions(scope)[1], version + 2)
+
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(month_total_cache.versions(scope)[1], version + 3)
+
+    def test_key_ignores_unrelated_and_reordered_params(self):
+        TimeLogFactory.create(task=self.task, owner=self.user)
+        url = reverse("tasks-top-month-duration")
+        self.assertEqual(self.client.get(url)["X-Cache"], "MISS")
+        self.assertEqual(self.client.get(url, {"junk": "1", "page": "7"})["X-Cache"], "HIT")
+
+        self.assertEqual(self.client.get(url, {"fields": "title,id", "expand": "owner"})["X-Cache"], "MISS")
+        response = self.client.get(url, {"expand": "owner", "fields": "id, title,,", "x": "y"})
+        self.assertEqual(response["X-Cache"], "HIT")
+        self.assertEqual(set(response.data[0]), {"id", "title"})
+
+    def test_cache_stats(self):
+        admin = UserFactory.create(is_staff=True)
+        stats = leaderboard_cache.stats()
+        self.client.get(reverse("tasks-top-month-duration"))
+        self.client.get(reverse("tasks-top-month-duration"))
+        self.client.force_authenticate(user=admin)
+
+        response = self.client.get(reverse("cache_stats_view"))
+
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        self.assertEqual(response.data["top_month_duration"]["hit"], stats["hit"] + 1)
+        self.assertEqual(response.data["top_month_duration"]["miss"], stats["miss"] + 1)
+
+
+class ConditionalGetTestCase(APITestCase):
+    def setUp(self) -> None:
+        self.user = UserFactory.create()
+        self.task = TaskFactory.create(owner=self.user)
+        self.comment = CommentFactory.create(task=self.task, owner=self.user)
+        self.client.force_authenticate(user=self.user)
+
+    def assertNotModified(self, url, **headers):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, headers=headers)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+        self.assertEqual(len(queries), 1)
+        return response
+
+    def test_list_validators(self):
+        url = reverse("tasks-list")
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        self.assertTrue(response["ETag"].startswith('W/"'))
+
+        not_modified = self.assertNotModified(url, if_none_match=response["ETag"])
+        self.assertEqual(not_modified["ETag"], response["ETag"])
+
+        # A deletion does not move the newest updated_at, so lists have no Last-Modified to go by.
+        self.assertNotIn("Last-Modified", response)
+        TaskFactory.create(owner=self.user).delete()
+        response = self.client.get(url, headers={"if_modified_since": http_date(time.time() + 60)})
+        self.assertEqual(response.status_code, HTTP_200_OK)
+
+    def test_list_etag_changes(self):
+        url = reverse("comments-list")
+        etags = {self.client.get(url)["ETag"]}
+
+        other = CommentFactory.create(task=self.task, owner=self.user)
+        etags.add(self.client.get(url)["ETag"])
+        self.task.title = "Renamed"
+        self.task.save()
+        etags.add(self.client.get(url)["ETag"])
+        other.delete()
+        response = self.client.get(url, headers={"if_none_match": ", ".join(etags)})
+        etags.add(response["ETag"])
+
+        self.assertEqual(len(etags), 4)
+        self.assertEqual(response.status_code, HTTP_200_OK)
+
+    def test_owner_change_invalidates_lists(self):
+        TimeLogFactory.create(task=self.task, owner=self.user)
+        for name in ("tasks-list", "comments-list", "timelog-list"):
+            url = reverse(name)
+            etag = self.client.get(url, {"owner": self.user.id})["ETag"]
+            self.user.first_name = f"Renamed {name}"
+            self.user.save()
+
+            response = self.client.get(url, {"owner": self.user.id}, headers={"if_none_match": etag})
+
+            self.assertEqual(response.status_code, HTTP_200_OK)
+            self.assertNotEqual(response["ETag"], etag)
+
+    def test_filtered_list(self):
+        other = TaskFactory.create(owner=self.user)
+        url = reverse("comments-list")
+        etag = self.client.get(url, {"task": self.task.id})["ETag"]
+
+        CommentFactory.create(task=other, owner=self.user)
+        response = self.client.get(url, {"task": self.task.id}, headers={"if_none_match": etag})
+        self.assertEqual(response.status_code, 304)
+
+    @override_settings(CONDITIONAL_GET_MAX_ROWS=1)
+    def test_large_list_has_no_validators(self):
+        TaskFactory.create(owner=self.user)
+        response = self.client.get(reverse("tasks-list"))
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        self.assertNotIn("ETag", response)
+        self.assertNotIn("Last-Modified", response)
+
+    def test_retrieve_validators(self):
+        url = reverse("tasks-detail", kwargs={"pk": self.task.id})
+        response = self.client.get(url)
+        etag = response["ETag"]
+        self.assertNotModified(url, if_none_match=etag)
+        self.assertNotModified(url, if_modified_since=response["Last-Modified"])
+
+        self.task.status = "done"
+        self.task.save()
+        response = self.client.get(url, headers={"if_none_match": etag})
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+
+        for pk in (0, "abc"):
+            response = self.client.get(reverse("tasks-detail", kwargs={"pk": pk}), headers={"if_none_match": "*"})
+            self.assertEqual(response.status_code, 404)
+            self.assertNotIn("ETag", response)
+
+    @override_settings(ROOT_URLCONF="config.urls_async")
+    def test_async_views(self):
+        client = AsyncClient()
+        headers = {"Authorization": f"Bearer {AccessToken.for_user(self.user)}"}
+        urls = [reverse("tasks-list"), reverse("timelog-list"), reverse("tasks-detail", kwargs={"pk": self.task.id})]
+        for url in urls:
+            self.assertTrue(iscoroutinefunction(resolve(url).func))
+            response = async_to_sync(client.get)(url, headers=headers)
+            self.assertEqual(response.status_code, HTTP_200_OK)
+            response = async_to_sync(client.get)(url, headers={**headers, "If-None-Match": response["ETag"]})
+            self.assertEqual(response.status_code, 304)
+
+
+class TimeReportTestCase(APITestCase):
+    def setUp(self) -> None:
+        self.user = UserFactory.create()
+        self.other = UserFactory.create()
+        self.task = TaskFactory.create(owner=self.user, status=Task.Status.IN_PROGRESS)
+        self.completed = TaskFactory.create(owner=self.other, status=Task.Status.COMPLETED)
+        self.client.force_authenticate(user=self.user)
+
+    def log(self, task, owner, started_at, minutes):
+        return TimeLogFactory.create(task=task, owner=owner, started_at=started_at, duration=timedelta(minutes=minutes))
+
+    def get_report(self, **params):
+        return self.client.get(reverse("timelog-report"), params)
+
+    def test_gap_filled_days(self):
+        self.log(self.task, self.user, datetime(2024, 3, 1, 9, tzinfo=utc), 30)
+        self.log(self.task, self.user, datetime(2024, 3, 1, 15, tzinfo=utc), 15)
+        self.log(self.completed, self.other, datetime(2024, 3, 3, 9, tzinfo=utc), 60)
+        self.log(self.task, self.user, datetime(2024, 3, 4, 9, tzinfo=utc), 60)
+
+        with self.assertNumQueries(1):
+            response = self.get_report(start="2024-03-01", end="2024-03-03", bucket="day", group_by="task")
+
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        self.assertEqual(response.data["buckets"], ["2024-03-01", "2024-03-02", "2024-03-03"])
+        completed, task = response.data["series"]
+        self.assertEqual((completed["key"], completed["total_seconds"]), (self.completed.id, 3600))
+        self.assertEqual(task["label"], self.task.title)
+        self.assertEqual([point["seconds"] for point in task["points"]], [2700, 0, 0])
+        self.assertEqual([point["entries"] for point in task["points"]], [2, 0, 0])
+
+    def test_weeks_and_months(self):
+        self.log(self.task, self.user, datetime(2024, 1, 31, 9, tzinfo=utc), 30)
+        self.log(self.task, self.user, datetime(2024, 2, 1, 9, tzinfo=utc), 30)
+
+        response = self.get_report(start="2024-01-30", end="2024-02-06", bucket="week", group_by="owner")
+        self.assertEqual(response.data["buckets"], ["2024-01-29", "2024-02-05"])
+        self.assertEqual(response.data["series"][0]["label"], self.user.email)
+        self.assertEqual([point["seconds"] for point in response.data["series"][0]["points"]], [3600, 0])
+
+        response = self.get_report(start="2024-01-15", end="2024-03-01", bucket="month", group_by="status")
+        self.assertEqual(response.data["buckets"], ["2024-01-01", "2024-02-01", "2024-03-01"])
+        self.assertEqual(response.data["series"][0]["key"], Task.Status.IN_PROGRESS)
+        self.assertEqual([point["seconds"] for point in response.data["series"][0]["points"]], [1800, 1800, 0])
+
+    def test_time_zone(self):
+        # 23:30 UTC on March 1st is already March 2nd in Chisinau.
+        self.log(self.task, self.user, datetime(2024, 3, 1, 23, 30, tzinfo=utc), 30)
+
+        response = self.get_report(start="2024-03-01", end="2024-03-02", bucket="day")
+        self.assertEqual(response.data["time_zone"], "UTC")
+        self.assertEqual([point["seconds"] for point in response.data["series"][0]["points"]], [1800, 0])
+
+        response = self.get_report(start="2024-03-01", end="2024-03-02", bucket="day", tz="Europe/Chisinau")
+        self.assertEqual([point["seconds"] for point in response.data["series"][0]["points"]], [0, 1800])
+
+        response = self.get_report(start="2024-03-02", end="2024-03-02", tz="Europe/Chisinau", task=self.completed.id)
+        self.assertEqual(response.data["series"], [])
+
+    @override_settings(TIME_REPORT_MAX_BUCKETS=31)
+    def test_invalid_parameters(self):
+        for params in (
+            {"start": "2024-03-02", "end": "2024-03-01"},
+            {"start": "2024-01-01", "end": "2024-12-31"},
+            {"start": "2024-01-01", "end": "2024-01-02", "bucket": "year"},
+            {"start": "2024-01-01", "end": "2024-01-02", "tz": "Mars/Olympus"},
+            {"end": "2024-01-02"},
+        ):
+            self.assertEqual(self.get_report(**params).status_code, 400, params)
+
+        response = self.get_report(start="2024-01-01", end="2024-12-31", bucket="month")
+        self.assertEqual(len(response.data["buckets"]), 12)
+
+
+class TaskCounterTestCase(APITestCase):
+    def setUp(self) -> None:
+        self.user = UserFactory.create()
+        self.client.force_authenticate(user=self.user)
+        self.task = TaskFactory.create(owner=self.user)
+        self.other = TaskFactory.create(owner=self.user)
+
+    def assertCounters(self, task, duration, timelogs, comments):
+        task.refresh_from_db()
+        self.assertEqual(
+            (task.tracked_duration, task.timelog_count, task.comment_count),
+            (timedelta(minutes=duration), timelogs, comments),
+        )
+
+    def test_timelog_counters(self):
+        timelog = TimeLogFactory.create(task=self.task, owner=self.user, duration=timedelta(minutes=30))
+        TimeLogFactory.create(task=self.task, owner=self.user, duration=timedelta(minutes=15))
+        self.assertCounters(self.task, 45, 2, 0)
+        self.assertEqual(self.task.last_activity_at, TimeLog.objects.latest("id").updated_at)
+
+        timelog.duration = timedelta(minutes=40)
+        timelog.save()
+        self.assertCounters(self.task, 55, 2, 0)
+
+        timelog.task = self.other
+        timelog.save()
+        self.assertCounters(self.task, 15, 1, 0)
+        self.assertCounters(self.other, 40, 1, 0)
+
+        timelog.delete()
+        self.assertCounters(self.other, 0, 0, 0)
+        self.assertIsNotNone(self.other.last_activity_at)
+
+    def test_comment_counters(self):
+        comment = CommentFactory.create(task=self.task, owner=self.user)
+        CommentFactory.create(task=self.task, owner=self.user)
+        self.assertCounters(self.task, 0, 0, 2)
+
+        comment.task = self.other
+        comment.save()
+        self.assertCounters(self.task, 0, 0, 1)
+        self.assertCounters(self.other, 0, 0, 1)
+
+        comment.delete()
+        self.assertCounters(self.other, 0, 0, 0)
+
+        self.task.delete()
+        self.assertFalse(Comment.objects.exists())
+
+    def test_deleting_a_user_who_is_not_the_owner(self):
+        other = UserFactory.create()
+        TimeLogFactory.create(task=self.task, owner=other, duration=timedelta(minutes=30))
+        TimeLogFactory.create(task=self.task, owner=self.user, duration=timedelta(minutes=15))
+        CommentFactory.create(task=self.task, owner=other)
+        own_task = TaskFactory.create(owner=other)
+        CommentFactory.create(task=own_task, owner=other)
+        self.assertCounters(self.task, 45, 2, 1)
+
+        other.delete()
+        self.assertCounters(self.task, 15, 1, 0)
+        self.assertFalse(Task.objects.filter(pk=own_task.pk).exists())
+        self.assertEqual(list(find_counter_drift(self.task.id, self.other.id)), [])
+
+        User.objects.filter(pk=self.user.pk).delete()
+        self.assertFalse(Task.objects.exists())
+
+    def test_deleting_a_task_does_not_scale(self):
+        def delete_task(rows):
+            task = TaskFactory.create(owner=self.user)
+            TimeLogFactory.create_batch(rows, task=task, owner=self.user)
+            CommentFactory.create_batch(rows, task=task, owner=self.user)
+            with CaptureQueriesContext(connection) as queries:
+                task.delete()
+            self.assertFalse(MonthlyTimeRollup.objects.filter(task_id=task.id).exists())
+            return len(queries)
+
+        self.assertEqual(delete_task(10), delete_task(50))
+
+    def test_saving_a_task_keeps_counters(self):
+        stale = Task.objects.get(pk=self.task.pk)
+        CommentFactory.create(task=self.task, owner=self.user)
+
+        stale.title = "Renamed"
+        stale.save()
+        self.assertCounters(self.task, 0, 0, 1)
+        self.assertEqual(self.task.title, "Renamed")
+
+        response = self.client.patch(reverse("tasks-detail", kwargs={"pk": self.task.id}), {"comment_count": 50})
+        self.assertEqual(response.data["comment_count"], 1)
+
+    def test_bulk_ingest(self):
+        rows = [{"task": self.task.id, "date_field": "2024-03-01", "duration_minutes": 10}] * 3
+        response = self.client.post(reverse("timelog-bulk"), rows, format="json")
+
+        self.assertEqual(response.status_code, HTTP_201_CREATED)
+        self.assertCounters(self.task, 30, 3, 0)
+
+    def test_filter_and_order(self):
+        CommentFactory.create_batch(2, task=self.other, owner=self.user)
+        TimeLogFactory.create(task=self.task, owner=self.user, duration=timedelta(hours=1))
+
+        response = self.client.get(reverse("tasks-list"), {"ordering": "-comment_count"})
+        self.assertEqual([task["id"] for task in response.data["results"]], [self.other.id, self.task.id])
+        self.assertEqual(response.data["results"][0]["comment_count"], 2)
+
+        response = self.client.get(reverse("tasks-list"), {"tracked_duration__gte": "00:30:00"})
+        self.assertEqual([task["id"] for task in response.data["results"]], [self.task.id])
+
+        response = self.client.get(reverse("tasks-list"), {"ordering": "-tracked_duration", "pagination": "cursor"})
+        self.assertEqual(response.data["results"][0]["id"], self.task.id)
+
+    def test_check_command(self):
+        TimeLogFactory.create(task=self.task, owner=self.user, duration=timedelta(minutes=30))
+        call_command("check_task_counters", stdout=StringIO())
+
+        Task.objects.filter(pk=self.task.pk).update(timelog_count=5, tracked_duration=timedelta())
+        out = StringIO()
+        with self.assertRaises(CommandError):
+            call_command("check_task_counters", stdout=out)
+        self.assertIn(f"Task {self.task.id}: timelog_count is 5, expected 1.", out.getvalue())
+
+        call_command("check_task_counters", "--fix", "--batch-size", 1, stdout=StringIO())
+        self.assertCounters(self.task, 30, 1, 0)
+        call_command("check_task_counters", stdout=StringIO())
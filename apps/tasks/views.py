@@ -1,20 +1,42 @@
+from types import GeneratorType
+
+from django.db import transaction
 from django.shortcuts import get_object_or_404
-from django.utils.decorators import method_decorator
-from django.views.decorators.cache import cache_page
 
+from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.decorators import action
 from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.status import HTTP_201_CREATED
+from rest_framework.status import HTTP_400_BAD_REQUEST
 from rest_framework.viewsets import ModelViewSet
 
+from apps.common.mixins import ConditionalGetMixin
+from apps.common.mixins import ExportMixin
+from apps.common.mixins import SerializerRelationsMixin
+from apps.common.pagination import KeysetOrPageNumberPagination
+from apps.common.pagination import PageNumberPagination
+from apps.common.parsers import CSVParser
+from apps.common.parsers import NDJSONParser
+from apps.common.parsers import ORJSONParser
+from apps.tasks.cache import leaderboard_cache
+from apps.tasks.cache import month_total_cache
+from apps.tasks.helpers import start_month_date
+from apps.tasks.ingest import ingest_timelogs
 from apps.tasks.models import Task
 from apps.tasks.models import Comment
 from apps.tasks.models import TimeLog
 from apps.tasks.models import Timer
+from apps.tasks.reports import time_report
+from apps.tasks.search import attach_matching_comments
+from apps.tasks.search import load_ranked_tasks
+from apps.tasks.search import search_tasks
 from apps.tasks.serializers import (
     TaskSerializer,
     TaskListSerializer,
+    TaskSearchSerializer,
     CommentSerializer,
     CommentListSerializer,
     TimelogSerializer,
@@ -22,30 +44,41 @@ from apps.tasks.serializers import (
     TimelogListSerializer,
     TimerSerializer,
     TimelogByMonthSerializer,
+    TimelogReportQuerySerializer,
+    TimelogReportSerializer,
 )
 
-from config.settings import CACHE_TTL
-
 
-class TaskViewSet(ModelViewSet):
+class TaskViewSet(ConditionalGetMixin, ExportMixin, SerializerRelationsMixin, ModelViewSet):
     queryset = Task.objects.all()
+    # Listed tasks nest their owner.
+    last_modified_fields = ("updated_at", "owner__updated_at")
+    pagination_class = KeysetOrPageNumberPagination
     permission_classes = (IsAuthenticated,)
-    filterset_fields = ["owner", "status"]
-    search_fields = ["title"]
+    filterset_fields = {
+        "owner": ["exact"],
+        "status": ["exact"],
+        "tracked_duration": ["gte", "lte"],
+        "timelog_count": ["gte", "lte"],
+        "comment_count": ["gte", "lte"],
+        "last_activity_at": ["gte", "lte", "isnull"],
+    }
+    full_text_search = True
     ordering = ["-id"]
 
     def get_queryset(self):
-        queryset = super().get_queryset()
         match self.action:
             case "top_month_duration":
-                return Task.objects.total_duration().select_related("owner")
+                return self.select_serializer_relations(Task.objects.total_duration())
             case _:
-                return queryset.select_related("owner")
+                return super().get_queryset()
 
     def get_serializer_class(self):
         match self.action:
-            case "list" | "top_month_duration":
+            case "list" | "export" | "top_month_duration":
                 return TaskListSerializer
+            case "search":
+                return TaskSearchSerializer
             case _:
                 return TaskSerializer
 
@@ -54,33 +87,60 @@ class TaskViewSet(ModelViewSet):
 
     @action(methods=["POST"], detail=True)
     def start(self, request, pk=None, *args, **kwargs):
-        instance, _ = Timer.objects.get_or_create(owner=self.request.user, task_id=pk)
-        instance.start()
+        # The unique (owner, task) constraint makes get_or_create safe against double submits.
+        instance, created = Timer.objects.select_related("owner", "task").get_or_create(
+            owner=self.request.user, task_id=pk, defaults={"is_started": True}
+        )
+        if not created:
+            instance.start()
         return Response(TimerSerializer(instance).data)
 
     @action(methods=["POST"], detail=True)
+    @transaction.atomic
     def stop(self, request, pk=None, *args, **kwargs):
-        instance = get_object_or_404(Timer.objects.all(), owner=self.request.user, task_id=pk)
+        instance = get_object_or_404(Timer.objects.select_for_update(), owner=self.request.user, task_id=pk)
         if instance.is_started:
             instance.stop()
         else:
             raise ValidationError({"detail": f"Task id:{instance.id} has no ongoing timer."})
         return Response(TimelogSerializer(instance).data)
 
-    @method_decorator(cache_page(CACHE_TTL))
+    @action(methods=["GET"], detail=False, filter_backends=[DjangoFilterBackend], pagination_class=PageNumberPagination)
+    def search(self, request, *args, **kwargs):
+        # Tasks matching ?search= by title, description or comment text, best ranked first, each with its
+        # best matching comments.
+        terms = request.query_params.get(api_settings.SEARCH_PARAM, "").strip()
+        if not terms:
+            raise ValidationError({api_settings.SEARCH_PARAM: "This query parameter is required."})
+
+        ranked = search_tasks(self.filter_queryset(self.get_queryset()), terms)
+        page = load_ranked_tasks(self.get_queryset(), self.paginate_queryset(ranked))
+        attach_matching_comments(page, terms)
+        return self.get_paginated_response(self.get_serializer(page, many=True).data)
+
     @action(methods=["GET"], detail=False)
-    def top_month_duration(self, response, *args, **kwargs):
-        tasks = self.get_queryset().order_by("-total_duration")[:20]
+    def top_month_duration(self, request, *args, **kwargs):
+        data, status = self.get_top_month_duration(request)
+        return Response(data, headers={"X-Cache": status.upper()})
 
-        serializer = self.get_serializer(tasks, many=True)
-        return Response(serializer.data)
+    def get_top_month_duration(self, request):
+        def compute():
+            tasks = self.get_queryset().order_by("-total_duration")[:20]
+            return self.get_serializer(tasks, many=True).data
+
+        month = start_month_date().date().isoformat()
+        # No filters apply here, only ?fields= and ?expand=: the key is the shape of the rows they select.
+        return leaderboard_cache.get_or_set((month, self.get_serializer().get_shape()), compute)
 
 
-class CommentViewSet(ModelViewSet):
-    queryset = Comment.objects.select_related("owner").all()
+class CommentViewSet(ConditionalGetMixin, SerializerRelationsMixin, ModelViewSet):
+    queryset = Comment.objects.all()
+    # Listed comments and time logs nest their task and owner.
+    last_modified_fields = ("updated_at", "task__updated_at", "owner__updated_at")
+    pagination_class = KeysetOrPageNumberPagination
     permission_classes = (IsAuthenticated,)
     filterset_fields = ["task"]
-    search_fields = ["text"]
+    full_text_search = True
     ordering = ["-id"]
 
     def get_serializer_class(self):
@@ -91,28 +151,68 @@ class CommentViewSet(ModelViewSet):
                 return CommentSerializer
 
 
-class TimelogViewSet(ModelViewSet):
+class TimelogViewSet(ConditionalGetMixin, ExportMixin, SerializerRelationsMixin, ModelViewSet):
     queryset = TimeLog.objects.all()
+    last_modified_fields = ("updated_at", "task__updated_at", "owner__updated_at")
+    pagination_class = KeysetOrPageNumberPagination
     permission_classes = (IsAuthenticated,)
     filterset_fields = ["task"]
     ordering = ["-id"]
 
     def get_serializer_class(self):
         match self.action:
-            case "list":
+            case "list" | "export":
                 return TimelogListSerializer
-            case "create":
+            case "create" | "bulk":
                 return TimelogCreateSerializer
             case "last_month_full_time":
                 return TimelogByMonthSerializer
+            case "report":
+                return TimelogReportSerializer
             case _:
                 return TimelogSerializer
 
+    @action(methods=["POST"], detail=False, parser_classes=[ORJSONParser, NDJSONParser, CSVParser])
+    def bulk(self, request, *args, **kwargs):
+        # Accepts a JSON array, NDJSON or CSV of rows shaped like the create payload.
+        if not isinstance(request.data, (list, GeneratorType)):
+            raise ValidationError({"detail": "Expected a list of rows."})
+
+        created, errors = ingest_timelogs(owner=request.user, rows=request.data)
+        status = HTTP_400_BAD_REQUEST if errors and not created else HTTP_201_CREATED
+        return Response({"created": created, "errors": errors}, status=status)
+
+    @action(methods=["GET"], detail=False, filter_backends=[DjangoFilterBackend], pagination_class=None)
+    def report(self, request, *args, **kwargs):
+        # ?start=&end=&bucket=day|week|month&group_by=owner|task|status&tz=, optionally narrowed by ?task=.
+        query = TimelogReportQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+
+        report = time_report(
+            self.filter_queryset(self.get_queryset()),
+            start=params["start"],
+            end=params["end"],
+            bucket=params["bucket"],
+            group_by=params["group_by"],
+            tzinfo=params["tz"],
+        )
+        serializer = self.get_serializer({**params, **report, "time_zone": str(params["tz"])})
+        return Response(serializer.data)
+
     @action(methods=["GET"], detail=False)
     def last_month_full_time(self, request, *args, **kwargs):
-        owner = self.request.user
+        data, status = self.get_last_month_full_time(request)
+        return Response(data, headers={"X-Cache": status.upper()})
 
-        instance_duration = TimeLog.objects.last_month(owner=owner)
-        serializer = self.get_serializer(data=instance_duration)
-        serializer.is_valid(raise_exception=True)
-        return Response(serializer.data)
+    def get_last_month_full_time(self, request):
+        owner = request.user
+
+        def compute():
+            instance_duration = TimeLog.objects.last_month(owner=owner)
+            serializer = self.get_serializer(data=instance_duration)
+            serializer.is_valid(raise_exception=True)
+            return serializer.data
+
+        month = start_month_date().date().isoformat()
+        return month_total_cache.get_or_set((month,), compute, scope=owner.id)
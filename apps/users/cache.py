@@ -0,0 +1,10 @@
+from django.conf import settings
+
+from apps.common.cache import TieredCache
+
+user_cache = TieredCache(
+    "auth_user",
+    timeout=settings.AUTH_USER_CACHE_TTL,
+    local_timeout=settings.AUTH_USER_LOCAL_CACHE_TTL,
+    local_size=settings.AUTH_USER_LOCAL_CACHE_SIZE,
+)
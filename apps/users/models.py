@@ -5,6 +5,8 @@ from django.db import models
 class User(AbstractUser):
     username = None
     email = models.EmailField(unique=True)
+    # Users are embedded in task, comment and time log lists, whose ETags include this.
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         db_table = "users"
@@ -0,0 +1,21 @@
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_migrate
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from apps.users.cache import user_cache
+from apps.users.models import User
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    # QuerySet.update() sends no signals; call user_cache.invalidate_on_commit() after bulk updates of users.
+    user_cache.invalidate_on_commit(instance.pk)
+
+
+@receiver(post_migrate)
+def clear_user_cache(sender, **kwargs):
+    # Migrating or flushing may reuse ids of users cached from a previous database.
+    if sender.name == "apps.users":
+        user_cache.clear()
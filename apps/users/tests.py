@@ -1,10 +1,15 @@
 from django.contrib.auth.hashers import make_password
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 from faker import Faker
 from rest_framework.reverse import reverse
 from rest_framework.status import HTTP_200_OK
+from rest_framework.status import HTTP_401_UNAUTHORIZED
 from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
 
+from apps.users.cache import user_cache
 from apps.users.models import User
 
 faker = Faker()
@@ -41,3 +46,57 @@ class UserTestCase(APITestCase):
         self.assertEqual(response.status_code, HTTP_200_OK)
         self.assertEqual(response.data.get("count"), User.objects.count())
         self.assertContains(response, f"{user.first_name} {user.last_name}")
+
+
+class CachedAuthenticationTestCase(APITestCase):
+    def setUp(self) -> None:
+        self.user = User.objects.create(email=faker.email(), password=make_password("StrongPassword"))
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}")
+
+    def user_lookups(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("users-list"))
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        return len([query for query in queries if 'WHERE "users"."id" =' in query["sql"]])
+
+    def test_user_is_cached(self):
+        self.assertEqual(self.user_lookups(), 1)
+        self.assertEqual(self.user_lookups(), 0)
+
+        # Another process, without the local copy, is served from the shared cache.
+        user_cache.local.clear()
+        self.assertEqual(self.user_lookups(), 0)
+
+    def test_cached_user_is_a_copy(self):
+        self.user_lookups()
+        first = user_cache.get(self.user.pk, lambda: None)
+        first.first_name = "Changed"
+        self.assertNotEqual(user_cache.get(self.user.pk, lambda: None).first_name, "Changed")
+
+    def test_changes_invalidate_the_cached_user(self):
+        self.assertEqual(self.user_lookups(), 1)
+
+        self.user.first_name = "Renamed"
+        self.user.save()
+        self.assertEqual(self.user_lookups(), 1)
+
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(reverse("users-list")).status_code, HTTP_401_UNAUTHORIZED)
+
+    def test_deleted_user_is_rejected(self):
+        self.user_lookups()
+        self.user.delete()
+        self.assertEqual(self.client.get(reverse("users-list")).status_code, HTTP_401_UNAUTHORIZED)
+
+    def test_stale_fill_cannot_outlive_an_invalidation(self):
+        stale = User.objects.get(pk=self.user.pk)
+
+        def fill_after_write():
+            User.objects.filter(pk=self.user.pk).update(is_active=False)
+            user_cache.invalidate(self.user.pk)
+            return stale
+
+        user_cache.get(self.user.pk, fill_after_write)
+        user_cache.local.clear()
+        self.assertEqual(self.client.get(reverse("users-list")).status_code, HTTP_401_UNAUTHORIZED)
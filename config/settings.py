@@ -1,5 +1,6 @@
 import os
 from environs import Env
+from marshmallow.validate import OneOf
 from datetime import timedelta
 from pathlib import Path
 
@@ -36,6 +37,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "apps.common.middleware.MetricsMiddleware",
+    "apps.common.middleware.DatabaseConcurrencyMiddleware",
     # Default Django middleware
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -48,7 +51,8 @@ MIDDLEWARE = [
     "corsheaders.middleware.CorsMiddleware",
 ]
 
-ROOT_URLCONF = "config.urls"
+# config.asgi switches to config.urls_async, which serves the hot read endpoints with async views
+ROOT_URLCONF = env.str("ROOT_URLCONF", default="config.urls")
 
 TEMPLATES = [
     {
@@ -68,6 +72,8 @@ TEMPLATES = [
 
 WSGI_APPLICATION = "config.wsgi.application"
 
+TEST_RUNNER = "apps.common.testing.TestRunner"
+
 CORS_ORIGIN_ALLOW_ALL = True
 CORS_ALLOW_HEADERS = (
     "accept",
@@ -85,18 +91,26 @@ CORS_ALLOW_HEADERS = (
 
 REST_FRAMEWORK = {
     "DATETIME_FORMAT": "%Y-%m-%dT%H:%M:%SZ",
-    "DEFAULT_AUTHENTICATION_CLASSES": ("rest_framework_simplejwt.authentication.JWTAuthentication",),
+    "DEFAULT_AUTHENTICATION_CLASSES": ("apps.users.authentication.CachedJWTAuthentication",),
     "DEFAULT_FILTER_BACKENDS": [
         "django_filters.rest_framework.DjangoFilterBackend",
-        "rest_framework.filters.SearchFilter",
-        "rest_framework.filters.OrderingFilter",
+        "apps.common.filters.FullTextSearchFilter",
+        "apps.common.filters.RankedOrderingFilter",
     ],
     "DEFAULT_PERMISSION_CLASSES": ("rest_framework.permissions.IsAuthenticated",),
-    "DEFAULT_RENDERER_CLASSES": ("rest_framework.renderers.JSONRenderer",),
-    "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
+    "DEFAULT_RENDERER_CLASSES": ("apps.common.renderers.ORJSONRenderer",),
+    "DEFAULT_PARSER_CLASSES": (
+        "apps.common.parsers.ORJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ),
+    "DEFAULT_PAGINATION_CLASS": "apps.common.pagination.PageNumberPagination",
     "PAGE_SIZE": 12,
 }
 
+# Page-number pagination counts exactly below this many rows, above it the Postgres planner estimate is returned
+PAGINATION_EXACT_COUNT_THRESHOLD = env.int("PAGINATION_EXACT_COUNT_THRESHOLD", default=10000)
+
 
 SWAGGER_SETTINGS = {"SECURITY_DEFINITIONS": {"Bearer": {"type": "apiKey", "name": "Authorization", "in": "header"}}}
 
@@ -104,6 +118,12 @@ SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=500),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
 }
+
+# Users resolved from JWTs are cached in Redis and, for AUTH_USER_LOCAL_CACHE_TTL seconds, in process. The local
+# TTL bounds how long other processes may still accept a user after it was deactivated; 0 disables that tier.
+AUTH_USER_CACHE_TTL = env.int("AUTH_USER_CACHE_TTL", default=300)
+AUTH_USER_LOCAL_CACHE_TTL = env.float("AUTH_USER_LOCAL_CACHE_TTL", default=2)
+AUTH_USER_LOCAL_CACHE_SIZE = env.int("AUTH_USER_LOCAL_CACHE_SIZE", default=1024)
 FIXTURE_DIRS = ("fixtures/",)
 
 # Database
@@ -123,6 +143,29 @@ DATABASES = {
     },
 }
 
+# "direct" connects per request, "persistent" keeps a health-checked connection per worker thread and "pooled"
+# shares a psycopg_pool.ConnectionPool between the threads of a process (see apps.common.postgresql_pool).
+DB_PROFILE = env.str("DB_PROFILE", default="direct", validate=OneOf(["direct", "persistent", "pooled"]))
+
+if DB_PROFILE == "persistent":
+    DATABASES["default"].update(
+        CONN_MAX_AGE=env.int("DB_CONN_MAX_AGE", default=600),
+        CONN_HEALTH_CHECKS=True,
+    )
+elif DB_PROFILE == "pooled":
+    DATABASES["default"].update(
+        ENGINE="apps.common.postgresql_pool",
+        CONN_HEALTH_CHECKS=True,
+        OPTIONS={
+            "pool": {
+                "min_size": env.int("DB_POOL_MIN_SIZE", default=2),
+                "max_size": env.int("DB_POOL_MAX_SIZE", default=10),
+                "max_idle": env.float("DB_POOL_MAX_IDLE", default=600),
+                "timeout": env.float("DB_POOL_TIMEOUT", default=30),
+            },
+        },
+    )
+
 CACHES = {
     "default": {
         "BACKEND": "django_redis.cache.RedisCache",
@@ -139,6 +182,10 @@ SESSION_CACHE_ALIAS = "default"
 
 # Time for cache to refresh
 CACHE_TTL = 60
+# Leaderboard entries are invalidated by timelog and task writes, the TTL only bounds staleness of user names
+LEADERBOARD_CACHE_TTL = env.int("LEADERBOARD_CACHE_TTL", default=60 * 15)
+# Upper bound for one recompute of a cached aggregate; concurrent callers wait at most this long
+SINGLE_FLIGHT_LOCK_TIMEOUT = env.int("SINGLE_FLIGHT_LOCK_TIMEOUT", default=30)
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -188,6 +235,45 @@ EMAIL_USE_TLS = email["EMAIL_USE_TLS"]
 EMAIL_BACKEND = email["EMAIL_BACKEND"]
 DEFAULT_FROM_EMAIL = email.get("DEFAULT_FROM_EMAIL", EMAIL_HOST_USER)
 
+# Outbox worker (manage.py run_notification_worker)
+NOTIFICATION_BATCH_SIZE = env.int("NOTIFICATION_BATCH_SIZE", default=100)
+NOTIFICATION_MAX_ATTEMPTS = env.int("NOTIFICATION_MAX_ATTEMPTS", default=5)
+NOTIFICATION_RETRY_BACKOFF = env.int("NOTIFICATION_RETRY_BACKOFF", default=30)
+NOTIFICATION_POLL_INTERVAL = env.float("NOTIFICATION_POLL_INTERVAL", default=5)
+# Events for the same recipient queued within this many seconds are sent as one digest
+NOTIFICATION_DIGEST_WINDOW = env.int("NOTIFICATION_DIGEST_WINDOW", default=60)
+# Claimed notifications whose delivery was never recorded (a crashed worker) are retried after this many seconds
+NOTIFICATION_CLAIM_TIMEOUT = env.int("NOTIFICATION_CLAIM_TIMEOUT", default=300)
+
+# Requests served at once per ASGI process, each of them may hold a database connection
+ASGI_DATABASE_CONCURRENCY = env.int("ASGI_DATABASE_CONCURRENCY", default=50)
+# Rows fetched per server-side cursor round trip and serialized at once by the CSV/NDJSON exports
+EXPORT_CHUNK_SIZE = env.int("EXPORT_CHUNK_SIZE", default=2000)
+# Largest filtered list that still gets ETag / Last-Modified, computed over this many rows per request
+CONDITIONAL_GET_MAX_ROWS = env.int("CONDITIONAL_GET_MAX_ROWS", default=1000)
+# Longest series, in day/week/month buckets, returned by the time report
+TIME_REPORT_MAX_BUCKETS = env.int("TIME_REPORT_MAX_BUCKETS", default=400)
+# Requests slower than this are logged with their profile (queries, cache, render time), 0 turns it off
+SLOW_REQUEST_MS = env.int("SLOW_REQUEST_MS", default=1000)
+# Credentials of the Prometheus scrape job for /health/metrics ("Authorization: Token ..."); admins can always read it
+METRICS_TOKEN = env.str("METRICS_TOKEN", default="")
+# Statements slower than this are logged (0 turns it off), and this fraction of the others is logged as a sample
+SLOW_QUERY_MS = env.float("SLOW_QUERY_MS", default=100)
+SQL_LOG_SAMPLE_RATE = env.float("SQL_LOG_SAMPLE_RATE", default=0.001)
+
+# /ready fails when a dependency answers slower than its budget or not within the timeout; results are reused
+# for READY_CACHE_SECONDS
+READY_DATABASE_BUDGET_MS = env.float("READY_DATABASE_BUDGET_MS", default=250)
+READY_CACHE_BUDGET_MS = env.float("READY_CACHE_BUDGET_MS", default=50)
+READY_CHECK_TIMEOUT = env.float("READY_CHECK_TIMEOUT", default=1)
+READY_CACHE_SECONDS = env.float("READY_CACHE_SECONDS", default=2)
+
+# Deepest task search result reachable by paging, and comments returned per task.
+SEARCH_CANDIDATE_LIMIT = env.int("SEARCH_CANDIDATE_LIMIT", default=5000)
+SEARCH_COMMENTS_PER_TASK = env.int("SEARCH_COMMENTS_PER_TASK", default=3)
+# Rows validated and copied per chunk by the bulk timelog endpoint
+TIMELOG_BULK_BATCH_SIZE = env.int("TIMELOG_BULK_BATCH_SIZE", default=5000)
+
 DATE_FORMAT = "%Y-%m-%d %H:%m"
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
@@ -199,19 +285,25 @@ DEBUG_LEVEL = "INFO"
 LOGGING = {
     "version": 1,
     "disable_existing_loggers": True,
-    "formatters": {"standard": {"format": "%(asctime)s [%(levelname)s]- %(message)s"}},
+    "formatters": {"json": {"()": "apps.common.log.JSONFormatter"}},
     "filters": {
         "require_debug_true": {
             "()": "django.utils.log.RequireDebugTrue",
         }
     },
+    # Records are queued on the calling thread and formatted and written by a listener thread.
     "handlers": {
         "console": {
             "level": DEBUG_LEVEL,
-            "class": "logging.StreamHandler",
+            "()": "apps.common.log.QueueStreamHandler",
             "filters": ["require_debug_true"],
-            "formatter": "standard",
-        }
+            "formatter": "json",
+        },
+        "performance": {
+            "level": "INFO",
+            "()": "apps.common.log.QueueStreamHandler",
+            "formatter": "json",
+        },
     },
     "loggers": {
         "info": {"handlers": ["console"], "level": DEBUG_LEVEL, "propagate": True},
@@ -225,10 +317,10 @@ LOGGING = {
             "level": DEBUG_LEVEL,
             "propagate": True,
         },
-        "django.db.backends": {
-            "level": "DEBUG",
-            "handlers": ["console"],
-        },
+        # Statements are logged by apps.common.sql instead, only when slow or sampled.
+        "django.db.backends": {"level": "INFO"},
+        "apps.common.metrics": {"handlers": ["performance"], "level": "WARNING", "propagate": False},
+        "apps.common.sql": {"handlers": ["performance"], "level": "INFO", "propagate": False},
     },
 }
 
@@ -0,0 +1,14 @@
+"""
+URL configuration of the ASGI entry point.
+
+The hot read endpoints of apps.tasks are served by async viewsets, every other route is shared with config.urls.
+"""
+
+from django.urls import include, path
+
+from config.urls import urlpatterns as sync_urlpatterns
+
+urlpatterns = [
+    path("", include("apps.tasks.async_urls")),
+    *sync_urlpatterns,
+]
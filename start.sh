@@ -1,2 +1,6 @@
 python /app/manage.py migrate
-python /app/manage.py runserver 0.0.0.0:8000
+if [ "$SERVER" = "asgi" ]; then
+  uvicorn config.asgi:application --host 0.0.0.0 --port 8000
+else
+  python /app/manage.py runserver 0.0.0.0:8000
+fi